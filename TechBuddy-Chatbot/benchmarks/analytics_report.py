@@ -0,0 +1,85 @@
+"""Benchmark for the columnar KPI analytics behind /kpi-analytics.
+
+Fills an EventColumns store with synthetic survey and engagement events and times the group-by report:
+
+    python benchmarks/analytics_report.py --events 2000000
+    python benchmarks/analytics_report.py --events 2000000 --on-disk --workers 4
+
+--on-disk writes the events as the column files of several worker processes, so the report also
+includes reading them back.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from techbuddy.analytics import EventColumns  # noqa: E402
+from techbuddy.chatbot import PersonalizedChatbot  # noqa: E402
+
+
+def synthetic_columns(events, sessions, seed):
+    """Roughly five queries per survey answer, spread over 30 days and `sessions` sessions"""
+    rng = np.random.default_rng(seed)
+    kind = rng.choice(4, size=events, p=[0.7, 0.1, 0.1, 0.1]).astype(np.uint8)
+    session = rng.integers(1, sessions + 1, size=events).astype(np.uint64)
+    value = np.where(kind == 0, rng.gamma(2.0, 0.4, events),
+                     np.where(kind == 1, rng.integers(1, 6, events), rng.integers(0, 2, events))).astype(np.float32)
+    area = np.where(kind == 2, rng.integers(0, 4, events), -1).astype(np.int8)
+    ts = np.sort(time.time() - rng.uniform(0, 30 * 86400, events))
+    return {"ts": ts, "kind": kind, "value": value, "area": area, "session": session}
+
+
+def fill(store, columns):
+    with store.lock:
+        store.columns = {name: np.array(column) for name, column in columns.items()}
+        store.size = len(columns["ts"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TechBuddy analytics benchmark")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--on-disk", action="store_true", help="spread the events over per-worker column files")
+    parser.add_argument("--workers", type=int, default=4, help="worker directories written with --on-disk")
+    args = parser.parse_args()
+
+    areas = PersonalizedChatbot.IMPROVEMENT_AREAS
+    with tempfile.TemporaryDirectory(prefix="techbuddy-analytics-") as root:
+        store = EventColumns(root if args.on_disk else None, areas)
+        if args.on_disk:
+            for worker in range(args.workers):
+                writer = EventColumns(root, areas)
+                writer.own_directory = os.path.join(root, f"worker-{worker}")
+                fill(writer, synthetic_columns(args.events // args.workers, args.sessions, worker))
+                writer.flush()
+        else:
+            fill(store, synthetic_columns(args.events, args.sessions, 0))
+
+        appender = EventColumns(None, areas)
+        started = time.perf_counter()
+        for i in range(100000):
+            appender.append("query", started, 0.5, f"session-{i % 1000}")
+        append_us = (time.perf_counter() - started) / 100000 * 1e6
+
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            report = store.report()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    print(f"{report['events']} events, {report['sessions']} sessions ({'on disk' if args.on_disk else 'in memory'})")
+    print(f"  report p50 {timings[len(timings) // 2]:.1f}ms  min {timings[0]:.1f}ms  max {timings[-1]:.1f}ms")
+    print(f"  append {append_us:.2f}us per event")
+    print(f"  response time vs satisfaction correlation: {report['response_time_vs_satisfaction']['correlation']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Cold-start benchmark for TechBuddy workers.
+
+Every run starts fresh interpreter processes and measures:
+
+    import         `import techbuddy.app`
+    boot           import plus create_app(), i.e. what a gunicorn/uvicorn worker does before serving
+    ready          spawning `python -m techbuddy` until /status first answers
+    first_chat     spawning `python -m techbuddy` until the first /chat reply
+
+    python benchmarks/cold_start.py --runs 10
+    python benchmarks/cold_start.py --asgi --fresh --importtime
+
+Runs use the in-process fake LLM backend by default, so no network access or API key is needed.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import techbuddy.app
+imported = time.perf_counter()
+techbuddy.app.create_app()
+booted = time.perf_counter()
+print(json.dumps({"import": (imported - started) * 1000, "boot": (booted - started) * 1000,
+                  "lazy_modules_loaded": sorted(m for m in ("openai", "aiohttp", "pyngrok", "uvicorn") if m in sys.modules)}))
+"""
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def child_env(args):
+    env = dict(os.environ, TECHBUDDY_BACKEND=args.backend, PYTHONDONTWRITEBYTECODE="1")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PROJECT_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+def measure_boot(args, workdir):
+    output = subprocess.run([sys.executable, "-c", BOOT_SCRIPT], cwd=workdir, env=child_env(args),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_first_request(args, workdir):
+    """Milliseconds from spawning the server to its first /status and /chat replies"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "techbuddy", "--port", str(port)] + (["--asgi"] if args.asgi else [])
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=workdir, env=child_env(args),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = started + args.timeout
+        while True:
+            try:
+                with urllib.request.urlopen(url + "/status", timeout=1) as response:
+                    api_key = json.loads(response.read())["api_key"]
+                break
+            except (urllib.error.URLError, OSError):
+                if server.poll() is not None or time.perf_counter() > deadline:
+                    raise RuntimeError(f"server did not come up (exit code {server.poll()})")
+                time.sleep(0.005)
+        ready = time.perf_counter()
+
+        payload = json.dumps({"message": "How do I reset my router?", "session_id": "cold-start"}).encode()
+        request = urllib.request.Request(url + "/chat", data=payload,
+                                         headers={"Content-Type": "application/json", "X-API-Key": api_key})
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            response.read()
+        first_chat = time.perf_counter()
+    finally:
+        server.terminate()
+        server.wait()
+    return {"ready": (ready - started) * 1000, "first_chat": (first_chat - started) * 1000}
+
+
+def import_profile(args, workdir, top=12):
+    """Slowest modules (cumulative microseconds) from python -X importtime"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import techbuddy.app"], cwd=workdir,
+                            env=child_env(args), capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, module = line[len("import time:"):].split("|")
+            rows.append((int(cumulative), module.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TechBuddy cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backend", default="fake", help="TECHBUDDY_BACKEND for the measured processes")
+    parser.add_argument("--asgi", action="store_true", help="measure the uvicorn/ASGI server instead of Flask's")
+    parser.add_argument("--fresh", action="store_true",
+                        help="new working directory per run (empty databases)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the server to answer")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest imports")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    samples = {}
+    lazy_loaded = set()
+    with tempfile.TemporaryDirectory(prefix="techbuddy-cold-") as root:
+        shared = os.path.join(root, "shared")
+        os.makedirs(shared)
+        if not args.fresh:
+            # Warm-up run creates the databases that later boots reuse, like a redeploy does
+            measure_boot(args, shared)
+        for run in range(args.runs):
+            workdir = shared
+            if args.fresh:
+                workdir = os.path.join(root, f"run-{run}")
+                os.makedirs(workdir)
+            boot = measure_boot(args, workdir)
+            lazy_loaded.update(boot.pop("lazy_modules_loaded"))
+            if args.fresh:
+                workdir = os.path.join(root, f"run-{run}-server")
+                os.makedirs(workdir)
+            for name, value in {**boot, **measure_first_request(args, workdir)}.items():
+                samples.setdefault(name, []).append(value)
+        slowest = import_profile(args, shared) if args.importtime else []
+
+    report = {
+        "runs": args.runs,
+        "server": "asgi" if args.asgi else "flask",
+        "fresh": args.fresh,
+        "lazy_modules_loaded_at_boot": sorted(lazy_loaded),
+        "metrics": {
+            name: {
+                "p50_ms": round(percentile(sorted(values), 0.50), 1),
+                "min_ms": round(min(values), 1),
+                "max_ms": round(max(values), 1),
+            }
+            for name, values in samples.items()
+        },
+    }
+    if slowest:
+        report["slowest_imports_ms"] = {module.strip(): round(us / 1000, 1) for us, module in slowest}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{args.runs} cold starts ({report['server']}{', fresh working directory' if args.fresh else ''})")
+    for name, stats in report["metrics"].items():
+        print(f"  {name:16} p50 {stats['p50_ms']}ms  min {stats['min_ms']}ms  max {stats['max_ms']}ms")
+    print(f"  lazy modules loaded at boot: {', '.join(report['lazy_modules_loaded_at_boot']) or 'none'}")
+    for module, ms in report.get("slowest_imports_ms", {}).items():
+        print(f"  import {module:40} {ms}ms")
+
+
+if __name__ == "__main__":
+    main()
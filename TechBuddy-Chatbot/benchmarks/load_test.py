@@ -0,0 +1,177 @@
+"""Load test for a running TechBuddy server.
+
+Drives /chat (or /chat/stream) and /kpi-metrics at a fixed concurrency and
+reports throughput, latency percentiles and server memory growth:
+
+    python benchmarks/mock_llm_server.py --latency 0.5 &
+    TECHBUDDY_BACKEND=mock python -m techbuddy &
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --concurrency 50 --requests 2000 --server-pid <pid>
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTIONS = [
+    "How do I reset my router?",
+    "What is the best laptop under $1000?",
+    "My phone battery drains quickly, what can I do?",
+    "How can I speed up my Windows PC?",
+    "Which wireless earbuds do you recommend for running?",
+    "Why does my Wi-Fi keep disconnecting?",
+    "How do I back up my iPhone?",
+    "What monitor should I get for programming?",
+]
+
+
+class Recorder:
+    """Collects per-endpoint latencies and error counts from worker threads"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed):
+        report = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            report[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "req_per_sec": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+            }
+        return report
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def read_rss_kb(pid):
+    """Resident set size of the server process in KiB (Linux only)"""
+    if not pid:
+        return None
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return None
+
+
+def request(url, api_key, payload=None, timeout=60):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json", "X-API-Key": api_key})
+    return urllib.request.urlopen(req, timeout=timeout)
+
+
+def chat_once(args, api_key, recorder, session_id):
+    question = random.choice(QUESTIONS)
+    if args.unique:
+        question = f"{question} (ticket {random.randrange(10 ** 9)})"
+    payload = {"message": question, "session_id": session_id}
+    endpoint = "/chat/stream" if args.stream else "/chat"
+
+    start = time.perf_counter()
+    ok = True
+    try:
+        with request(args.url + endpoint, api_key, payload) as response:
+            if args.stream:
+                first = True
+                for line in response:
+                    if first and line.startswith(b"event: token"):
+                        recorder.add("time_to_first_token", time.perf_counter() - start, True)
+                        first = False
+            else:
+                ok = json.loads(response.read()).get("type") != "error"
+    except (urllib.error.URLError, OSError, ValueError):
+        ok = False
+    recorder.add(endpoint, time.perf_counter() - start, ok)
+
+
+def kpi_once(args, api_key, recorder):
+    start = time.perf_counter()
+    ok = True
+    try:
+        with request(args.url + "/kpi-metrics", api_key) as response:
+            response.read()
+    except (urllib.error.URLError, OSError):
+        ok = False
+    recorder.add("/kpi-metrics", time.perf_counter() - start, ok)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TechBuddy load test")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--api-key", help="defaults to the key published by /status")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="number of chat requests")
+    parser.add_argument("--sessions", type=int, default=100, help="distinct session ids to spread requests over")
+    parser.add_argument("--kpi-ratio", type=float, default=1.0, help="/kpi-metrics calls per chat request")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream and record time to first token")
+    parser.add_argument("--unique", action="store_true", help="make every question unique to bypass caches")
+    parser.add_argument("--server-pid", type=int, help="server process id for memory growth reporting")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    args.url = args.url.rstrip("/")
+
+    api_key = args.api_key
+    if not api_key:
+        with urllib.request.urlopen(args.url + "/status") as response:
+            api_key = json.loads(response.read())["api_key"]
+
+    sessions = [f"bench-{i}" for i in range(args.sessions)]
+    recorder = Recorder()
+    rss_before = read_rss_kb(args.server_pid)
+
+    def job(index):
+        chat_once(args, api_key, recorder, sessions[index % len(sessions)])
+        if random.random() < args.kpi_ratio:
+            kpi_once(args, api_key, recorder)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(job, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    rss_after = read_rss_kb(args.server_pid)
+    report = {
+        "concurrency": args.concurrency,
+        "elapsed_sec": round(elapsed, 2),
+        "endpoints": recorder.summary(elapsed),
+    }
+    if rss_before is not None and rss_after is not None:
+        report["server_rss_kb"] = {"before": rss_before, "after": rss_after, "growth": rss_after - rss_before}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Concurrency {args.concurrency}, {args.requests} chat requests in {report['elapsed_sec']}s")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"  {endpoint:22} {stats['requests']:6} req  {stats['errors']:4} err  {stats['req_per_sec']:8} req/s  "
+              f"p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms  p99 {stats['p99_ms']}ms  max {stats['max_ms']}ms")
+    if "server_rss_kb" in report:
+        rss = report["server_rss_kb"]
+        print(f"  server RSS {rss['before']} KiB -> {rss['after']} KiB ({rss['growth']:+} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Serves POST /v1/chat/completions (including stream=true) with configurable
+latency, jitter and error rate so TechBuddy can be benchmarked offline:
+
+    python benchmarks/mock_llm_server.py --port 8001 --latency 0.8 --jitter 0.2 --error-rate 0.01
+    TECHBUDDY_BACKEND=mock TECHBUDDY_MOCK_URL=http://127.0.0.1:8001/v1 python -m techbuddy
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        settings = self.settings
+
+        # Simulated upstream behaviour
+        delay = max(0.0, random.gauss(settings.latency, settings.jitter))
+        if random.random() < settings.error_rate:
+            time.sleep(delay / 2)
+            return self._send_json(503, {"error": {"message": "Simulated upstream error", "type": "server_error"}})
+
+        question = body.get("messages", [{}])[-1].get("content", "")[:80]
+        words = [f"Mock reply to: {question}."] + ["detail"] * settings.reply_words
+        prompt_tokens = sum(len(m.get("content", "")) // 4 + 4 for m in body.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+
+        if body.get("stream"):
+            self._stream(body, words, delay)
+        else:
+            time.sleep(delay)
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            })
+
+    def _stream(self, body, words, delay):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for index, word in enumerate(words):
+            time.sleep(delay / len(words))
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "delta": {"content": word if index == 0 else " " + word},
+                             "finish_reason": None}]
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="standard deviation of the response time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--reply-words", type=int, default=40, help="words per reply")
+    args = parser.parse_args()
+
+    MockCompletionHandler.settings = args
+    server = ThreadingHTTPServer((args.host, args.port), MockCompletionHandler)
+    server.daemon_threads = True
+    print(f"✅ Mock LLM server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Memory benchmark for conversation histories.
+
+Builds the same conversations as plain {"role", "content"} dicts (the old representation) and as
+ConversationHistory, and reports traced bytes per session:
+
+    python benchmarks/session_memory.py --sessions 10000 --turns 10
+    python benchmarks/session_memory.py --sessions 10000 --prompt-tokens 600
+
+The compact history is measured twice: with every message in the context window, and after
+ContextBuilder.build() has compressed the turns that no longer fit --prompt-tokens (the state a session
+is in while its summary is pending, or when summaries fail).
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from techbuddy.context import ContextBuilder  # noqa: E402
+from techbuddy.sessions import ChatSession, ConversationHistory  # noqa: E402
+
+QUESTIONS = [
+    "How do I reset my router to factory settings?",
+    "My laptop battery drains really fast, what can I do?",
+    "Which smartwatch works best with an Android phone?",
+    "The printer says it is offline but it is connected to Wi-Fi.",
+    "Can I use the wireless earbuds with two devices at once?",
+    "My phone gets hot while charging, is that normal?",
+]
+SENTENCES = [
+    "First, make sure the device is charged and running the latest firmware.",
+    "Open Settings, go to System and choose Reset options.",
+    "Hold the power button for ten seconds until the indicator light blinks.",
+    "If the problem persists, try a different cable and power adapter.",
+    "Background apps and high screen brightness are the most common causes of battery drain.",
+    "You can check which apps use the most power under Battery usage.",
+    "Forget the network on your device and reconnect with the correct password.",
+    "Restarting both the router and the device often clears temporary connection issues.",
+    "Multipoint pairing lets the earbuds stay connected to a phone and a laptop at the same time.",
+    "Warranty claims need the original receipt and the serial number from the box.",
+    "Let me know the exact model number and I can give you more specific steps.",
+    "Some warmth while fast charging is normal, but unplug the phone if it becomes too hot to hold.",
+]
+
+
+def conversation(rng, turns, reply_sentences):
+    for _ in range(turns):
+        question = rng.choice(QUESTIONS)
+        reply = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(*reply_sentences)))
+        # Fresh str objects per session, as replies arriving from upstream would be
+        yield "".join(list(question)), "".join(list(reply))
+
+
+def build_dicts(args, seed):
+    histories = []
+    for session in range(args.sessions):
+        history = []
+        for question, reply in conversation(random.Random(seed + session), args.turns, args.reply_sentences):
+            history.append({"role": "user", "content": question})
+            history.append({"role": "assistant", "content": reply})
+        histories.append(history)
+    return histories
+
+
+def build_compact(args, seed, compress):
+    builder = ContextBuilder(summarize=None, max_prompt_tokens=args.prompt_tokens, workers=1)
+    histories = []
+    for session_index in range(args.sessions):
+        session = ChatSession(f"bench-{session_index}")
+        history = session.conversation_history
+        for question, reply in conversation(random.Random(seed + session_index), args.turns, args.reply_sentences):
+            history.append("user", question)
+            history.append("assistant", reply)
+        if compress:
+            # As if a summary were already in flight, so build() only compresses the turns outside the window
+            session.summary_pending = True
+            builder.build("You are TechBuddy.", session, "One more question")
+        histories.append(history)
+    builder.executor.shutdown()
+    return histories
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    histories = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return histories, used, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TechBuddy conversation history memory benchmark")
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--turns", type=int, default=10, help="user/assistant pairs per session")
+    parser.add_argument("--reply-sentences", type=int, nargs=2, default=(3, 8), metavar=("MIN", "MAX"))
+    parser.add_argument("--prompt-tokens", type=int, default=1500, help="context window used for compression")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    variants = [
+        ("dicts", lambda: build_dicts(args, args.seed)),
+        ("compact", lambda: build_compact(args, args.seed, compress=False)),
+        ("compact, out-of-window compressed", lambda: build_compact(args, args.seed, compress=True)),
+    ]
+    print(f"{args.sessions} sessions x {args.turns} turns, {args.prompt_tokens}-token context window")
+    baseline = None
+    for name, build in variants:
+        histories, used, elapsed = measure(build)
+        per_session = used / args.sessions
+        baseline = baseline or per_session
+        line = f"  {name:36} {per_session:8.0f} bytes/session  ({used / 2 ** 20:.1f} MiB, built in {elapsed:.2f}s)"
+        if per_session != baseline:
+            line += f"  {(1 - per_session / baseline) * 100:.0f}% less"
+        if isinstance(histories[0], ConversationHistory):
+            compressed = sum(isinstance(content, bytes) for history in histories for content in history.contents)
+            line += f"  [{compressed} messages compressed]" if compressed else ""
+        print(line)
+        del histories
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""TechBuddy tech-support chatbot.
+
+Importing the package has no side effects and loads nothing heavy; the app factories
+below are resolved on first use:
+
+    gunicorn -w 4 'techbuddy.app:create_app()'
+    uvicorn --factory techbuddy.app:create_asgi_app
+    python -m techbuddy --help
+"""
+
+__all__ = ["create_app", "create_asgi_app", "create_chatbot"]
+
+
+def __getattr__(name):
+    if name in ("create_app", "create_asgi_app"):
+        from . import app
+        return getattr(app, name)
+    if name == "create_chatbot":
+        from .chatbot import create_chatbot
+        return create_chatbot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,152 @@
+"""Admission control in front of the upstream LLM: bounded concurrency, bounded queue, deadlines"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+
+
+class Overloaded(Exception):
+    """Raised when no upstream slot can be granted in time; maps to 503 with Retry-After"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionWaiter:
+    """A queued request waiting for an upstream slot (thread or event-loop based)"""
+    __slots__ = ("granted", "event", "loop", "future")
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+
+class AdmissionController:
+    """Caps concurrent upstream calls behind a bounded FIFO queue with per-request deadlines"""
+
+    def __init__(self, max_concurrent=32, max_queue=128):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.waiters = deque()
+        self.avg_hold_time = 1.0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.lock = threading.Lock()
+
+    def _try_enter(self, loop=None):
+        """Take a free slot or join the queue (caller holds self.lock)"""
+        if self.in_flight < self.max_concurrent and not self.waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return None
+        if len(self.waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("TechBuddy is busy right now, please try again shortly", self._retry_after())
+        waiter = AdmissionWaiter(loop)
+        self.waiters.append(waiter)
+        return waiter
+
+    def _abandon(self, waiter):
+        """Leave the queue after a timeout; returns True if a slot was granted meanwhile"""
+        with self.lock:
+            if waiter.granted:
+                return True
+            self.waiters.remove(waiter)
+            self.timed_out += 1
+            return False
+
+    def _retry_after(self):
+        backlog = (len(self.waiters) + 1) / max(1, self.max_concurrent)
+        return int(min(60, max(1, math.ceil(self.avg_hold_time * backlog))))
+
+    def try_acquire(self):
+        """Take a free slot without queueing; False when none is free (not counted as a rejection)"""
+        with self.lock:
+            if self.in_flight < self.max_concurrent and not self.waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+            return False
+
+    def acquire(self, deadline=None):
+        with self.lock:
+            waiter = self._try_enter()
+        if waiter is None:
+            return
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        if not waiter.event.wait(timeout) and not self._abandon(waiter):
+            raise Overloaded("Request timed out waiting for TechBuddy", self._retry_after())
+
+    async def acquire_async(self, deadline=None):
+        with self.lock:
+            waiter = self._try_enter(asyncio.get_running_loop())
+        if waiter is None:
+            return
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                raise Overloaded("Request timed out waiting for TechBuddy", self._retry_after())
+        except asyncio.CancelledError:
+            if self._abandon(waiter):
+                self.release(0.0)
+            raise
+
+    def release(self, hold_time):
+        with self.lock:
+            self.avg_hold_time = 0.9 * self.avg_hold_time + 0.1 * hold_time
+            if self.waiters:
+                # Hand the slot straight to the oldest waiter
+                waiter = self.waiters.popleft()
+                waiter.granted = True
+                self.admitted += 1
+                waiter.wake()
+            else:
+                self.in_flight -= 1
+
+    @contextmanager
+    def slot(self, deadline=None, wait_timer=None):
+        """Hold an upstream slot for the block; wait_timer, a context manager, times the wait for it"""
+        with wait_timer or nullcontext():
+            self.acquire(deadline)
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.release(time.time() - started)
+
+    @asynccontextmanager
+    async def aslot(self, deadline=None, wait_timer=None):
+        with wait_timer or nullcontext():
+            await self.acquire_async(deadline)
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.release(time.time() - started)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out
+        }
@@ -0,0 +1,278 @@
+"""Columnar store of survey and engagement events with vectorized group-by reports"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class EventColumns:
+    """Append-only NumPy columns of KPI events, persisted as raw per-column files in one directory per process
+
+    Every process appends to its own directory, so gunicorn/uvicorn workers never share a file and a restart
+    simply starts a new one. A background thread flushes every `flush_every` events and flushed rows leave
+    memory; reports read the unflushed rows from memory and everything else from disk, which makes them cover
+    all workers and all earlier runs. Without a directory only the latest `max_events` events are kept.
+    """
+
+    KINDS = ("query", "satisfaction", "feedback", "resolution")
+    COLUMNS = (("ts", np.float64), ("kind", np.uint8), ("value", np.float32), ("area", np.int8),
+               ("session", np.uint64))
+    HOURS = 24
+
+    def __init__(self, directory=None, areas=(), flush_every=4096, initial_capacity=4096, max_events=1000000):
+        self.directory = directory
+        self.areas = tuple(areas)
+        self.area_codes = {area: code for code, area in enumerate(self.areas)}
+        self.kind_codes = {kind: code for code, kind in enumerate(self.KINDS)}
+        self.flush_every = flush_every
+        self.initial_capacity = initial_capacity
+        self.max_events = max_events
+        self.columns = {name: np.empty(initial_capacity, dtype) for name, dtype in self.COLUMNS}
+        # The columns hold events base .. base + size; earlier ones are on disk, or dropped without a directory
+        self.base = 0
+        self.size = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.flusher = None
+        self.flush_due = threading.Event()
+        self.own_directory = None
+        if directory:
+            self.own_directory = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        # Columns read from other directories, keyed by path, with the event count they were read at
+        self.loaded = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def __len__(self):
+        return self.base + self.size
+
+    @staticmethod
+    def session_code(session_id):
+        """Stable 64-bit code for a session id (the same in every process, unlike hash())"""
+        return int.from_bytes(hashlib.blake2b(session_id.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def append(self, kind, ts, value=0.0, session_id=None, area=None):
+        """Add one event; kinds outside KINDS are ignored"""
+        kind_code = self.kind_codes.get(kind)
+        if kind_code is None:
+            return
+        session = self.session_code(session_id) if session_id else 0
+        area_code = self.area_codes.get(area, -1)
+        with self.lock:
+            if self.size == len(self.columns["ts"]):
+                if self.own_directory is None and self.size >= self.max_events:
+                    # Nowhere to spill to: forget the oldest quarter
+                    self.dropped += self.size // 4
+                    self._drop_front(self.size // 4, self.size)
+                else:
+                    self._drop_front(0, 2 * self.size)
+            index = self.size
+            self.columns["ts"][index] = ts
+            self.columns["kind"][index] = kind_code
+            self.columns["value"][index] = value
+            self.columns["area"][index] = area_code
+            self.columns["session"][index] = session
+            self.size += 1
+            due = self.own_directory is not None and self.base + self.size - self.flushed >= self.flush_every
+            if due and self.flusher is None:
+                self.flusher = threading.Thread(target=self._run, name="techbuddy-analytics-flush", daemon=True)
+                self.flusher.start()
+        if due:
+            self.flush_due.set()
+
+    def _drop_front(self, count, capacity):
+        """Move the rows after the first `count` into new arrays of `capacity` (caller holds self.lock)
+
+        Fresh arrays rather than an in-place move, so views handed out earlier stay valid.
+        """
+        for name, column in self.columns.items():
+            moved = np.empty(capacity, column.dtype)
+            moved[:self.size - count] = column[count:self.size]
+            self.columns[name] = moved
+        self.base += count
+        self.size -= count
+
+    def _run(self):
+        """Flush in the background, off the threads that record events"""
+        while True:
+            self.flush_due.wait()
+            self.flush_due.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"❌ Error writing analytics columns: {str(e)}")
+                self.write_errors += 1
+                time.sleep(1)
+
+    def flush(self):
+        """Append the events not yet on disk to this process's column files and drop them from memory"""
+        if self.own_directory is None:
+            return
+        with self.flush_lock:
+            with self.lock:
+                start, end = self.flushed, self.base + self.size
+                chunk = {name: column[start - self.base:end - self.base] for name, column in self.columns.items()}
+            if end == start:
+                return
+            os.makedirs(self.own_directory, exist_ok=True)
+            for name, values in chunk.items():
+                with open(os.path.join(self.own_directory, name), "ab") as f:
+                    f.write(values.tobytes())
+            # The count is written last, so readers never see a partly written event
+            temp = os.path.join(self.own_directory, f"meta.json.{os.getpid()}.tmp")
+            with open(temp, "w") as f:
+                json.dump({"count": end, "areas": self.areas}, f)
+            os.replace(temp, os.path.join(self.own_directory, "meta.json"))
+            with self.lock:
+                self.flushed = end
+                self._drop_front(end - self.base, max(self.initial_capacity, 2 * (self.base + self.size - end)))
+
+    def _load_directory(self, path, count=None):
+        """Columns of a directory's first `count` events (all of them by default), re-read only when it has grown"""
+        if count is None:
+            try:
+                with open(os.path.join(path, "meta.json")) as f:
+                    count = json.load(f)["count"]
+            except (OSError, ValueError, KeyError):
+                return None
+        cached = self.loaded.get(path)
+        if cached is not None and cached[0] == count:
+            return cached[1]
+        columns = {name: np.fromfile(os.path.join(path, name), dtype=dtype, count=count)
+                   for name, dtype in self.COLUMNS}
+        self.loaded[path] = (count, columns)
+        return columns
+
+    def _all_columns(self):
+        """This process's columns plus those of every other directory, concatenated"""
+        with self.lock:
+            base = self.base
+            parts = [{name: column[:self.size] for name, column in self.columns.items()}]
+        if base and self.own_directory is not None:
+            # Exactly the events flushed before the rows in memory, even if a flush has finished since
+            parts.append(self._load_directory(self.own_directory, base))
+        if self.directory and os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                path = os.path.join(self.directory, name)
+                if path != self.own_directory and os.path.isdir(path):
+                    columns = self._load_directory(path)
+                    if columns is not None:
+                        parts.append(columns)
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([part[name] for part in parts]) for name, _ in self.COLUMNS}
+
+    def report(self, since=None, until=None):
+        """Satisfaction by improvement area, resolution rate per hour of day (UTC) and response time vs satisfaction"""
+        started = time.perf_counter()
+        columns = self._all_columns()
+        if since is not None or until is not None:
+            ts = columns["ts"]
+            keep = np.ones(len(ts), dtype=bool)
+            if since is not None:
+                keep &= ts >= since
+            if until is not None:
+                keep &= ts < until
+            columns = {name: column[keep] for name, column in columns.items()}
+
+        kind = columns["kind"]
+        value = columns["value"].astype(np.float64)
+        session = columns["session"]
+        is_query = kind == self.kind_codes["query"]
+        is_satisfaction = kind == self.kind_codes["satisfaction"]
+        is_feedback = kind == self.kind_codes["feedback"]
+        is_resolution = kind == self.kind_codes["resolution"]
+
+        # Dense per-session ids for every per-session aggregate below
+        sessions, session_index = np.unique(session, return_inverse=True)
+        session_count = len(sessions)
+        satisfaction_sum = np.bincount(session_index[is_satisfaction], value[is_satisfaction], session_count)
+        satisfaction_n = np.bincount(session_index[is_satisfaction], minlength=session_count)
+        query_sum = np.bincount(session_index[is_query], value[is_query], session_count)
+        query_n = np.bincount(session_index[is_query], minlength=session_count)
+        rated = satisfaction_n > 0
+        # Events recorded without a session (code 0) cannot be joined
+        if session_count and sessions[0] == 0:
+            rated[0] = False
+        session_satisfaction = np.divide(satisfaction_sum, satisfaction_n, out=np.zeros(session_count),
+                                         where=satisfaction_n > 0)
+
+        return {
+            "events": int(len(kind)),
+            "sessions": int(session_count - (1 if session_count and sessions[0] == 0 else 0)),
+            "satisfaction_by_area": self._satisfaction_by_area(columns["area"], is_feedback, session_index, rated,
+                                                               session_satisfaction),
+            "resolution_by_hour": self._resolution_by_hour(columns["ts"][is_resolution], value[is_resolution]),
+            "response_time_vs_satisfaction": self._response_time_vs_satisfaction(
+                rated & (query_n > 0), query_sum, query_n, session_satisfaction),
+            "compute_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def _satisfaction_by_area(self, area, is_feedback, session_index, rated, session_satisfaction):
+        """Average satisfaction of the sessions that named each improvement area"""
+        joined = is_feedback & (area >= 0)
+        joined[joined] = rated[session_index[joined]]
+        codes = area[joined].astype(np.int64)
+        scores = session_satisfaction[session_index[joined]]
+        counts = np.bincount(codes, minlength=len(self.areas))
+        sums = np.bincount(codes, scores, minlength=len(self.areas))
+        mentions = np.bincount(area[is_feedback & (area >= 0)].astype(np.int64), minlength=len(self.areas))
+        return {
+            name: {
+                "mentions": int(mentions[code]),
+                "rated_sessions": int(counts[code]),
+                "average_satisfaction": round(float(sums[code] / counts[code]), 2) if counts[code] else None
+            }
+            for code, name in enumerate(self.areas)
+        }
+
+    def _resolution_by_hour(self, ts, resolved):
+        hours = ((ts // 3600) % self.HOURS).astype(np.int64)
+        answers = np.bincount(hours, minlength=self.HOURS)
+        resolutions = np.bincount(hours, resolved, minlength=self.HOURS)
+        return [
+            {
+                "hour": hour,
+                "answers": int(answers[hour]),
+                "resolution_rate": round(float(resolutions[hour] / answers[hour] * 100), 2) if answers[hour] else None
+            }
+            for hour in range(self.HOURS)
+        ]
+
+    @staticmethod
+    def _response_time_vs_satisfaction(joined, query_sum, query_n, session_satisfaction):
+        """Pearson correlation of each rated session's mean response time with its satisfaction score"""
+        response_time = query_sum[joined] / query_n[joined]
+        satisfaction = session_satisfaction[joined]
+        correlation = None
+        if len(response_time) > 1 and response_time.std() > 0 and satisfaction.std() > 0:
+            correlation = round(float(np.corrcoef(response_time, satisfaction)[0, 1]), 4)
+
+        # Mean response time per (rounded) satisfaction score
+        scores = np.rint(satisfaction).astype(np.int64)
+        counts = np.bincount(scores, minlength=6)
+        sums = np.bincount(scores, response_time, minlength=6)
+        return {
+            "sessions": int(len(response_time)),
+            "correlation": correlation,
+            "by_score": {
+                str(score): {"sessions": int(counts[score]),
+                             "average_response_time": round(float(sums[score] / counts[score]), 3)}
+                for score in range(len(counts)) if counts[score]
+            }
+        }
+
+    def stats(self):
+        return {
+            "events": self.base + self.size,
+            "flushed": self.flushed,
+            "in_memory": self.size,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "directory": self.own_directory
+        }
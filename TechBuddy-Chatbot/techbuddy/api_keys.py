@@ -0,0 +1,173 @@
+"""API key registry: keys stored as SHA-256 digests, each with its own token-bucket rate limit"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from .telemetry import Telemetry
+
+
+def presented_key(x_api_key, authorization):
+    """The key from an X-API-Key header, or else a bearer token as sent by Prometheus' `authorization` setting"""
+    if not x_api_key and authorization and authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):]
+    return x_api_key
+
+
+class RateLimited(Exception):
+    """Raised when a key has used up its quota; maps to 429 with Retry-After"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Tokens left and when they were last refilled"""
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class APIKey:
+    """One registered key: its quota (`rate` requests per second, bursts of up to `burst`; rate 0 is unlimited)
+    and usage counters. A per_client key keeps one bucket per client address, for keys that are handed out publicly.
+    """
+    __slots__ = ("name", "rate", "burst", "per_client", "max_clients", "bucket", "clients", "requests", "limited",
+                 "lock")
+
+    def __init__(self, name, rate=0.0, burst=1, per_client=False, max_clients=10000):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.per_client = per_client
+        self.max_clients = max_clients
+        self.bucket = TokenBucket(self.burst, time.monotonic())
+        # LRU of client buckets; a client that drops out simply starts again with a full bucket
+        self.clients = OrderedDict()
+        self.requests = 0
+        self.limited = 0
+        self.lock = threading.Lock()
+
+    def _client_bucket(self, client, now):
+        bucket = self.clients.get(client)
+        if bucket is None:
+            bucket = self.clients[client] = TokenBucket(self.burst, now)
+            if len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+        else:
+            self.clients.move_to_end(client)
+        return bucket
+
+    def take(self, cost=1, client=None):
+        """Charge `cost` requests to the key (and client), or raise RateLimited without charging anything"""
+        if cost < 0:
+            raise ValueError(f"Negative request cost: {cost}")
+        now = time.monotonic()
+        with self.lock:
+            if self.rate:
+                bucket = self._client_bucket(client, now) if self.per_client else self.bucket
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+                if bucket.tokens < cost:
+                    self.limited += 1
+                    if cost > self.burst:
+                        raise RateLimited(f"Request is larger than this API key's burst of {self.burst}",
+                                          math.ceil(self.burst / self.rate))
+                    raise RateLimited("Rate limit exceeded for this API key",
+                                      max(1, math.ceil((cost - bucket.tokens) / self.rate)))
+                bucket.tokens -= cost
+            self.requests += cost
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "per_client": self.per_client,
+            "clients": len(self.clients) if self.per_client else None,
+            "requests": self.requests,
+            "rate_limited": self.limited
+        }
+
+
+class APIKeyRegistry:
+    """API keys looked up by the SHA-256 digest of the presented key
+
+    Authentication costs one hash and one dict lookup however many keys are registered. Only digests are kept,
+    and lookup timing depends on the digest rather than on how much of a real key a guess matches.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.names = set()
+
+    @staticmethod
+    def digest(api_key):
+        return hashlib.sha256(api_key.encode("utf-8")).digest()
+
+    def add(self, name, api_key=None, key_digest=None, rate=0.0, burst=1, per_client=False):
+        """Register a key given in plain text or as its SHA-256 digest"""
+        if name in self.names:
+            raise ValueError(f"Duplicate API key name: {name}")
+        key_digest = key_digest if key_digest is not None else self.digest(api_key)
+        if key_digest in self.keys:
+            raise ValueError(f"API key {name!r} is already registered as {self.keys[key_digest].name!r}")
+        entry = APIKey(name, rate, burst, per_client)
+        self.keys[key_digest] = entry
+        self.names.add(name)
+        return entry
+
+    def lookup(self, api_key):
+        return self.keys.get(self.digest(api_key)) if api_key else None
+
+    def authenticate(self, api_key, cost=1, client=None):
+        """The APIKey for api_key after charging it `cost` requests, or None if unknown; raises RateLimited"""
+        entry = self.lookup(api_key)
+        if entry is not None:
+            entry.take(cost, client)
+        return entry
+
+    @staticmethod
+    def parse(spec, rate, burst):
+        """(name, digest, rate, burst) for each "name:key[:rate[:burst]]" entry of a comma-separated spec
+
+        A key written as sha256=<hex digest> is taken as already hashed.
+        """
+        entries = []
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            fields = item.split(":")
+            if len(fields) < 2 or len(fields) > 4 or not fields[0] or not fields[1]:
+                raise ValueError(f"Invalid API key entry {fields[0]!r}, expected name:key[:rate[:burst]]")
+            name, key = fields[0], fields[1]
+            if key.startswith("sha256="):
+                key_digest = bytes.fromhex(key[len("sha256="):])
+                if len(key_digest) != hashlib.sha256().digest_size:
+                    raise ValueError(f"Invalid SHA-256 digest for API key {name!r}")
+            else:
+                key_digest = APIKeyRegistry.digest(key)
+            try:
+                key_rate = float(fields[2]) if len(fields) > 2 else rate
+                key_burst = int(fields[3]) if len(fields) > 3 else burst
+            except ValueError:
+                raise ValueError(f"Invalid rate or burst for API key {name!r}, expected numbers") from None
+            if not 0 <= key_rate < math.inf or key_burst < 1:
+                raise ValueError(f"Invalid rate or burst for API key {name!r}, expected rate >= 0 and burst >= 1")
+            entries.append((name, key_digest, key_rate, key_burst))
+        return entries
+
+    def stats(self):
+        return {entry.name: entry.stats() for entry in self.keys.values()}
+
+    def metric_samples(self):
+        """Per-key counters for /metrics as (name, type, help, {label text: value})"""
+        entries = sorted(self.keys.values(), key=lambda entry: entry.name)
+        return [
+            ("techbuddy_api_key_requests_total", "counter", "Requests charged to each API key",
+             {Telemetry.label_text([("key", entry.name)]): entry.requests for entry in entries}),
+            ("techbuddy_api_key_rate_limited_total", "counter", "Requests rejected with 429 for each API key",
+             {Telemetry.label_text([("key", entry.name)]): entry.limited for entry in entries})
+        ]
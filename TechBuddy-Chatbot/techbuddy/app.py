@@ -0,0 +1,331 @@
+"""Flask app factory and HTTP routes"""
+
+import itertools
+import json
+import os
+import secrets
+import time
+from functools import wraps
+
+from flask import Blueprint, Flask, Response, current_app, g, jsonify, request, stream_with_context
+from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from .admission import Overloaded
+from .api_keys import APIKeyRegistry, RateLimited, presented_key
+from .assets import StaticAssets
+from .chatbot import create_chatbot
+from .config import (API_KEY, API_KEYS, ASSET_DIR, BATCH_CONCURRENCY, BATCH_MAX_ITEMS, KEY_BURST, KEY_RATE,
+                     KPI_PUSH_INTERVAL, KPI_STREAM_THREADS, KPI_WINDOWS, PROFILE_DIR, PROFILE_INTERVAL_MS,
+                     PROFILE_SLOW_MS, PUBLIC_KEY_BURST, PUBLIC_KEY_RATE, TRUSTED_PROXIES)
+from .kpi_stream import KPIBroadcaster
+from .telemetry import SlowRequestProfiler, Telemetry, render_samples
+
+
+def create_app(bot=None):
+    """Flask app factory, e.g. gunicorn -w 4 'techbuddy.app:create_app()' with TECHBUDDY_SHARED_STATE set"""
+    bot = bot or create_chatbot()
+    app = Flask(__name__)
+    CORS(app)
+    if TRUSTED_PROXIES:
+        # Per-client rate limits need the real client address, not the proxy's
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+    app.config['TRUSTED_PROXIES'] = TRUSTED_PROXIES
+    app.config['SECRET_KEY'] = secrets.token_hex(16)
+
+    # Every worker must accept the same key
+    api_key = API_KEY
+    if not api_key:
+        api_key = bot.shared_state.meta('api_key', secrets.token_hex(32)) if bot.shared_state else secrets.token_hex(32)
+    app.config['API_KEY'] = api_key
+
+    # The key /status publishes gets a token bucket per client address, every other key one of its own
+    api_keys = APIKeyRegistry()
+    api_keys.add('web', api_key, rate=PUBLIC_KEY_RATE, burst=PUBLIC_KEY_BURST, per_client=True)
+    for name, key_digest, rate, burst in APIKeyRegistry.parse(API_KEYS, KEY_RATE, KEY_BURST):
+        api_keys.add(name, key_digest=key_digest, rate=rate, burst=burst)
+    app.extensions['techbuddy_keys'] = api_keys
+
+    app.extensions['techbuddy'] = bot
+    app.extensions['techbuddy_kpi'] = KPIBroadcaster(bot.get_kpi_metrics, KPI_PUSH_INTERVAL,
+                                                     max_threads=KPI_STREAM_THREADS)
+    # Built ahead of time by python -m techbuddy --build-assets
+    app.extensions['techbuddy_assets'] = StaticAssets(ASSET_DIR)
+    app.extensions['techbuddy_profiler'] = None
+    if PROFILE_SLOW_MS > 0:
+        app.extensions['techbuddy_profiler'] = SlowRequestProfiler(PROFILE_SLOW_MS / 1000, PROFILE_INTERVAL_MS / 1000,
+                                                                   PROFILE_DIR)
+    app.register_blueprint(api)
+    return app
+
+def create_asgi_app(bot=None):
+    """ASGI app factory, e.g. uvicorn --factory --workers 4 techbuddy.app:create_asgi_app"""
+    from .asgi import AsyncChatApp
+
+    bot = bot or create_chatbot()
+    return AsyncChatApp(bot, create_app(bot))
+
+def current_chatbot():
+    return current_app.extensions['techbuddy']
+
+api = Blueprint('techbuddy', __name__)
+
+def parse_chat_request(data):
+    """Validate a /chat payload and return (generate_response kwargs, error)"""
+    if not isinstance(data, dict):
+        return None, 'Invalid JSON body'
+    message = data.get('message')
+    session_id = data.get('session_id')
+
+    if not message:
+        return None, 'No message provided'
+    if session_id is not None and (not isinstance(session_id, str) or len(session_id) > 64):
+        return None, 'Invalid session_id'
+    return {
+        'user_input': message,
+        'session_id': session_id,
+        'use_cache': not data.get('no_cache', False)
+    }, None
+
+def parse_batch_request(data):
+    """Validate a /chat/batch payload; returns (batch, error)
+
+    batch holds the valid items as generate_batch kwargs, their positions and client ids, the per-item
+    errors of invalid ones, and the concurrency to run them with.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+        return None, 'Expected {"items": [...]}'
+    items = data['items']
+    if not items:
+        return None, 'No items provided'
+    if len(items) > BATCH_MAX_ITEMS:
+        return None, f'At most {BATCH_MAX_ITEMS} items per batch'
+    concurrency = data.get('concurrency', BATCH_CONCURRENCY)
+    if not isinstance(concurrency, int) or concurrency < 1:
+        return None, 'Invalid concurrency'
+
+    batch = {'params': [], 'positions': [], 'ids': [], 'invalid': [],
+             'concurrency': min(concurrency, BATCH_CONCURRENCY)}
+    for position, item in enumerate(items):
+        params, error = parse_chat_request(item) if isinstance(item, dict) else (None, 'Invalid item')
+        item_id = item.get('id') if isinstance(item, dict) else None
+        if error:
+            batch['invalid'].append(batch_line(position, item_id, {'error': error}))
+        else:
+            batch['params'].append(params)
+            batch['positions'].append(position)
+            batch['ids'].append(item_id)
+    return batch, None
+
+def batch_line(position, item_id, result):
+    """One NDJSON result line: the item's position in the request and its client id, then the result"""
+    line = {'index': position}
+    if item_id is not None:
+        line['id'] = item_id
+    line.update(result)
+    return json.dumps(line) + '\n'
+
+def overloaded_response(error):
+    """503 telling the client when to retry"""
+    response = jsonify({'error': str(error)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def rate_limited_response(error):
+    """429 telling the client when its API key has quota again"""
+    response = jsonify({'error': str(error)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def authenticate(api_key, cost=1):
+    """The caller's APIKey charged `cost` requests, or None for an unknown key; raises RateLimited"""
+    return current_app.extensions['techbuddy_keys'].authenticate(api_key, cost, request.remote_addr)
+
+def request_api_key():
+    """X-API-Key, or a bearer token as sent by Prometheus' `authorization` scrape setting"""
+    return presented_key(request.headers.get('X-API-Key'), request.headers.get('Authorization'))
+
+def require_api_key(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        try:
+            g.api_key = authenticate(request_api_key())
+        except RateLimited as e:
+            return rate_limited_response(e)
+        if g.api_key is None:
+            return jsonify({'error': 'Invalid API key'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    profiler = current_app.extensions['techbuddy_profiler']
+    if profiler is not None:
+        profiler.begin()
+
+@api.after_app_request
+def record_request_time(response):
+    """Time every request by route template (not raw path, to keep the label set small) and status"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        current_chatbot().telemetry.observe(Telemetry.HTTP_METRIC, time.perf_counter() - started,
+                                            route=route, method=request.method, status=response.status_code)
+    return response
+
+@api.teardown_app_request
+def finish_request_profile(error):
+    profiler = current_app.extensions['techbuddy_profiler']
+    if profiler is not None:
+        profiler.end(f"{request.method} {request.path}")
+
+@api.route('/')
+def index():
+    return current_app.extensions['techbuddy_assets'].response('/')
+
+@api.route('/assets/<name>')
+def asset(name):
+    response = current_app.extensions['techbuddy_assets'].response(f'/assets/{name}')
+    return response if response is not None else (jsonify({'error': 'Not found'}), 404)
+
+@api.route('/status')
+def status():
+    """Add the missing status endpoint"""
+    return jsonify({
+        'status': 'online',
+        'url': os.getenv('NGROK_URL', ''),
+        'api_key': current_app.config['API_KEY'],
+        'server_time': '2025-01-23 03:40:31',
+        'user': 'R2Vve'
+    })
+
+@api.route('/chat', methods=['POST'])
+@require_api_key
+def chat():
+    bot = current_chatbot()
+    try:
+        with bot.telemetry.time(Telemetry.PHASE_METRIC, phase='parse'):
+            params, error = parse_chat_request(request.get_json(silent=True))
+        if error:
+            return jsonify({'error': error}), 400
+
+        response_data = bot.generate_response(**params)
+        with bot.telemetry.time(Telemetry.PHASE_METRIC, phase='serialize'):
+            return jsonify(response_data)
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/chat/stream', methods=['POST'])
+@require_api_key
+def chat_stream():
+    """Stream the reply as Server-Sent Events: token events followed by a done event"""
+    params, error = parse_chat_request(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
+
+    # Pull the first event before committing to a 200 so overload can still be reported as 503
+    stream = current_chatbot().generate_response_stream(**params)
+    try:
+        first_event = next(stream)
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    def events():
+        for event, payload in itertools.chain([first_event], stream):
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api.route('/chat/batch', methods=['POST'])
+@require_api_key
+def chat_batch():
+    """Answer many independent messages; results stream back as NDJSON lines as they complete"""
+    batch, error = parse_batch_request(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
+    try:
+        # Every valid item is an upstream call; the request itself was charged for the first one
+        g.api_key.take(max(0, len(batch['params']) - 1), request.remote_addr)
+    except RateLimited as e:
+        return rate_limited_response(e)
+
+    results = current_chatbot().generate_batch(batch['params'], batch['concurrency'])
+
+    def lines():
+        yield from batch['invalid']
+        for index, response_data in results:
+            yield batch_line(batch['positions'][index], batch['ids'][index], response_data)
+
+    return Response(stream_with_context(lines()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api.route('/kpi-metrics')
+@require_api_key
+def get_metrics():
+    window = request.args.get('window')
+    if window is not None and window not in KPI_WINDOWS:
+        return jsonify({'error': f"Invalid window, use one of: {', '.join(KPI_WINDOWS)}"}), 400
+    return jsonify(current_chatbot().get_kpi_metrics(window))
+
+@api.route('/metrics')
+@require_api_key
+def prometheus_metrics():
+    """Phase timings and KPI counters in the Prometheus text format"""
+    bot = current_chatbot()
+    lines = bot.telemetry.render() + render_samples(bot.metric_samples() +
+                                                    current_app.extensions['techbuddy_keys'].metric_samples())
+    profiler = current_app.extensions['techbuddy_profiler']
+    if profiler is not None:
+        lines += render_samples([('techbuddy_slow_request_profiles_total', 'counter',
+                                  'Folded-stack profiles written for slow requests', profiler.written)])
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@api.route('/kpi-analytics')
+@require_api_key
+def get_analytics():
+    """Satisfaction by improvement area, resolution rate per hour and response time vs satisfaction"""
+    bounds = {}
+    window = request.args.get('window')
+    if window is not None:
+        if window not in KPI_WINDOWS:
+            return jsonify({'error': f"Invalid window, use one of: {', '.join(KPI_WINDOWS)}"}), 400
+        bounds['since'] = time.time() - KPI_WINDOWS[window]
+    for name in ('since', 'until'):
+        if name in request.args:
+            try:
+                bounds[name] = float(request.args[name])
+            except ValueError:
+                return jsonify({'error': f'{name} must be a Unix timestamp'}), 400
+    return jsonify(current_chatbot().get_kpi_analytics(**bounds))
+
+@api.route('/kpi-stream')
+def kpi_stream():
+    """Push KPI snapshots and deltas as Server-Sent Events (EventSource cannot send headers, so ?api_key= works too)"""
+    try:
+        api_key = authenticate(request_api_key() or request.args.get('api_key'))
+    except RateLimited as e:
+        return rate_limited_response(e)
+    if api_key is None:
+        return jsonify({'error': 'Invalid API key'}), 401
+    try:
+        messages = current_app.extensions['techbuddy_kpi'].subscribe()
+    except Overloaded as e:
+        return overloaded_response(e)
+    return Response(messages, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Add error handlers
+@api.app_errorhandler(404)
+def not_found(e):
+    return jsonify({'error': 'Resource not found'}), 404
+
+@api.app_errorhandler(401)
+def unauthorized(e):
+    return jsonify({'error': 'Unauthorized'}), 401
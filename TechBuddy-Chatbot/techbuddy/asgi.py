@@ -0,0 +1,274 @@
+"""ASGI entry point serving /chat, /chat/stream, /chat/batch and /kpi-stream natively on the event loop"""
+
+import asyncio
+import json
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+from .admission import Overloaded
+from .api_keys import RateLimited, presented_key
+from .app import batch_line, parse_batch_request, parse_chat_request
+from .telemetry import Telemetry
+
+
+class AsyncChatApp:
+    """Serves /chat, /chat/stream, /chat/batch and /kpi-stream on the event loop and the rest through Flask
+
+    Long-lived responses must not go through WsgiToAsgi, which runs every WSGI request on one thread.
+    """
+
+    def __init__(self, bot, wsgi_app):
+        self.bot = bot
+        self.api_keys = wsgi_app.extensions['techbuddy_keys']
+        self.broadcaster = wsgi_app.extensions['techbuddy_kpi']
+        self.trusted_proxies = wsgi_app.config['TRUSTED_PROXIES']
+        self.wsgi = WsgiToAsgi(wsgi_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == "/chat" and scope["method"] == "POST":
+            await self._timed(self._chat, scope, receive, send)
+        elif scope["type"] == "http" and scope["path"] == "/chat/stream" and scope["method"] == "POST":
+            await self._timed(self._chat_stream, scope, receive, send)
+        elif scope["type"] == "http" and scope["path"] == "/chat/batch" and scope["method"] == "POST":
+            await self._timed(self._chat_batch, scope, receive, send)
+        elif scope["type"] == "http" and scope["path"] == "/kpi-stream":
+            await self._timed(self._kpi_stream, scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _timed(self, handler, scope, receive, send):
+        """Run a native route, timed like the Flask routes: until the response starts, labelled with its status"""
+        started = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                self.bot.telemetry.observe(Telemetry.HTTP_METRIC, time.perf_counter() - started,
+                                           route=scope["path"], method=scope["method"], status=message["status"])
+            await send(message)
+
+        await handler(scope, receive, timed_send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.bot.open_http_pool()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.bot.close_http_pool()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(receive):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return body
+
+    def _client(self, scope):
+        """Client address, taken from X-Forwarded-For behind trusted proxies the way ProxyFix does for Flask"""
+        if self.trusted_proxies:
+            forwarded = b",".join(value for name, value in scope["headers"] if name == b"x-forwarded-for")
+            hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",")] if forwarded else []
+            if len(hops) >= self.trusted_proxies:
+                return hops[-self.trusted_proxies]
+        client = scope.get("client")
+        return client[0] if client else None
+
+    @staticmethod
+    def _api_key(scope):
+        """X-API-Key or bearer token, as request_api_key reads them for the Flask routes"""
+        headers = dict(scope["headers"])
+        authorization = headers.get(b"authorization")
+        return presented_key(headers.get(b"x-api-key", b"").decode("latin-1"),
+                             authorization.decode("latin-1") if authorization is not None else None)
+
+    async def _authenticate(self, scope, send, api_key):
+        """(APIKey, None) for a known key with quota left, else (None, status) after sending the 401 or 429"""
+        try:
+            key = self.api_keys.authenticate(api_key, client=self._client(scope))
+        except RateLimited as e:
+            return None, await self._rate_limited(send, e)
+        if key is None:
+            return None, await self._send_json(send, 401, {'error': 'Invalid API key'})
+        return key, None
+
+    @classmethod
+    async def _rate_limited(cls, send, error):
+        return await cls._send_json(send, 429, {'error': str(error)},
+                                    [(b"retry-after", str(error.retry_after).encode())])
+
+    async def _chat(self, scope, receive, send):
+        key, status = await self._authenticate(scope, send, self._api_key(scope))
+        if key is None:
+            return status
+
+        body = await self._read_body(receive)
+        telemetry = self.bot.telemetry
+        try:
+            with telemetry.time(Telemetry.PHASE_METRIC, phase="parse"):
+                try:
+                    params, error = parse_chat_request(json.loads(body or b"null"))
+                except ValueError:
+                    params, error = None, 'Invalid JSON body'
+            if error:
+                return await self._send_json(send, 400, {'error': error})
+            response_data = await self.bot.agenerate_response(**params)
+            with telemetry.time(Telemetry.PHASE_METRIC, phase="serialize"):
+                body = json.dumps(response_data).encode("utf-8")
+            return await self._send_body(send, 200, body)
+        except Overloaded as e:
+            return await self._send_json(send, 503, {'error': str(e)}, [(b"retry-after", str(e.retry_after).encode())])
+        except Exception as e:
+            return await self._send_json(send, 500, {'error': str(e)})
+
+    async def _chat_stream(self, scope, receive, send):
+        """Stream the reply as Server-Sent Events: token events followed by a done event"""
+        key, status = await self._authenticate(scope, send, self._api_key(scope))
+        if key is None:
+            return status
+        try:
+            params, error = parse_chat_request(json.loads(await self._read_body(receive) or b"null"))
+        except ValueError:
+            params, error = None, 'Invalid JSON body'
+        if error:
+            return await self._send_json(send, 400, {'error': error})
+
+        # Pull the first event before committing to a 200 so overload can still be reported as 503
+        events = self.bot.agenerate_response_stream(**params)
+        try:
+            event = await events.__anext__()
+        except Overloaded as e:
+            await events.aclose()
+            return await self._send_json(send, 503, {'error': str(e)}, [(b"retry-after", str(e.retry_after).encode())])
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", b"*"),
+            ],
+        })
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            while not disconnected.done():
+                name, payload = event
+                body = f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+                try:
+                    event = await events.__anext__()
+                except StopAsyncIteration:
+                    break
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+            await events.aclose()
+        return 200
+
+    async def _chat_batch(self, scope, receive, send):
+        """Stream NDJSON results of a batch as its items complete; stops starting items once the client is gone"""
+        key, _ = await self._authenticate(scope, send, self._api_key(scope))
+        if key is None:
+            return
+        try:
+            batch, error = parse_batch_request(json.loads(await self._read_body(receive) or b"null"))
+        except ValueError:
+            batch, error = None, 'Invalid JSON body'
+        if error:
+            return await self._send_json(send, 400, {'error': error})
+        try:
+            # Every valid item is an upstream call; the request itself was charged for the first one
+            key.take(max(0, len(batch['params']) - 1), self._client(scope))
+        except RateLimited as e:
+            return await self._rate_limited(send, e)
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/x-ndjson"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", b"*"),
+            ],
+        })
+        for line in batch['invalid']:
+            await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        results = self.bot.agenerate_batch(batch['params'], batch['concurrency'])
+        try:
+            async for index, response_data in results:
+                if disconnected.done():
+                    break
+                line = batch_line(batch['positions'][index], batch['ids'][index], response_data)
+                await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+            await results.aclose()
+
+    async def _kpi_stream(self, scope, receive, send):
+        api_key = self._api_key(scope)
+        if not api_key:
+            query = dict(pair.partition("=")[::2] for pair in scope.get("query_string", b"").decode("latin-1").split("&"))
+            api_key = query.get("api_key", "")
+        key, _ = await self._authenticate(scope, send, api_key)
+        if key is None:
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", b"*"),
+            ],
+        })
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        messages = self.broadcaster.asubscribe()
+        try:
+            async for message in messages:
+                if disconnected.done():
+                    break
+                await send({"type": "http.response.body", "body": message.encode("utf-8"), "more_body": True})
+        finally:
+            disconnected.cancel()
+            await messages.aclose()
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @classmethod
+    async def _send_json(cls, send, status, payload, extra_headers=()):
+        return await cls._send_body(send, status, json.dumps(payload).encode("utf-8"), extra_headers)
+
+    @staticmethod
+    async def _send_body(send, status, body, extra_headers=()):
+        """Send a complete JSON response; returns its status"""
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"access-control-allow-origin", b"*"),
+                *extra_headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+        return status
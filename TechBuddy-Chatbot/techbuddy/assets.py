@@ -0,0 +1,359 @@
+"""Frontend build (minified page, purged CSS, hashed JS, gzip/brotli variants) and in-memory serving
+
+The build is a deploy step (python -m techbuddy --build-assets); without one the page template is served as is.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from flask import Response, request
+
+try:
+    import brotli  # optional: adds .br variants to the built frontend assets
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl  # POSIX only: lets one worker build while the others wait
+except ImportError:
+    fcntl = None
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'index.html')
+
+
+class AssetBuilder:
+    """Turns the page template into a minified index.html with purged CSS inlined and the JS split into a hashed file"""
+
+    # Bump when the build output changes for the same template
+    VERSION = 2
+    STYLESHEET = re.compile(r'<link href="([^"]+)" rel="stylesheet">')
+    INLINE_STYLE = re.compile(r'<style>(.*?)</style>', re.S)
+    INLINE_SCRIPT = re.compile(r'<script>(.*?)</script>', re.S)
+    # Same idea as Tailwind's default purge extractor: anything between quotes, brackets and whitespace
+    CANDIDATE = re.compile(r'[^<>"\'`\s=]+')
+    CLASS_SELECTOR = re.compile(r'\.((?:\\.|[\w-])+)')
+    BRACE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|\\.|([{}])')
+    SCRIPT_FILE = re.compile(r'app\.[0-9a-f]{12}\.js(?:\.gz|\.br)?$')
+    # A "/" after these (or at the start) opens a regex literal; anywhere else it divides
+    REGEX_PRECEDERS = frozenset("(,=:[!&|?{};+-*%<>~^")
+    REGEX_KEYWORD = re.compile(r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|new|delete|void|throw|yield|await)$')
+
+    def __init__(self, out_dir, fetch_timeout=10):
+        self.out_dir = out_dir
+        self.fetch_timeout = fetch_timeout
+
+    @classmethod
+    def source_hash(cls, html):
+        return hashlib.sha256(f"{cls.VERSION}\0{html}".encode("utf-8")).hexdigest()[:16]
+
+    def build(self, html):
+        started = time.perf_counter()
+        used = set(self.CANDIDATE.findall(html))
+        purged = True
+
+        def inline_stylesheet(match):
+            nonlocal purged
+            href = match.group(1)
+            try:
+                css = self.fetch(href)
+            except Exception as e:
+                print(f"❌ Could not fetch {href} ({str(e)}); keeping the CDN link")
+                purged = False
+                return match.group(0)
+            css = re.sub(r'url\((["\']?)(?!data:)([^)"\']+)\1\)',
+                         lambda m: f'url({urllib.parse.urljoin(href, m.group(2))})', css)
+            return f"<style>{self.minify_css(self.purge_css(css, used))}</style>"
+
+        page = self.STYLESHEET.sub(inline_stylesheet, html)
+        page = self.INLINE_STYLE.sub(lambda m: f"<style>{self.minify_css(m.group(1))}</style>", page)
+
+        script = self.minify_js("\n".join(self.INLINE_SCRIPT.findall(page)))
+        script_name = f"app.{hashlib.sha256(script.encode('utf-8')).hexdigest()[:12]}.js"
+        page = self.INLINE_SCRIPT.sub("", page)
+        page = page.replace("</body>", f'<script src="/assets/{script_name}"></script>\n</body>', 1)
+        page = self.minify_html(page)
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        files = {
+            "/": self._write("index.html", page, "text/html; charset=utf-8", immutable=False),
+            f"/assets/{script_name}": self._write(script_name, script, "application/javascript; charset=utf-8",
+                                                  immutable=True)
+        }
+        manifest = {"source": self.source_hash(html), "purged": purged, "built_at": time.time(),
+                    "build_ms": round((time.perf_counter() - started) * 1000, 1), "files": files}
+        self._replace("manifest.json", json.dumps(manifest, indent=2).encode("utf-8"))
+        self._remove_stale(script_name)
+        return manifest
+
+    def fetch(self, href):
+        if href.startswith(("http://", "https://")):
+            with urllib.request.urlopen(href, timeout=self.fetch_timeout) as response:
+                return response.read().decode("utf-8")
+        with open(href, encoding="utf-8") as f:
+            return f.read()
+
+    def _replace(self, name, data):
+        """Write atomically, so workers building at the same time never serve half a file"""
+        path = os.path.join(self.out_dir, name)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def _remove_stale(self, script_name):
+        """Delete scripts of earlier builds; servers hold the files they serve in memory"""
+        for name in os.listdir(self.out_dir):
+            if self.SCRIPT_FILE.match(name) and not name.startswith(script_name):
+                os.remove(os.path.join(self.out_dir, name))
+
+    def _write(self, name, text, content_type, immutable):
+        """Write a file with its gzip (and, if available, brotli) variant; returns its manifest entry"""
+        data = text.encode("utf-8")
+        variants = {"identity": data, "gzip": gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(data, quality=11)
+        entry = {"content_type": content_type, "immutable": immutable, "variants": {}}
+        for encoding, payload in variants.items():
+            file_name = name + {"identity": "", "gzip": ".gz", "br": ".br"}[encoding]
+            self._replace(file_name, payload)
+            entry["variants"][encoding] = {"file": file_name, "size": len(payload),
+                                           "etag": hashlib.sha256(payload).hexdigest()[:20]}
+        return entry
+
+    @classmethod
+    def purge_css(cls, css, used):
+        """Keep rules whose selectors only use classes found in the page; at-rules other than @media are kept"""
+        # License banners are kept up front; empty /*!*/ comments are Tailwind's way of writing an empty value
+        out = [banner + "\n" for banner in re.findall(r'/\*!(?!\*/).+?\*/', css, flags=re.S)]
+        css = re.sub(r'/\*(?!!\*/).*?\*/', '', css, flags=re.S)
+        for prelude, body in cls._blocks(css):
+            if prelude.startswith(("@media", "@supports")):
+                inner = cls.purge_css(body, used)
+                if inner:
+                    out.append(f"{prelude}{{{inner}}}")
+            elif prelude.startswith("@"):
+                out.append(f"{prelude}{{{body}}}")
+            else:
+                selectors = [s for s in cls._split_selectors(prelude)
+                             if all(re.sub(r'\\(.)', r'\1', c) in used for c in cls.CLASS_SELECTOR.findall(s))]
+                if selectors:
+                    out.append(f"{','.join(selectors)}{{{body}}}")
+        return "".join(out)
+
+    @classmethod
+    def _blocks(cls, css):
+        """Yield (prelude, body) for each top-level block, ignoring braces inside strings and escapes"""
+        depth, start, brace = 0, 0, 0
+        for match in cls.BRACE.finditer(css):
+            if match.group(1) == "{":
+                if depth == 0:
+                    brace = match.start()
+                depth += 1
+            elif match.group(1) == "}":
+                depth -= 1
+                if depth == 0:
+                    yield css[start:brace].strip(), css[brace + 1:match.start()]
+                    start = match.end()
+
+    @staticmethod
+    def _split_selectors(prelude):
+        """Split a selector list on top-level commas (not those inside :not(...) and friends)"""
+        parts, depth, start = [], 0, 0
+        for i, c in enumerate(prelude):
+            if c in "([":
+                depth += 1
+            elif c in ")]":
+                depth -= 1
+            elif c == "," and depth == 0:
+                parts.append(prelude[start:i].strip())
+                start = i + 1
+        parts.append(prelude[start:].strip())
+        return parts
+
+    @staticmethod
+    def minify_css(css):
+        css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+        css = re.sub(r'\s+', ' ', css)
+        css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+        return css.replace(": ", ":").replace(";}", "}").strip()
+
+    @classmethod
+    def minify_js(cls, js):
+        """Drop comments, indentation and blank lines; string, template and regex literals are copied unchanged
+
+        Line breaks are kept, so automatic semicolon insertion still sees the same statements.
+        """
+        out, pending, i = [], "", 0
+        templates = []  # one entry per open "{": True when it is a template literal's "${"
+        while i < len(js):
+            c = js[i]
+            if c == "\n":
+                pending = ""
+                if out and not out[-1].endswith("\n"):
+                    out.append("\n")
+                while i + 1 < len(js) and js[i + 1] in " \t\r\n":
+                    i += 1
+                i += 1
+                continue
+            if c in " \t\r":
+                pending += c
+                i += 1
+                continue
+            if js.startswith("//", i):
+                end = js.find("\n", i)
+                i = len(js) if end < 0 else end
+                continue
+            if js.startswith("/*", i):
+                end = js.find("*/", i + 2)
+                i = len(js) if end < 0 else end + 2
+                pending = pending or " "
+                continue
+            if pending and out and not out[-1].endswith("\n"):
+                out.append(pending)
+            pending = ""
+            if c in "\"'":
+                end = cls._literal_end(js, i + 1, c)
+            elif c == "`" or (c == "}" and templates and templates.pop()):
+                end = cls._template_end(js, i + 1)
+                if js.startswith("${", end - 2):
+                    templates.append(True)
+            elif c == "/" and cls._regex_allowed("".join(out[-8:]).rstrip()):
+                end = cls._literal_end(js, i + 1, "/")
+                while end < len(js) and js[end].isalpha():
+                    end += 1
+            else:
+                if c == "{":
+                    templates.append(False)
+                end = i + 1
+            out.append(js[i:end])
+            i = end
+        return "".join(out).strip() + "\n"
+
+    @staticmethod
+    def _literal_end(js, i, quote):
+        """Index just past the closing quote of a string (or regex) literal whose body starts at i"""
+        in_class = False
+        while i < len(js):
+            c = js[i]
+            if c == "\\":
+                i += 1
+            elif quote == "/" and c in "[]":
+                in_class = c == "["
+            elif c == quote and not in_class or c == "\n":
+                return i + 1
+            i += 1
+        return i
+
+    @staticmethod
+    def _template_end(js, i):
+        """Index just past the closing backtick or the next "${" of a template literal whose text starts at i"""
+        while i < len(js):
+            if js[i] == "\\":
+                i += 2
+            elif js[i] == "`":
+                return i + 1
+            elif js.startswith("${", i):
+                return i + 2
+            else:
+                i += 1
+        return i
+
+    @classmethod
+    def _regex_allowed(cls, before):
+        return not before or before[-1] in cls.REGEX_PRECEDERS or bool(cls.REGEX_KEYWORD.search(before))
+
+    @staticmethod
+    def minify_html(html):
+        html = re.sub(r'<!--.*?-->', '', html, flags=re.S)
+        lines = (line.strip() for line in html.splitlines())
+        return "\n".join(line for line in lines if line) + "\n"
+
+
+def build_assets(out_dir, template_path=TEMPLATE_PATH):
+    """Build the frontend into out_dir; builds started at the same time take turns on a lock file"""
+    with open(template_path, encoding="utf-8") as f:
+        html = f.read()
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "build.lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = AssetBuilder(out_dir).build(html)
+    sizes = {path: entry["variants"]["identity"]["size"] for path, entry in manifest["files"].items()}
+    print(f"✅ Frontend assets built in {manifest['build_ms']}ms: {sizes}")
+    return manifest
+
+
+class StaticAssets:
+    """Built frontend files and their compressed variants, held in memory and served with ETags
+
+    Without a build of the current template, the template itself is served as the page.
+    """
+
+    ENCODINGS = ("br", "gzip")
+    IMMUTABLE = "public, max-age=31536000, immutable"
+
+    def __init__(self, directory, template_path=TEMPLATE_PATH):
+        self.directory = directory
+        self.template_path = template_path
+        self.files = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        """Read the manifest and every file variant once, on first request"""
+        with self.lock:
+            if self.files is None:
+                with open(self.template_path, encoding="utf-8") as f:
+                    html = f.read()
+                try:
+                    with open(os.path.join(self.directory, "manifest.json")) as f:
+                        manifest = json.load(f)
+                except (OSError, ValueError):
+                    manifest = {}
+                if manifest.get("source") != AssetBuilder.source_hash(html):
+                    print(f"❌ No frontend build of the current page template in {self.directory}; serving the "
+                          f"template unminified (build it with python -m techbuddy --build-assets)")
+                    self.files = {"/": self._unbuilt_page(html)}
+                    return self.files
+                files = {}
+                for path, entry in manifest["files"].items():
+                    variants = {}
+                    for encoding, variant in entry["variants"].items():
+                        with open(os.path.join(self.directory, variant["file"]), "rb") as f:
+                            variants[encoding] = (f.read(), variant["etag"])
+                    files[path] = (entry["content_type"], entry["immutable"], variants)
+                self.files = files
+        return self.files
+
+    @staticmethod
+    def _unbuilt_page(html):
+        data = html.encode("utf-8")
+        variants = {encoding: (payload, hashlib.sha256(payload).hexdigest()[:20])
+                    for encoding, payload in (("identity", data), ("gzip", gzip.compress(data, 6, mtime=0)))}
+        return "text/html; charset=utf-8", False, variants
+
+    def response(self, path):
+        """Flask response for path, negotiated against the current request; None if there is no such asset"""
+        asset = self._load().get(path)
+        if asset is None:
+            return None
+        content_type, immutable, variants = asset
+        encoding = next((e for e in self.ENCODINGS if e in variants and request.accept_encodings[e]), "identity")
+        body, etag = variants[encoding]
+        headers = {
+            "ETag": f'"{etag}"',
+            "Vary": "Accept-Encoding",
+            # The page itself is revalidated (a cheap 304); the hashed files it references never change
+            "Cache-Control": self.IMMUTABLE if immutable else "no-cache"
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        return Response(body, content_type=content_type, headers=headers)
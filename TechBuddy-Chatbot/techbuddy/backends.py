@@ -0,0 +1,485 @@
+"""LLM backends (OpenAI, local mock server, in-process fake) and the resilience wrapper around them"""
+
+import asyncio
+import math
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from .admission import Overloaded
+
+
+def _openai():
+    """openai (with the aiohttp it pulls in) takes a few hundred ms to import, so it is loaded on first use"""
+    import openai
+    return openai
+
+
+def transient_errors():
+    """Exception types worth retrying; openai/aiohttp errors can only occur once those modules are loaded"""
+    errors = [asyncio.TimeoutError, ConnectionError, TimeoutError]
+    openai = sys.modules.get("openai")
+    if openai is not None:
+        errors += [openai.error.Timeout, openai.error.APIError, openai.error.APIConnectionError,
+                   openai.error.RateLimitError, openai.error.ServiceUnavailableError, openai.error.TryAgain]
+    aiohttp = sys.modules.get("aiohttp")
+    if aiohttp is not None:
+        errors.append(aiohttp.ClientError)
+    return tuple(errors)
+
+
+class Completion(str):
+    """Reply text carrying the token usage the upstream reported for it"""
+
+    def __new__(cls, text, prompt_tokens, completion_tokens):
+        completion = super().__new__(cls, text)
+        completion.prompt_tokens = prompt_tokens
+        completion.completion_tokens = completion_tokens
+        return completion
+
+    @classmethod
+    def from_response(cls, response):
+        """Reply of an OpenAI-style response, with its usage when the response has one"""
+        text = response.choices[0].message['content']
+        usage = response.get("usage")
+        if not usage:
+            return text
+        return cls(text, usage["prompt_tokens"], usage["completion_tokens"])
+
+
+class LLMBackend:
+    """Interface for chat completion backends"""
+
+    name = "base"
+
+    def complete(self, messages, **params) -> str:
+        """Return the reply text for messages, as a Completion if the backend reports token usage"""
+        raise NotImplementedError
+
+    async def acomplete(self, messages, **params) -> str:
+        """Async variant of complete; defaults to running complete on a worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: self.complete(messages, **params))
+
+    def stream(self, messages, **params):
+        """Yield reply tokens as they are produced; defaults to a single chunk"""
+        yield self.complete(messages, **params)
+
+    async def open(self):
+        """Acquire resources needed by acomplete (called on ASGI startup)"""
+
+    async def close(self):
+        """Release resources acquired by open"""
+
+    def stats(self):
+        """Counters reported under "resilience" in /kpi-metrics, if any"""
+        return None
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI chat completions, with a shared keep-alive pool for async calls"""
+
+    name = "openai"
+
+    def __init__(self, api_key=None, api_base=None, pool_size=100):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.pool_size = pool_size
+        self.http_pool = None
+        # Load openai off the boot path: the worker starts serving at once and the first chat rarely waits on it
+        threading.Thread(target=_openai, name="techbuddy-openai-import", daemon=True).start()
+
+    def _request_params(self, params):
+        if self.api_key:
+            params["api_key"] = self.api_key
+        if self.api_base:
+            params["api_base"] = self.api_base
+        return params
+
+    def complete(self, messages, **params) -> str:
+        response = _openai().ChatCompletion.create(messages=messages, **self._request_params(params))
+        return Completion.from_response(response)
+
+    async def acomplete(self, messages, **params) -> str:
+        if self.http_pool is not None:
+            _openai().aiosession.set(self.http_pool)
+        response = await _openai().ChatCompletion.acreate(messages=messages, **self._request_params(params))
+        return Completion.from_response(response)
+
+    def stream(self, messages, **params):
+        for chunk in _openai().ChatCompletion.create(messages=messages, stream=True, **self._request_params(params)):
+            token = chunk.choices[0].delta.get("content")
+            if token:
+                yield token
+
+    async def open(self):
+        if self.http_pool is None:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self.http_pool = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self.http_pool is not None:
+            await self.http_pool.close()
+            self.http_pool = None
+
+
+class MockHTTPBackend(OpenAIBackend):
+    """OpenAI-compatible client pointed at the local mock server (benchmarks/mock_llm_server.py)"""
+
+    name = "mock"
+
+    def __init__(self, api_base="http://127.0.0.1:8001/v1", pool_size=100):
+        super().__init__(api_key="mock", api_base=api_base, pool_size=pool_size)
+
+
+class FakeBackend(LLMBackend):
+    """In-process stand-in with configurable latency, jitter and error rate"""
+
+    name = "fake"
+
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, reply_words=40):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reply_words = reply_words
+
+    def _delay(self):
+        if random.random() < self.error_rate:
+            raise ConnectionError("Simulated upstream error")
+        return max(0.0, random.gauss(self.latency, self.jitter))
+
+    def _reply(self, messages):
+        question = messages[-1]["content"][:80]
+        filler = " ".join(["detail"] * max(0, self.reply_words - 6))
+        return f"Simulated TechBuddy reply to: {question}. {filler}".strip()
+
+    def complete(self, messages, **params) -> str:
+        time.sleep(self._delay())
+        return self._reply(messages)
+
+    async def acomplete(self, messages, **params) -> str:
+        await asyncio.sleep(self._delay())
+        return self._reply(messages)
+
+    def stream(self, messages, **params):
+        delay = self._delay()
+        words = self._reply(messages).split(" ")
+        for index, word in enumerate(words):
+            time.sleep(delay / len(words))
+            yield word if index == 0 else " " + word
+
+
+class CircuitOpen(Overloaded):
+    """Raised while the circuit breaker is open; maps to 503 with Retry-After like any overload"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive upstream failures, then lets a single probe through once reset_timeout has passed"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        self.opens = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go upstream now"""
+        with self.lock:
+            if self.state == "closed":
+                return
+            now = time.time()
+            remaining = self.opened_at + self.reset_timeout - now
+            # A probe that never reported back (e.g. an abandoned stream) is replaced after reset_timeout
+            if remaining <= 0 and (not self.probing or now - self.probe_started > self.reset_timeout):
+                self.state = "half_open"
+                self.probing = True
+                self.probe_started = now
+                return
+            self.rejected += 1
+        raise CircuitOpen("Upstream is unavailable, please retry shortly", retry_after=max(1, math.ceil(remaining)))
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.time()
+                self.probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "rejected": self.rejected
+        }
+
+
+class ResilientBackend(LLMBackend):
+    """Wraps a backend with jittered retries, a circuit breaker and optional hedged requests
+
+    The caller already holds an admission slot for the call; a hedge copy needs a free slot of its own.
+    """
+
+    DEFAULT_TIMEOUT = 60.0
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(self, backend, max_retries=2, backoff_base=0.2, backoff_max=2.0, circuit_breaker=None,
+                 hedge=False, hedge_min_delay=0.05, hedge_workers=32, admission=None):
+        self.backend = backend
+        self.name = backend.name
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.admission = admission
+        self.executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="techbuddy-hedge") if hedge else None
+        self.latencies = deque(maxlen=512)
+        self.hedge_delay_cache = None
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.recovered = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+        self.lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _record_latency(self, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            if len(self.latencies) % 32 == 0:
+                self.hedge_delay_cache = None
+
+    def hedge_delay(self):
+        """p95 of recent successful calls; None until there are enough samples"""
+        with self.lock:
+            if self.hedge_delay_cache is None and len(self.latencies) >= self.HEDGE_MIN_SAMPLES:
+                self.hedge_delay_cache = max(self.hedge_min_delay, float(np.percentile(self.latencies, 95)))
+            return self.hedge_delay_cache
+
+    def _hedge_slot(self):
+        """Take an admission slot for a hedge copy without waiting; returns its release callback, or None"""
+        if self.admission is None:
+            return lambda _: None
+        if not self.admission.try_acquire():
+            self._count("hedges_skipped")
+            return None
+        started = time.time()
+        return lambda _: self.admission.release(time.time() - started)
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _attempts(self, params):
+        """Yield (attempt, per-attempt params) until retries or the request's timeout budget run out"""
+        deadline = time.time() + params.get("request_timeout", self.DEFAULT_TIMEOUT)
+        for attempt in range(self.max_retries + 1):
+            self.circuit_breaker.allow()
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError("Upstream deadline exceeded")
+            yield attempt, dict(params, request_timeout=remaining), deadline
+
+    def _failed(self, error, attempt, deadline):
+        """Record a failed attempt; return the backoff before retrying, or None to give up"""
+        transient = isinstance(error, transient_errors())
+        if transient:
+            self.circuit_breaker.record_failure()
+        elif not isinstance(error, CircuitOpen):
+            # Upstream answered, just not with a reply (e.g. an invalid request)
+            self.circuit_breaker.record_success()
+        if not transient or attempt >= self.max_retries:
+            self._count("failures")
+            return None
+        delay = self._backoff(attempt)
+        if time.time() + delay >= deadline:
+            self._count("failures")
+            return None
+        self._count("retries")
+        return delay
+
+    def _succeeded(self, attempt, started):
+        self.circuit_breaker.record_success()
+        self._record_latency(time.perf_counter() - started)
+        if attempt:
+            self._count("recovered")
+
+    def complete(self, messages, **params) -> str:
+        self._count("calls")
+        for attempt, attempt_params, deadline in self._attempts(params):
+            started = time.perf_counter()
+            try:
+                reply = self._hedged(messages, attempt_params)
+            except Exception as e:
+                delay = self._failed(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._succeeded(attempt, started)
+            return reply
+
+    def _hedged(self, messages, params):
+        """Run the call, racing a second copy if it outlives the hedge delay"""
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is None:
+            return self.backend.complete(messages, **params)
+
+        primary = self.executor.submit(self.backend.complete, messages, **params)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        release = self._hedge_slot()
+        if release is None:
+            return primary.result()
+        # Only the winning call's usage is reported; the tokens spent by the other one are not counted
+        self._count("hedges")
+        hedge = self.executor.submit(self.backend.complete, messages, **params)
+        hedge.add_done_callback(release)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    # The slower call keeps running on its thread; its reply is discarded
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acomplete(self, messages, **params) -> str:
+        self._count("calls")
+        for attempt, attempt_params, deadline in self._attempts(params):
+            started = time.perf_counter()
+            try:
+                reply = await self._ahedged(messages, attempt_params)
+            except Exception as e:
+                delay = self._failed(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._succeeded(attempt, started)
+            return reply
+
+    async def _ahedged(self, messages, params):
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is None:
+            return await self.backend.acomplete(messages, **params)
+
+        primary = asyncio.ensure_future(self.backend.acomplete(messages, **params))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        release = self._hedge_slot()
+        if release is None:
+            return await primary
+        self._count("hedges")
+        hedge = asyncio.ensure_future(self.backend.acomplete(messages, **params))
+        hedge.add_done_callback(release)
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream(self, messages, **params):
+        """Retry only until the first token has been sent; streams are never hedged
+
+        Time to first token is not recorded in the latencies behind hedge_delay, which are whole-reply times.
+        """
+        self._count("calls")
+        for attempt, attempt_params, deadline in self._attempts(params):
+            first_token = True
+            try:
+                for token in self.backend.stream(messages, **attempt_params):
+                    first_token = False
+                    yield token
+            except Exception as e:
+                if not first_token:
+                    # Part of the reply is already with the client
+                    self.circuit_breaker.record_failure()
+                    self._count("failures")
+                    raise
+                delay = self._failed(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.circuit_breaker.record_success()
+            if attempt:
+                self._count("recovered")
+            return
+
+    async def open(self):
+        await self.backend.open()
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self):
+        hedge_delay = self.hedge_delay() if self.hedge else None
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "recovered_by_retry": self.recovered,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedges_skipped": self.hedges_skipped,
+            "hedge_delay": round(hedge_delay, 3) if hedge_delay is not None else None,
+            "circuit": self.circuit_breaker.stats()
+        }
+
+
+def create_backend(name, api_key=None, mock_url=None, pool_size=100, fake_latency=0.05, fake_jitter=0.02,
+                   fake_error_rate=0.0):
+    """Build the LLM backend selected by TECHBUDDY_BACKEND"""
+    if name == "openai":
+        return OpenAIBackend(api_key, pool_size=pool_size)
+    if name == "mock":
+        return MockHTTPBackend(mock_url or "http://127.0.0.1:8001/v1", pool_size=pool_size)
+    if name == "fake":
+        return FakeBackend(fake_latency, fake_jitter, fake_error_rate)
+    raise ValueError(f"Unknown LLM backend: {name}")
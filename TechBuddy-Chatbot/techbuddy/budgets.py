@@ -0,0 +1,72 @@
+"""Token budgets: shorter replies as a session or the whole service nears its budget, cached answers only past it"""
+
+import threading
+import time
+
+
+class TokenBudget:
+    """Per-session (lifetime) and global (rolling window) token budgets; a limit of 0 means unlimited"""
+
+    FULL = "full"
+    REDUCED = "reduced"
+    CACHE_ONLY = "cache_only"
+
+    def __init__(self, session_limit=0, global_limit=0, window=3600, soft_ratio=0.8, reduced_max_tokens=60,
+                 refresh_interval=1.0):
+        self.session_limit = session_limit
+        self.global_limit = global_limit
+        self.window = window
+        self.soft_ratio = soft_ratio
+        self.reduced_max_tokens = reduced_max_tokens
+        self.refresh_interval = refresh_interval
+        # (monotonic time, tokens) of the last global usage query
+        self.global_usage = (float("-inf"), 0)
+        self.modes = {self.FULL: 0, self.REDUCED: 0, self.CACHE_ONLY: 0}
+        self.refused = 0
+        self.lock = threading.Lock()
+
+    def _global_tokens(self, window_usage):
+        """Tokens used across all sessions in the window, re-queried at most once per refresh_interval"""
+        checked_at, tokens = self.global_usage
+        now = time.monotonic()
+        if now - checked_at >= self.refresh_interval:
+            tokens = window_usage(self.window)
+            self.global_usage = (now, tokens)
+        return tokens
+
+    def mode(self, session_tokens, window_usage):
+        """FULL, REDUCED (past soft_ratio of a budget) or CACHE_ONLY (a budget is spent) for the next upstream call
+
+        window_usage(seconds) returns the tokens used by every session over the last `seconds`.
+        """
+        mode = self.FULL
+        if self.session_limit or self.global_limit:
+            for used, limit in ((session_tokens, self.session_limit),
+                                (self._global_tokens(window_usage) if self.global_limit else 0, self.global_limit)):
+                if not limit:
+                    continue
+                if used >= limit:
+                    mode = self.CACHE_ONLY
+                    break
+                if used >= limit * self.soft_ratio:
+                    mode = self.REDUCED
+        with self.lock:
+            self.modes[mode] += 1
+        return mode
+
+    def record_refusal(self):
+        """A cache-only turn found nothing in the caches"""
+        with self.lock:
+            self.refused += 1
+
+    def stats(self):
+        return {
+            "session_limit": self.session_limit,
+            "global_limit": self.global_limit,
+            "window_seconds": self.window,
+            "global_tokens_in_window": self.global_usage[1] if self.global_limit else None,
+            "full_turns": self.modes[self.FULL],
+            "reduced_turns": self.modes[self.REDUCED],
+            "cache_only_turns": self.modes[self.CACHE_ONLY],
+            "refused_turns": self.refused
+        }
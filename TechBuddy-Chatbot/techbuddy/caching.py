@@ -0,0 +1,333 @@
+"""Exact-match and semantic response caches, and single-flight deduplication of identical requests"""
+
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class ResponseCache:
+    """LRU + TTL cache of replies keyed on the normalized question and its prompt context"""
+
+    def __init__(self, max_entries=2048, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def normalize(text):
+        """Lowercase, collapse whitespace and drop trailing punctuation"""
+        return " ".join(text.lower().split()).rstrip("?!. ")
+
+    def make_key(self, user_input, messages):
+        """Hash the normalized question together with everything sent before it"""
+        return self.normalize(user_input), self.context_digest(messages[:-1])
+
+    @staticmethod
+    def context_digest(messages):
+        digest = hashlib.blake2b(digest_size=16)
+        for message in messages:
+            digest.update(message["role"].encode())
+            digest.update(b"\0")
+            digest.update(message["content"].encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            response, expires_at = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key, response):
+        with self.lock:
+            self.entries[key] = (response, time.time() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0
+        }
+
+
+class SemanticCache:
+    """Paraphrase cache: questions become sets of canonical content words, compared by cosine similarity
+
+    Filler and stopwords are dropped, plurals folded, prices like "1k" or "$1,000" written out, and common synonyms
+    mapped to one word, so "laptop for coding under 1k" matches "good programming laptop below $1000". Every
+    remaining word counts the same, so "reset my router" and "reset my modem" share only half their words, except
+    negations, which weigh enough that a question and its negation never match.
+    """
+
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+    THOUSANDS = re.compile(r"\b(\d+(?:\.\d+)?)k\b")
+    DIGIT_GROUPS = re.compile(r"(?<=\d),(?=\d{3}\b)")
+    NOT_CONTRACTION = re.compile(r"n't\b")
+    NEGATIONS = frozenset(("not", "no", "never", "without"))
+    NEGATION_WEIGHT = 3.0
+    STOPWORDS = frozenset(
+        "a about am an and any anything are as at be best buy by can could do does for from get give good great "
+        "have help how i if in is it its just know like looking me my need of on one or please price "
+        "recommend recommendation should so some suggest tell than that the there this to up us usd want was way "
+        "we what which why will with would you your dollar dollars buck bucks ca wo"
+        .split()
+    )
+    SYNONYMS = {
+        "code": "programming", "coding": "programming", "developer": "programming", "development": "programming",
+        "programmer": "programming",
+        "below": "under", "less": "under", "cheaper": "under", "max": "under", "maximum": "under", "within": "under",
+        "affordable": "cheap", "budget": "cheap", "inexpensive": "cheap",
+        "notebook": "laptop",
+        "cellphone": "phone", "mobile": "phone", "smartphone": "phone",
+        "repair": "fix", "solve": "fix", "troubleshoot": "fix",
+        "reboot": "restart",
+        "cannot": "not",
+    }
+
+    def __init__(self, max_entries=10000, threshold=0.85, dim=512, ttl=3600):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.dim = dim
+        self.ttl = ttl
+
+        # One row per cached question; rows are reused once the index is full
+        self.vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self.contexts = np.zeros(max_entries, dtype=np.int64)
+        self.expires = np.zeros(max_entries, dtype=np.float64)
+        self.last_used = np.zeros(max_entries, dtype=np.float64)
+        self.responses = [None] * max_entries
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def terms(self, text):
+        """Canonical content words of text, each once"""
+        text = self.NOT_CONTRACTION.sub(" not", self.DIGIT_GROUPS.sub("", text.lower()))
+        text = self.THOUSANDS.sub(lambda m: f"{float(m.group(1)) * 1000:g}", text)
+        terms = {}
+        for word in self.TOKEN_PATTERN.findall(text):
+            if word in self.STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss") and not word[0].isdigit():
+                word = word[:-1]
+            word = self.SYNONYMS.get(word, word)
+            if word not in self.STOPWORDS and (len(word) > 1 or word.isdigit()):
+                terms[word] = None
+        return list(terms)
+
+    def embed(self, text):
+        """Map text to a unit vector of signed, hashed content words"""
+        features = self.terms(text)
+        if not features:
+            return None
+
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+        signs *= [self.NEGATION_WEIGHT if f in self.NEGATIONS else 1.0 for f in features]
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    @staticmethod
+    def context_id(context_digest):
+        """Fold a ResponseCache context digest into an int64 for vectorized matching"""
+        return np.int64(int(context_digest[:16], 16) - (1 << 63))
+
+    def get(self, user_input, context_digest):
+        """Return the cached reply of the most similar question asked in the same context"""
+        vector = self.embed(user_input)
+        now = time.time()
+        with self.lock:
+            if vector is None or self.size == 0:
+                self.misses += 1
+                return None
+
+            scores = self.vectors[:self.size] @ vector
+            scores[self.contexts[:self.size] != self.context_id(context_digest)] = -1.0
+            scores[self.expires[:self.size] < now] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.last_used[best] = now
+            self.hits += 1
+            return self.responses[best]
+
+    def put(self, user_input, context_digest, response):
+        vector = self.embed(user_input)
+        if vector is None:
+            return
+        now = time.time()
+        with self.lock:
+            if self.size < self.max_entries:
+                row = self.size
+                self.size += 1
+            else:
+                # Reuse the least recently used row
+                row = int(np.argmin(self.last_used))
+                self.evictions += 1
+
+            self.vectors[row] = vector
+            self.contexts[row] = self.context_id(context_digest)
+            self.expires[row] = now + self.ttl
+            self.last_used[row] = now
+            self.responses[row] = response
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0
+        }
+
+
+class LeaderTimeout(Exception):
+    """A coalesced caller gave up waiting for the leader's call"""
+
+
+class SingleFlight:
+    """Lets concurrent callers with the same key share one in-flight upstream call"""
+
+    def __init__(self):
+        self.calls = {}
+        self.leader_calls = 0
+        self.coalesced_calls = 0
+        self.follower_timeouts = 0
+        self.lock = threading.Lock()
+
+    def begin(self, key):
+        """Return (future, is_leader); only the leader makes the call and must then finish it"""
+        if key is None:
+            return None, True
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                self.coalesced_calls += 1
+                return future, False
+            future = Future()
+            self.calls[key] = future
+            self.leader_calls += 1
+            return future, True
+
+    def finish(self, key, future, result=None, error=None):
+        """Publish the leader's result (or error) to every waiting caller"""
+        if future is None:
+            return
+        with self.lock:
+            if self.calls.get(key) is future:
+                del self.calls[key]
+        if error is not None:
+            # Waiters must not receive GeneratorExit/CancelledError from the leader's own cancellation
+            future.set_exception(error if isinstance(error, Exception) else RuntimeError("Upstream call was cancelled"))
+        else:
+            future.set_result(result)
+
+    def result(self, future, timeout=None):
+        """The leader's result; raises LeaderTimeout if it is still running after timeout seconds"""
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            if future.done():
+                raise
+            self._timed_out()
+            raise LeaderTimeout() from None
+
+    async def aresult(self, future, timeout=None):
+        try:
+            # Shielded: the shared future must not be cancelled for the leader and other followers
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except TimeoutError:
+            if future.done():
+                raise
+            self._timed_out()
+            raise LeaderTimeout() from None
+
+    def _timed_out(self):
+        with self.lock:
+            self.follower_timeouts += 1
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() unless an identical call is in flight, in which case wait up to timeout for its result
+
+        A follower whose leader has not finished in time makes its own call.
+        """
+        future, leader = self.begin(key)
+        if not leader:
+            try:
+                return self.result(future, timeout)
+            except LeaderTimeout:
+                return fn()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    async def ado(self, key, coro_fn, timeout=None):
+        """Async variant of do; sync and async callers share the same in-flight calls"""
+        future, leader = self.begin(key)
+        if not leader:
+            try:
+                return await self.aresult(future, timeout)
+            except LeaderTimeout:
+                return await coro_fn()
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stats(self):
+        return {
+            "in_flight": len(self.calls),
+            "upstream_calls": self.leader_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "follower_timeouts": self.follower_timeouts
+        }
@@ -0,0 +1,975 @@
+"""The TechBuddy chatbot: sessions, caches, routing, upstream calls and KPIs, plus its factory"""
+
+import asyncio
+import atexit
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from .admission import AdmissionController, Overloaded
+from .analytics import EventColumns
+from .backends import CircuitBreaker, OpenAIBackend, ResilientBackend, create_backend
+from .budgets import TokenBudget
+from .caching import LeaderTimeout, ResponseCache, SemanticCache, SingleFlight
+from .config import (ANALYTICS_DIR, BATCH_WORKERS, BUDGET_MAX_TOKENS, CIRCUIT_FAILURES, CIRCUIT_RESET,
+                     EVENT_FLUSH_INTERVAL, EVENT_SNAPSHOT_EVERY, EVENT_STORE_PATH, FAKE_ERROR_RATE, FAKE_JITTER,
+                     FAKE_LATENCY, GLOBAL_TOKEN_BUDGET, HEDGE_REQUESTS, KB_MAX_TOKENS, KB_TOP_K, KNOWLEDGE_BASE_DIR,
+                     KNOWLEDGE_INDEX_DIR, KPI_WINDOWS, LLM_BACKEND, MAX_HISTORY, MAX_PROMPT_TOKENS, MAX_SESSIONS,
+                     MOCK_LLM_URL, OPENAI_API_KEY, REQUEST_DEADLINE, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL,
+                     SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, SESSION_TOKEN_BUDGET, SESSION_TTL,
+                     SHARED_FLUSH_INTERVAL, SHARED_STATE_PATH, STREAM_WORKERS, SUMMARY_WORKERS, TOKEN_BUDGET_SOFT,
+                     TOKEN_BUDGET_WINDOW, UPSTREAM_CONCURRENCY, UPSTREAM_POOL_SIZE, UPSTREAM_QUEUE_SIZE,
+                     UPSTREAM_RETRIES)
+from .context import ContextBuilder, estimate_tokens
+from .events import EventStore
+from .intents import IntentRouter
+from .knowledge import KnowledgeBase
+from .metrics import LatencyHistogram, RunningStat, WindowedSeries
+from .sessions import SessionManager, SharedSessionManager
+from .shared_state import SharedStat, SharedState, SharedWindowedSeries
+from .telemetry import Telemetry, timed
+
+
+class ChatTurn:
+    """State carried through a single chat request"""
+    __slots__ = ("session", "user_input", "messages", "cache_key", "semantic_context", "bot_response", "cached",
+                 "local_response", "start_time", "deadline", "max_tokens", "usage")
+
+    def __init__(self, session, user_input, timeout=30.0):
+        self.session = session
+        self.user_input = user_input
+        self.messages = None
+        self.cache_key = None
+        self.semantic_context = None
+        self.bot_response = None
+        self.cached = False
+        self.local_response = None
+        self.start_time = time.time()
+        self.deadline = self.start_time + timeout
+        # Reply length cap set by the token budget, and (prompt, completion) tokens of this turn's upstream call
+        self.max_tokens = None
+        self.usage = None
+
+
+class PersonalizedChatbot:
+    # Global counters kept in self.kpis (or SharedState), also written to event-log snapshots
+    COUNTERS = ("total_queries", "resolved_queries", "prompt_tokens", "completion_tokens", "metered_calls",
+                "estimated_calls")
+    # Answers to the improvement survey, in the order they are offered
+    IMPROVEMENT_AREAS = ("Response Time", "Answer Quality", "User Interface", "Other")
+
+    def __init__(self, api_key, max_sessions=10000, session_ttl=1800, max_history=20, response_cache=None,
+                 semantic_cache=None, max_prompt_tokens=1500, summary_workers=2, backend=None, admission=None,
+                 request_deadline=30.0, knowledge_base=None, kb_top_k=3, kb_max_tokens=400, event_store=None,
+                 shared_state=None, telemetry=None, token_budget=None, batch_workers=32, analytics=None,
+                 stream_workers=64):
+        """Initialize chatbot with API key and KPI tracking"""
+        try:
+            self.api_key = api_key
+            self.start_time = datetime.now(timezone.utc)
+
+            # Chatbot personality and configuration
+            self.personality = {
+                "role": "customer_service",
+                "tone": "friendly and professional",
+                "expertise": "tech support",
+                "name": "TechBuddy"
+            }
+
+            # Initialize KPI tracking
+            self.kpis = {
+                "resolved_queries": 0,
+                "total_queries": 0,
+                "session_start": self.start_time,
+                "improvement_feedback": {},
+                # Upstream token usage; calls whose backend reports no usage are estimated
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "metered_calls": 0,
+                "estimated_calls": 0
+            }
+
+            # Constant-time lifetime aggregates and fixed-size recent-window buckets
+            self.kpi_stats = {
+                "satisfaction": RunningStat(),
+                "response_time": LatencyHistogram(),
+                "time_to_first_token": LatencyHistogram()
+            }
+            self.kpi_windows = {
+                "satisfaction": WindowedSeries(),
+                "response_time": WindowedSeries(),
+                "time_to_first_token": WindowedSeries(),
+                "resolution": WindowedSeries(),
+                "tokens": WindowedSeries()
+            }
+            self.kpi_lock = threading.Lock()
+
+            # Write-behind log of KPI events and turns, replayed on restart
+            self.event_store = event_store
+
+            # Cluster-wide KPIs and sessions when several worker processes serve the app
+            self.shared_state = shared_state
+            if shared_state is not None:
+                self.kpis["session_start"] = datetime.fromtimestamp(shared_state.created_at, timezone.utc)
+                self.kpi_stats = {name: SharedStat(shared_state, name, stat) for name, stat in self.kpi_stats.items()}
+                self.kpi_windows = {name: SharedWindowedSeries(shared_state, name) for name in self.kpi_windows}
+
+            # Survey and engagement events in NumPy columns, for group-by reports over the full history
+            self.analytics = analytics if analytics is not None else EventColumns(areas=self.IMPROVEMENT_AREAS)
+
+            # Per-phase latency histograms of the request hot path, exported on /metrics
+            self.telemetry = telemetry or Telemetry(shared_state)
+
+            # Define surveys for feedback
+            self.surveys = {
+                "satisfaction": {
+                    "question": "How satisfied are you with our service? (1-5)",
+                    "type": "rating",
+                    "options": range(1, 6)
+                },
+                "improvement": {
+                    "question": "What area should we improve? (Type the number)\n1. Response Time\n2. Answer Quality\n3. User Interface\n4. Other",
+                    "type": "choice",
+                    "options": range(1, 5)
+                },
+                "resolution": {
+                    "question": "Was your issue resolved? (yes/no)",
+                    "type": "boolean",
+                    "options": ["yes", "no"]
+                }
+            }
+            self.survey_options = {
+                name: frozenset(str(option) for option in survey["options"])
+                for name, survey in self.surveys.items()
+            }
+
+            # Per-user conversation history and survey state. Turns past max_history are folded into the summary by
+            # the context builder; the store's own cap (twice that) only bounds histories whose summaries keep failing
+            if shared_state is not None:
+                self.sessions = SharedSessionManager(shared_state, max_sessions, session_ttl, 2 * max_history)
+            else:
+                self.sessions = SessionManager(max_sessions, session_ttl, 2 * max_history)
+
+            # Local answers for small talk, checked before any upstream work
+            self.intent_router = IntentRouter(self.personality)
+
+            # Product sheets and support docs retrieved into the prompt
+            self.knowledge_base = knowledge_base
+            self.kb_top_k = kb_top_k
+            self.kb_max_tokens = kb_max_tokens
+
+            # Upstream backend and completion settings
+            self.backend = backend or OpenAIBackend(api_key)
+            self.completion_params = {
+                "model": "gpt-3.5-turbo",
+                "temperature": 0.7,
+                "max_tokens": 150
+            }
+
+            # Token-budgeted prompt building with background summaries of older turns
+            self.context_builder = ContextBuilder(self._summarize, max_prompt_tokens, summary_workers,
+                                                  on_summary=self._session_summarized, max_messages=max_history)
+
+            # Exact-match cache in front of the upstream call, backed by an optional semantic cache
+            self.response_cache = response_cache if response_cache is not None else ResponseCache()
+            self.semantic_cache = semantic_cache
+
+            # Identical prompts already in flight share one upstream call
+            self.single_flight = SingleFlight()
+
+            # Shorter replies near a token budget, cached answers only past it
+            self.token_budget = token_budget or TokenBudget()
+
+            # Bounded upstream concurrency; survey answers never pass through it
+            self.admission = admission or AdmissionController()
+            self.request_deadline = request_deadline
+
+            # Threads answering batch items, shared by all batches in this process
+            self.batch_executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix="techbuddy-batch")
+            # Threads stepping through streamed replies for the async server
+            self.stream_executor = ThreadPoolExecutor(max_workers=stream_workers, thread_name_prefix="techbuddy-stream")
+
+            # System message
+            self.system_message = f"""
+                        You are {self.personality['name']}, a {self.personality['tone']} chatbot specialized in {self.personality['expertise']}.
+            Current time: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} UTC
+            Current user: R2Vve
+
+            When providing product listings:
+            1. Always include detailed descriptions
+            2. Use clear separators between product name and description (use '-' or ':')
+            3. Break down features with proper punctuation
+            4. Include price if available, using only the product information provided to you
+            5. List at least 3 options when comparing products
+            6. Format specifications in clear, separate points
+
+            Example format:
+            1. Product Name - Main description. Feature one. Feature two. Feature three.
+            2. Product Name - Main description. Feature one. Feature two. Feature three.
+
+            Your goal is to provide helpful, accurate, and efficient support while maintaining a consistent personality.
+            """
+
+            if self.event_store is not None:
+                self._recover()
+                self.event_store.start(self._snapshot_state)
+
+            print(f"✅ {self.personality['name']} initialized successfully!")
+
+        except Exception as e:
+            print(f"❌ Error initializing chatbot: {str(e)}")
+            raise
+
+    def record_kpi(self, name, value, session_id=None):
+        """Add a sample to the lifetime aggregate and the recent-window buckets"""
+        self.record_event("kpi", {"name": name, "value": value}, session_id)
+
+    def record_event(self, kind, data, session_id=None):
+        """Apply a KPI event in memory and queue it for the event store and the analytics columns"""
+        with self.kpi_lock:
+            now = time.time()
+            self._apply_event(kind, data, now)
+            if self.event_store is not None:
+                self.event_store.append(kind, None, data, now)
+        self._record_analytics(kind, data, session_id, now)
+
+    def _record_analytics(self, kind, data, session_id, now):
+        """Columnar copy of engagement and survey events; replayed events are already in the columns"""
+        if kind == "query":
+            self.analytics.append("query", now, data["seconds"], session_id)
+        elif kind == "kpi" and data["name"] == "satisfaction":
+            self.analytics.append("satisfaction", now, data["value"], session_id)
+        elif kind == "feedback":
+            self.analytics.append("feedback", now, 0.0, session_id, data["area"])
+        elif kind == "resolution":
+            self.analytics.append("resolution", now, 1.0 if data["resolved"] else 0.0, session_id)
+
+    def _apply_event(self, kind, data, now):
+        """Fold one KPI event into the aggregates (caller holds kpi_lock); also used for replay"""
+        if kind == "query":
+            self._count("total_queries")
+            self._add_sample("response_time", data["seconds"], now)
+        elif kind == "resolution":
+            if data["resolved"]:
+                self._count("resolved_queries")
+            self._add_sample("resolution", 1 if data["resolved"] else 0, now)
+        elif kind == "feedback":
+            self._count("improvement_feedback", data["area"])
+        elif kind == "usage":
+            self._count("prompt_tokens", amount=data["prompt"])
+            self._count("completion_tokens", amount=data["completion"])
+            self._count("metered_calls")
+            if data["estimated"]:
+                self._count("estimated_calls")
+            self._add_sample("tokens", data["prompt"] + data["completion"], now)
+        else:
+            self._add_sample(data["name"], data["value"], now)
+
+    def _count(self, name, key=None, amount=1):
+        if self.shared_state is not None:
+            self.shared_state.increment(f"{name}:{key}" if key else name, amount)
+        elif key is None:
+            self.kpis[name] += amount
+        else:
+            self.kpis[name][key] = self.kpis[name].get(key, 0) + amount
+
+    def _kpi_counters(self):
+        """Query, token and feedback counters, cluster-wide when state is shared"""
+        if self.shared_state is None:
+            with self.kpi_lock:
+                counters = {name: self.kpis[name] for name in self.COUNTERS}
+                counters["improvement_feedback"] = dict(self.kpis["improvement_feedback"])
+                return counters
+        shared = self.shared_state.counters()
+        counters = {name: int(shared.get(name, 0)) for name in self.COUNTERS}
+        counters["improvement_feedback"] = {name.split(":", 1)[1]: int(value) for name, value in shared.items()
+                                            if name.startswith("improvement_feedback:")}
+        return counters
+
+    def _add_sample(self, name, value, now):
+        if name in self.kpi_stats:
+            self.kpi_stats[name].add(value)
+        self.kpi_windows[name].add(value, now)
+
+    def _session_summarized(self, session):
+        """Log and save a new running summary and the history it left (caller holds session.lock)"""
+        if self.event_store is not None:
+            self.event_store.append("summary", session.session_id,
+                                    {"summary": session.summary, "kept": len(session.conversation_history)})
+        self.sessions.save(session)
+
+    def _snapshot_state(self):
+        """Consistent copy of the KPI aggregates with the last event sequence folded into them"""
+        with self.kpi_lock:
+            return self.event_store.sequence, {
+                "kpis": dict({name: self.kpis[name] for name in self.COUNTERS},
+                             improvement_feedback=dict(self.kpis["improvement_feedback"])),
+                "stats": {name: stat.state() for name, stat in self.kpi_stats.items()},
+                "windows": {name: series.state() for name, series in self.kpi_windows.items()}
+            }
+
+    def _recover(self):
+        """Rebuild KPIs from the latest snapshot plus the log tail, and live sessions from their turns"""
+        started = time.perf_counter()
+        _, state, events = self.event_store.load()
+        with self.kpi_lock:
+            if state is not None:
+                self.kpis.update(state["kpis"])
+                for name, stat_state in state["stats"].items():
+                    self.kpi_stats[name].load_state(stat_state)
+                for name, series_state in state["windows"].items():
+                    self.kpi_windows[name].load_state(series_state)
+            for ts, kind, _, data in events:
+                self._apply_event(kind, data, ts)
+            self.kpis["session_start"] = datetime.fromtimestamp(self.event_store.created_at, timezone.utc)
+
+        # Only sessions that could still be live are rebuilt, each from its first turn
+        for _, kind, session_id, data, last_active in self.event_store.session_events(
+                time.time() - self.sessions.idle_ttl):
+            session = self.sessions.restore_session(session_id, last_active)
+            history = session.conversation_history
+            if kind == "turn":
+                self.sessions.append_turn(session, data["user"], data["assistant"])
+                if "usage" in data:
+                    session.prompt_tokens += data["usage"][0]
+                    session.completion_tokens += data["usage"][1]
+            elif kind == "summary":
+                session.summary = data["summary"]
+                history.drop_front(max(0, len(history) - data["kept"]))
+
+        print(f"✅ Restored {len(events)} KPI events and {len(self.sessions)} sessions "
+              f"in {time.perf_counter() - started:.2f}s")
+
+    def close(self):
+        """Flush pending events and write a final snapshot"""
+        self.analytics.flush()
+        if self.event_store is not None:
+            self.event_store.close()
+        if self.shared_state is not None:
+            self.shared_state.close()
+
+    def handle_survey_response(self, response, survey_type, session_id=None):
+        """Process survey responses and update KPIs"""
+        if survey_type == "satisfaction":
+            score = int(response)
+            self.record_kpi("satisfaction", score, session_id)
+            return {
+                "response": "Thank you for your feedback! Would you like to share what we could improve?",
+                "type": "survey_followup",
+                "next_survey": "improvement"
+            }
+
+        elif survey_type == "improvement":
+            area = self.IMPROVEMENT_AREAS[int(response) - 1]
+            self.record_event("feedback", {"area": area}, session_id)
+            return {
+                "response": f"Thank you for suggesting we improve our {area}. Was your issue resolved?",
+                "type": "survey_followup",
+                "next_survey": "resolution"
+            }
+
+        elif survey_type == "resolution":
+            resolved = response.lower() == "yes"
+            self.record_event("resolution", {"resolved": resolved}, session_id)
+            return {
+                "response": "Thank you for your feedback! Your input helps us improve our service.",
+                "type": "survey_complete"
+            }
+
+    def generate_response(self, user_input: str, session_id: str = None, use_cache: bool = True) -> dict:
+        """Generate response with KPI tracking and surveys"""
+        started = time.perf_counter()
+        response_data = None
+        session = self._get_session(session_id)
+
+        try:
+            turn = self._start_turn(session, user_input, use_cache)
+            if turn.local_response is not None:
+                response_data = turn.local_response
+                return response_data
+
+            # Generate chat response
+            if turn.bot_response is None:
+                bot_response = self.single_flight.do(turn.cache_key, lambda: self._complete(turn),
+                                                     self._follower_timeout(turn))
+                self._store_response(turn, bot_response)
+
+            response_data = self._finish_chat(turn)
+            return response_data
+
+        except Overloaded:
+            raise
+        except Exception as e:
+            response_data = self._error_response(session, e)
+            return response_data
+        finally:
+            self._record_chat(started, response_data)
+
+    async def agenerate_response(self, user_input: str, session_id: str = None, use_cache: bool = True) -> dict:
+        """Async variant of generate_response that awaits the upstream call on the shared pool"""
+        started = time.perf_counter()
+        response_data = None
+        session = await self._off_loop(self._get_session, session_id)
+
+        try:
+            turn = await self._off_loop(self._start_turn, session, user_input, use_cache)
+            if turn.local_response is not None:
+                response_data = turn.local_response
+                return response_data
+
+            # Generate chat response without holding a thread for the round trip
+            if turn.bot_response is None:
+                bot_response = await self.single_flight.ado(turn.cache_key, lambda: self._acomplete(turn),
+                                                            self._follower_timeout(turn))
+                await self._off_loop(self._store_response, turn, bot_response)
+
+            response_data = await self._off_loop(self._finish_chat, turn)
+            return response_data
+
+        except Overloaded:
+            raise
+        except Exception as e:
+            response_data = self._error_response(session, e)
+            return response_data
+        finally:
+            self._record_chat(started, response_data)
+
+    def generate_response_stream(self, user_input: str, session_id: str = None, use_cache: bool = True):
+        """Yield ("token", data) events as the backend produces them, then a final ("done", response_data)"""
+        started = time.perf_counter()
+        session = self._get_session(session_id)
+
+        try:
+            turn = self._start_turn(session, user_input, use_cache)
+            if turn.local_response is not None:
+                self._record_chat(started, turn.local_response)
+                yield "done", turn.local_response
+                return
+
+            future, leader = (None, False) if turn.bot_response is not None else self.single_flight.begin(turn.cache_key)
+            if not leader and turn.bot_response is None:
+                try:
+                    turn.bot_response = self.single_flight.result(future, self._follower_timeout(turn))
+                except LeaderTimeout:
+                    # The leader's stream is stuck (e.g. its client reads slowly); stream this reply separately
+                    future, leader = None, True
+            if leader:
+                # Stream chat response; identical requests arriving meanwhile wait for the full reply
+                tokens = []
+                try:
+                    with self.admission.slot(turn.deadline, self._phase_timer("admission_wait")):
+                        # Includes the time the client takes to read the stream
+                        with self._phase_timer("upstream_stream"):
+                            for token in self.backend.stream(turn.messages, **self._upstream_params(turn)):
+                                if not tokens:
+                                    self.record_kpi("time_to_first_token", time.time() - turn.start_time)
+                                tokens.append(token)
+                                yield "token", {"token": token}
+                except BaseException as e:
+                    self.single_flight.finish(turn.cache_key, future, error=e)
+                    raise
+                self.single_flight.finish(turn.cache_key, future, "".join(tokens))
+                self._store_response(turn, "".join(tokens))
+                # Streams report no usage, so the stream's tokens are estimated
+                turn.usage = self._record_usage(turn.messages, turn.bot_response)
+            else:
+                yield "token", {"token": turn.bot_response}
+
+            response_data = self._finish_chat(turn)
+
+        except Overloaded:
+            self._record_chat(started, None)
+            raise
+        except Exception as e:
+            response_data = self._error_response(session, e)
+
+        self._record_chat(started, response_data)
+        yield "done", response_data
+
+    async def agenerate_response_stream(self, user_input: str, session_id: str = None, use_cache: bool = True):
+        """Async variant of generate_response_stream: the stream is advanced one event at a time on stream_executor"""
+        stream = self.generate_response_stream(user_input, session_id, use_cache)
+        finished = object()
+        step = None
+        try:
+            while True:
+                step = self.stream_executor.submit(next, stream, finished)
+                event = await asyncio.wrap_future(step)
+                if event is finished:
+                    return
+                yield event
+        finally:
+            # A cancelled consumer may leave a step running; the stream is closed once it returns
+            self.stream_executor.submit(self._close_stream, stream, step)
+
+    @staticmethod
+    def _close_stream(stream, step):
+        if step is not None:
+            wait([step])
+        stream.close()
+
+    def generate_batch(self, items, concurrency=8):
+        """Answer independent generate_response kwargs dicts with at most `concurrency` in flight
+
+        Yields (index, response_data) in completion order. Items not yet started are dropped when the
+        generator is closed early, e.g. when a /chat/batch client disconnects.
+        """
+        items = enumerate(items)
+        pending = set()
+        try:
+            while True:
+                for index, params in items:
+                    pending.add(self.batch_executor.submit(self._batch_item, index, params))
+                    if len(pending) >= concurrency:
+                        break
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def agenerate_batch(self, items, concurrency=8):
+        """Async variant of generate_batch running the items as tasks on the event loop"""
+        items = enumerate(items)
+        pending = set()
+        try:
+            while True:
+                for index, params in items:
+                    pending.add(asyncio.ensure_future(self._abatch_item(index, params)))
+                    if len(pending) >= concurrency:
+                        break
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _batch_item(self, index, params):
+        try:
+            return index, self.generate_response(**params)
+        except Overloaded as e:
+            return index, self._overloaded_response(e, params)
+
+    async def _abatch_item(self, index, params):
+        try:
+            return index, await self.agenerate_response(**params)
+        except Overloaded as e:
+            return index, self._overloaded_response(e, params)
+
+    @staticmethod
+    def _overloaded_response(error, params):
+        """Batch result for an item rejected by admission control; the rest of the batch carries on"""
+        return {
+            "response": str(error),
+            "type": "overloaded",
+            "retry_after": error.retry_after,
+            "session_id": params.get("session_id")
+        }
+
+    async def open_http_pool(self):
+        """Create the keep-alive connection pool shared by all async upstream calls"""
+        await self.backend.open()
+
+    async def close_http_pool(self):
+        """Close the shared connection pool"""
+        await self.backend.close()
+
+    @staticmethod
+    def _follower_timeout(turn):
+        """Coalesced turns wait for the leader for half their remaining deadline, keeping the rest for their own call"""
+        return max(0.0, turn.deadline - time.time()) / 2
+
+    def _upstream_params(self, turn):
+        """Completion parameters with the upstream timeout capped by the request deadline"""
+        params = dict(self.completion_params, request_timeout=max(1.0, turn.deadline - time.time()))
+        if turn.max_tokens is not None:
+            params["max_tokens"] = min(params["max_tokens"], turn.max_tokens)
+        return params
+
+    def _complete(self, turn):
+        """Call the backend inside an admission slot"""
+        with self.admission.slot(turn.deadline, self._phase_timer("admission_wait")):
+            with self._phase_timer("upstream"):
+                reply = self.backend.complete(turn.messages, **self._upstream_params(turn))
+        turn.usage = self._record_usage(turn.messages, reply)
+        return reply
+
+    async def _off_loop(self, fn, *args):
+        """Run fn on the default executor when state is shared, since it may then query SQLite; inline otherwise"""
+        if self.shared_state is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _acomplete(self, turn):
+        """Await the backend inside an admission slot"""
+        async with self.admission.aslot(turn.deadline, self._phase_timer("admission_wait")):
+            with self._phase_timer("upstream"):
+                reply = await self.backend.acomplete(turn.messages, **self._upstream_params(turn))
+        turn.usage = self._record_usage(turn.messages, reply)
+        return reply
+
+    def _record_usage(self, messages, reply):
+        """Count an upstream call's (prompt, completion) tokens, estimated when the backend reported none"""
+        prompt_tokens = getattr(reply, "prompt_tokens", None)
+        completion_tokens = getattr(reply, "completion_tokens", None)
+        estimated = prompt_tokens is None
+        if estimated:
+            prompt_tokens = sum(self.context_builder.message_tokens(message) for message in messages)
+            completion_tokens = estimate_tokens(reply)
+        self.record_event("usage", {"prompt": prompt_tokens, "completion": completion_tokens, "estimated": estimated})
+        return prompt_tokens, completion_tokens
+
+    def _window_tokens(self, seconds):
+        """Tokens used by all sessions over the last `seconds`"""
+        return int(self.kpi_windows["tokens"].query(seconds)["sum"])
+
+    def _phase_timer(self, phase):
+        return self.telemetry.time(Telemetry.PHASE_METRIC, phase=phase)
+
+    def _record_chat(self, started, response_data):
+        """Time a whole chat turn by reply type; None means it was rejected as overloaded"""
+        if response_data is None:
+            reply_type = "overloaded"
+        else:
+            reply_type = "cached" if response_data.get("cached") else response_data.get("type", "unknown")
+        self.telemetry.observe(Telemetry.CHAT_METRIC, time.perf_counter() - started, type=reply_type)
+
+    @timed("session")
+    def _get_session(self, session_id):
+        return self.sessions.get_session(session_id)
+
+    def _error_response(self, session, error):
+        return {
+            "response": f"I apologize, but I encountered an error: {str(error)}",
+            "type": "error",
+            "session_id": session.session_id
+        }
+
+    def _start_turn(self, session, user_input, use_cache):
+        """Answer survey and small-talk turns locally, else build the prompt and check the caches"""
+        turn = ChatTurn(session, user_input, self.request_deadline)
+
+        with session.lock:
+            # Handle active survey
+            if session.current_survey:
+                self.intent_router.record_survey()
+                turn.local_response = self._handle_survey_turn(session, user_input)
+                self.sessions.save(session)
+                return turn
+
+            # Greetings, thanks and FAQs never reach the LLM
+            routed = self.intent_router.route(user_input)
+            if routed is not None:
+                intent, reply = routed
+                turn.local_response = {
+                    "response": reply,
+                    "type": "intent",
+                    "intent": intent,
+                    "session_id": session.session_id
+                }
+                return turn
+
+            turn.messages = self._build_messages(session, user_input)
+            mode = self.token_budget.mode(session.prompt_tokens + session.completion_tokens, self._window_tokens)
+
+        # Past a budget only cached answers are given, even if the client asked to skip the cache
+        if use_cache or mode == TokenBudget.CACHE_ONLY:
+            self._check_caches(turn)
+        if mode == TokenBudget.REDUCED:
+            turn.max_tokens = self.token_budget.reduced_max_tokens
+        elif mode == TokenBudget.CACHE_ONLY and turn.bot_response is None:
+            self.token_budget.record_refusal()
+            turn.local_response = {
+                "response": "I'm sorry, but I've reached my usage limit for now, so I can only answer questions "
+                            "I've already answered. Please try again later.",
+                "type": "budget_exceeded",
+                "session_id": session.session_id
+            }
+        return turn
+
+    @timed("cache_lookup")
+    def _check_caches(self, turn):
+        """Look the turn up in the exact-match cache, then the semantic cache"""
+        turn.cache_key = self.response_cache.make_key(turn.user_input, turn.messages)
+        turn.bot_response = self.response_cache.get(turn.cache_key)
+        if self.semantic_cache is not None:
+            # Paraphrases retrieve different passages, so the semantic cache matches on the conversation alone
+            turn.semantic_context = ResponseCache.context_digest([
+                message for message in turn.messages[:-1]
+                if not message["content"].startswith(ContextBuilder.KNOWLEDGE_HEADER)])
+            if turn.bot_response is None:
+                turn.bot_response = self.semantic_cache.get(turn.user_input, turn.semantic_context)
+        turn.cached = turn.bot_response is not None
+
+    def _store_response(self, turn, bot_response):
+        """Record the upstream reply on the turn and cache it"""
+        turn.bot_response = bot_response
+        if turn.cache_key is not None:
+            self.response_cache.put(turn.cache_key, bot_response)
+            if self.semantic_cache is not None:
+                self.semantic_cache.put(turn.user_input, turn.semantic_context, bot_response)
+
+    def _handle_survey_turn(self, session, user_input):
+        """Answer a message sent while a survey is active (caller holds session.lock)"""
+        survey = session.current_survey
+        answer = user_input.strip().lower()
+        if answer in self.survey_options[survey]:
+            response_data = self.handle_survey_response(answer, survey, session.session_id)
+            session.current_survey = response_data.get("next_survey")
+        else:
+            response_data = {
+                "response": f"Please provide a valid response for {self.surveys[survey]['question']}",
+                "type": "survey_error"
+            }
+        response_data["session_id"] = session.session_id
+        return response_data
+
+    @timed("prompt_build")
+    def _build_messages(self, session, user_input):
+        """Build the upstream message list with retrieved knowledge (caller holds session.lock)"""
+        knowledge = None
+        if self.knowledge_base is not None:
+            with self._phase_timer("knowledge"):
+                knowledge = self.knowledge_base.context_for(user_input, self.kb_top_k, self.kb_max_tokens)
+        return self.context_builder.build(self.system_message, session, user_input, knowledge)
+
+    @timed("summarize")
+    def _summarize(self, previous_summary, messages):
+        """Fold older turns into a short running summary of the conversation"""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        if previous_summary:
+            transcript = f"Summary so far: {previous_summary}\n{transcript}"
+
+        messages = [
+            {"role": "system", "content": "Summarize this support conversation in a few sentences. "
+                                          "Keep the user's devices, problems, preferences and any answers given."},
+            {"role": "user", "content": transcript}
+        ]
+        summary = self.backend.complete(messages, model=self.completion_params["model"], temperature=0.3, max_tokens=200)
+        self._record_usage(messages, summary)
+        return summary.strip()
+
+    @timed("finish")
+    def _finish_chat(self, turn):
+        """Store the turn, update KPIs and decide whether to start a survey"""
+        session = turn.session
+        with session.lock:
+            # Update conversation history
+            self.sessions.append_turn(session, turn.user_input, turn.bot_response)
+            turn_event = {"user": turn.user_input, "assistant": turn.bot_response}
+            if turn.usage is not None:
+                # Coalesced and cached turns cost nothing; only the turn that made the call is charged
+                session.prompt_tokens += turn.usage[0]
+                session.completion_tokens += turn.usage[1]
+                turn_event["usage"] = turn.usage
+            if self.event_store is not None:
+                self.event_store.append("turn", session.session_id, turn_event)
+
+            # Update KPIs
+            self.record_event("query", {"seconds": time.time() - turn.start_time}, session.session_id)
+
+            response_data = {
+                "response": turn.bot_response,
+                "type": "chat",
+                "session_id": session.session_id
+            }
+            if turn.cached:
+                response_data["cached"] = True
+            if turn.usage is not None:
+                response_data["usage"] = {
+                    "prompt_tokens": turn.usage[0],
+                    "completion_tokens": turn.usage[1],
+                    "session_tokens": session.prompt_tokens + session.completion_tokens
+                }
+
+            # Randomly trigger satisfaction survey (20% chance)
+            if random.random() < 0.2 and len(session.conversation_history) > 4:
+                session.current_survey = "satisfaction"
+                response_data["follow_up"] = self.surveys["satisfaction"]["question"]
+                response_data["type"] = "survey_request"
+
+            self.sessions.save(session)
+
+        return response_data
+
+    @timed("kpi_metrics")
+    def get_kpi_metrics(self, window=None):
+        """Calculate and return current KPI metrics, optionally over a recent window (see KPI_WINDOWS)"""
+        current_time = datetime.now(timezone.utc)
+        if window is not None:
+            return self._get_window_metrics(window, current_time)
+
+        if self.shared_state is not None:
+            # Make this worker's own recent events visible before reading cluster-wide totals
+            self.shared_state.flush(timeout=1)
+
+        session_duration = (current_time - self.kpis["session_start"]).total_seconds() / 60  # in minutes
+        counters = self._kpi_counters()
+
+        # Read running aggregates instead of rescanning every sample
+        response_time = self.kpi_stats["response_time"].snapshot()
+        first_token = self.kpi_stats["time_to_first_token"].snapshot()
+
+        return {
+            "average_satisfaction": round(self.kpi_stats["satisfaction"].mean, 2),
+            "average_response_time": round(response_time["average"], 2),
+            "average_time_to_first_token": round(first_token["average"], 2),
+            "response_time": response_time,
+            "time_to_first_token": first_token,
+            "total_queries": counters["total_queries"],
+            "resolved_queries": counters["resolved_queries"],
+            "session_duration_minutes": round(session_duration, 2),
+            "response_rate": round(counters["total_queries"] / session_duration, 2) if session_duration > 0 else 0,
+            "resolution_rate": round(counters["resolved_queries"] / counters["total_queries"] * 100, 2) if counters["total_queries"] > 0 else 0,
+            "active_sessions": len(self.sessions),
+            "evicted_sessions": self.sessions.evictions,
+            "response_cache": self.response_cache.stats(),
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache is not None else None,
+            "intent_router": self.intent_router.stats(),
+            "single_flight": self.single_flight.stats(),
+            "admission": self.admission.stats(),
+            "context": self.context_builder.stats(),
+            "knowledge_base": self.knowledge_base.stats() if self.knowledge_base is not None else None,
+            "event_store": self.event_store.stats() if self.event_store is not None else None,
+            "shared_state": self.shared_state.stats() if self.shared_state is not None else None,
+            "backend": self.backend.name,
+            "resilience": self.backend.stats(),
+            "token_usage": self._token_usage(counters),
+            "improvement_feedback": counters["improvement_feedback"],
+            "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S UTC")
+        }
+
+    def _token_usage(self, counters):
+        total = counters["prompt_tokens"] + counters["completion_tokens"]
+        calls = counters["metered_calls"]
+        return {
+            "prompt_tokens": counters["prompt_tokens"],
+            "completion_tokens": counters["completion_tokens"],
+            "total_tokens": total,
+            "upstream_calls": calls,
+            "estimated_calls": counters["estimated_calls"],
+            "average_tokens_per_call": round(total / calls, 1) if calls else 0,
+            "budget": self.token_budget.stats()
+        }
+
+    @timed("analytics")
+    def get_kpi_analytics(self, since=None, until=None):
+        """Group-by reports over the stored survey and engagement events between since and until (epoch seconds)"""
+        return self.analytics.report(since, until)
+
+    def metric_samples(self):
+        """KPI counters and gauges for /metrics as (name, type, help, value)"""
+        counters = self._kpi_counters()
+        admission = self.admission.stats()
+        samples = [
+            ("techbuddy_queries_total", "counter", "Chat turns answered by the LLM or a cache",
+             counters["total_queries"]),
+            ("techbuddy_resolved_queries_total", "counter", "Survey answers saying the issue was resolved",
+             counters["resolved_queries"]),
+            ("techbuddy_prompt_tokens_total", "counter", "Prompt tokens sent upstream", counters["prompt_tokens"]),
+            ("techbuddy_completion_tokens_total", "counter", "Completion tokens received from upstream",
+             counters["completion_tokens"]),
+            ("techbuddy_active_sessions", "gauge", "Live chat sessions", len(self.sessions)),
+            ("techbuddy_response_cache_hits_total", "counter", "Exact-match response cache hits",
+             self.response_cache.hits),
+            ("techbuddy_admission_in_flight", "gauge", "Upstream calls in flight", admission["in_flight"]),
+            ("techbuddy_admission_queued", "gauge", "Requests waiting for an upstream slot", admission["queued"]),
+            ("techbuddy_admission_rejected_total", "counter", "Requests rejected with 503 by admission control",
+             admission["rejected"] + admission["timed_out"])
+        ]
+        if self.semantic_cache is not None:
+            samples.append(("techbuddy_semantic_cache_hits_total", "counter", "Semantic cache hits",
+                            self.semantic_cache.hits))
+        resilience = self.backend.stats()
+        if resilience is not None:
+            samples += [
+                ("techbuddy_upstream_calls_total", "counter", "Upstream LLM calls", resilience["calls"]),
+                ("techbuddy_upstream_failures_total", "counter", "Upstream calls that failed after retries",
+                 resilience["failures"]),
+                ("techbuddy_upstream_retries_total", "counter", "Upstream retries", resilience["retries"]),
+                ("techbuddy_circuit_open", "gauge", "1 while the upstream circuit breaker is open",
+                 int(resilience["circuit"]["state"] == "open"))
+            ]
+        return samples
+
+    def _get_window_metrics(self, window, current_time):
+        """Aggregate the recent-window buckets for one of KPI_WINDOWS"""
+        seconds = KPI_WINDOWS[window]
+        now = current_time.timestamp()
+        if self.shared_state is not None:
+            self.shared_state.flush(timeout=1)
+        response_time = self.kpi_windows["response_time"].query(seconds, now)
+        first_token = self.kpi_windows["time_to_first_token"].query(seconds, now)
+        satisfaction = self.kpi_windows["satisfaction"].query(seconds, now)
+        resolution = self.kpi_windows["resolution"].query(seconds, now)
+        tokens = self.kpi_windows["tokens"].query(seconds, now)
+
+        total_queries = response_time["count"]
+        resolved_queries = int(resolution["sum"])
+        minutes = min(seconds, (current_time - self.kpis["session_start"]).total_seconds()) / 60
+
+        return {
+            "window": window,
+            "average_satisfaction": round(satisfaction["average"], 2),
+            "average_response_time": round(response_time["average"], 2),
+            "average_time_to_first_token": round(first_token["average"], 2),
+            "response_time": response_time,
+            "time_to_first_token": first_token,
+            "total_queries": total_queries,
+            "resolved_queries": resolved_queries,
+            "response_rate": round(total_queries / minutes, 2) if minutes > 0 else 0,
+            "resolution_rate": round(resolved_queries / total_queries * 100, 2) if total_queries > 0 else 0,
+            "tokens": int(tokens["sum"]),
+            "upstream_calls": tokens["count"],
+            "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S UTC")
+        }
+
+
+def create_chatbot():
+    """Build a chatbot from the TECHBUDDY_* settings; every worker process builds its own"""
+    if LLM_BACKEND == 'openai' and not OPENAI_API_KEY:
+        raise ValueError("Set OPENAI_API_KEY (or TECHBUDDY_BACKEND=mock/fake to run without OpenAI)")
+
+    # Build or refresh the knowledge-base index; unchanged files are not re-indexed
+    knowledge_base = None
+    if KNOWLEDGE_BASE_DIR:
+        knowledge_base = KnowledgeBase(KNOWLEDGE_INDEX_DIR)
+        indexed = knowledge_base.ingest_directory(KNOWLEDGE_BASE_DIR)
+        print(f"✅ Knowledge base ready: {len(knowledge_base)} passages ({indexed} newly indexed)")
+
+    # Shared state already persists everything, so the per-process event log is only used without it
+    shared_state = SharedState(SHARED_STATE_PATH, SHARED_FLUSH_INTERVAL, SESSION_TTL) if SHARED_STATE_PATH else None
+    event_store = None
+    if EVENT_STORE_PATH and shared_state is None:
+        event_store = EventStore(EVENT_STORE_PATH, EVENT_FLUSH_INTERVAL, snapshot_every=EVENT_SNAPSHOT_EVERY,
+                                 session_retention=SESSION_TTL)
+
+    admission = AdmissionController(UPSTREAM_CONCURRENCY, UPSTREAM_QUEUE_SIZE)
+    bot = PersonalizedChatbot(OPENAI_API_KEY, MAX_SESSIONS, SESSION_TTL, MAX_HISTORY,
+                              response_cache=ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL),
+                              semantic_cache=SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD,
+                                                           ttl=RESPONSE_CACHE_TTL) if SEMANTIC_CACHE_SIZE else None,
+                              max_prompt_tokens=MAX_PROMPT_TOKENS, summary_workers=SUMMARY_WORKERS,
+                              backend=ResilientBackend(
+                                  create_backend(LLM_BACKEND, OPENAI_API_KEY, MOCK_LLM_URL, UPSTREAM_POOL_SIZE,
+                                                 FAKE_LATENCY, FAKE_JITTER, FAKE_ERROR_RATE),
+                                  max_retries=UPSTREAM_RETRIES, hedge=HEDGE_REQUESTS,
+                                  circuit_breaker=CircuitBreaker(CIRCUIT_FAILURES, CIRCUIT_RESET), admission=admission),
+                              admission=admission,
+                              request_deadline=REQUEST_DEADLINE, knowledge_base=knowledge_base,
+                              kb_top_k=KB_TOP_K, kb_max_tokens=KB_MAX_TOKENS,
+                              event_store=event_store, shared_state=shared_state,
+                              token_budget=TokenBudget(SESSION_TOKEN_BUDGET, GLOBAL_TOKEN_BUDGET, TOKEN_BUDGET_WINDOW,
+                                                       TOKEN_BUDGET_SOFT, BUDGET_MAX_TOKENS),
+                              batch_workers=BATCH_WORKERS, stream_workers=STREAM_WORKERS,
+                              analytics=EventColumns(ANALYTICS_DIR or None, PersonalizedChatbot.IMPROVEMENT_AREAS))
+    atexit.register(bot.close)
+    return bot
@@ -0,0 +1,64 @@
+"""Command line entry point: python -m techbuddy [--asgi] [--ngrok] [--build-assets]"""
+
+import argparse
+import os
+
+
+def open_tunnel(port, auth_token):
+    """Expose the local server through ngrok and publish its URL on /status"""
+    from pyngrok import ngrok
+
+    ngrok.set_auth_token(auth_token)
+    # Drop a tunnel left over from an earlier run in the same session
+    ngrok.kill()
+    tunnel = ngrok.connect(port)
+    os.environ['NGROK_URL'] = str(tunnel.public_url)
+    print(f'✅ Public URL: {tunnel.public_url}')
+    return tunnel
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m techbuddy", description="Run the TechBuddy chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--asgi", action="store_true", help="serve through uvicorn with the async /chat path "
+                                                            "(default when TECHBUDDY_ASGI is set)")
+    parser.add_argument("--ngrok", action="store_true", help="open a public ngrok tunnel (needs NGROK_AUTH_TOKEN)")
+    parser.add_argument("--build-assets", action="store_true", help="build the frontend into TECHBUDDY_ASSET_DIR "
+                                                                    "and exit, e.g. as a deploy step")
+    parser.add_argument("--env-file", help="settings file to load (default: TECHBUDDY_ENV_FILE or ./.env)")
+    args = parser.parse_args(argv)
+
+    # Settings are read when the package modules are first imported, so point them at the env file first
+    if args.env_file:
+        os.environ['TECHBUDDY_ENV_FILE'] = args.env_file
+    from . import config
+
+    if args.build_assets:
+        from .assets import build_assets
+        build_assets(config.ASSET_DIR)
+        return
+
+    if args.ngrok and not config.NGROK_AUTH_TOKEN:
+        parser.error("--ngrok needs NGROK_AUTH_TOKEN in the environment or the env file")
+    if args.ngrok and not os.getenv('TECHBUDDY_TRUSTED_PROXIES'):
+        # Requests arrive through the local ngrok agent, which passes the client address in X-Forwarded-For
+        config.TRUSTED_PROXIES = 1
+    from .app import create_app, create_asgi_app
+
+    asgi = args.asgi or config.SERVE_ASGI
+    app = create_asgi_app() if asgi else create_app()
+    print("✅ TechBuddy app created!")
+
+    if args.ngrok:
+        open_tunnel(args.port, config.NGROK_AUTH_TOKEN)
+
+    if asgi:
+        import uvicorn
+        uvicorn.run(app, host=args.host, port=args.port)
+    else:
+        app.run(host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Settings, read once from the environment and an optional .env file"""
+
+import os
+
+# KEY=value lines from TECHBUDDY_ENV_FILE (default ./.env); variables already set in the environment win
+ENV_FILE = os.getenv('TECHBUDDY_ENV_FILE', '.env')
+if os.path.isfile(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
+
+# Upstream and tunnel credentials (OPENAI_API_KEY2 is the name the Colab notebook's secret has always used)
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_API_KEY2', '')
+NGROK_AUTH_TOKEN = os.getenv('NGROK_AUTH_TOKEN', '')
+
+# LLM backend: "openai", "mock" (local HTTP stand-in, see benchmarks/) or "fake" (in-process)
+LLM_BACKEND = os.getenv('TECHBUDDY_BACKEND', 'openai')
+MOCK_LLM_URL = os.getenv('TECHBUDDY_MOCK_URL', 'http://127.0.0.1:8001/v1')
+# "fake" backend: mean latency and jitter in seconds, fraction of calls that fail
+FAKE_LATENCY = float(os.getenv('TECHBUDDY_FAKE_LATENCY', '0.05'))
+FAKE_JITTER = float(os.getenv('TECHBUDDY_FAKE_JITTER', '0.02'))
+FAKE_ERROR_RATE = float(os.getenv('TECHBUDDY_FAKE_ERROR_RATE', '0'))
+
+# Session limits (live sessions, idle timeout in seconds, messages per prompt before older turns are summarized)
+MAX_SESSIONS = int(os.getenv('TECHBUDDY_MAX_SESSIONS', '10000'))
+SESSION_TTL = int(os.getenv('TECHBUDDY_SESSION_TTL', '1800'))
+MAX_HISTORY = int(os.getenv('TECHBUDDY_MAX_HISTORY', '20'))
+
+# Prompt token budget and background summarizer threads
+MAX_PROMPT_TOKENS = int(os.getenv('TECHBUDDY_MAX_PROMPT_TOKENS', '1500'))
+SUMMARY_WORKERS = int(os.getenv('TECHBUDDY_SUMMARY_WORKERS', '2'))
+
+# Exact-match response cache (entries, seconds)
+RESPONSE_CACHE_SIZE = int(os.getenv('TECHBUDDY_RESPONSE_CACHE_SIZE', '2048'))
+RESPONSE_CACHE_TTL = int(os.getenv('TECHBUDDY_RESPONSE_CACHE_TTL', '3600'))
+
+# Semantic near-duplicate cache (entries, cosine similarity threshold); 0 entries disables it
+SEMANTIC_CACHE_SIZE = int(os.getenv('TECHBUDDY_SEMANTIC_CACHE_SIZE', '10000'))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('TECHBUDDY_SEMANTIC_CACHE_THRESHOLD', '0.85'))
+
+# Local knowledge base: docs/product sheets to ingest, where the index lives, passages and tokens per prompt
+KNOWLEDGE_BASE_DIR = os.getenv('TECHBUDDY_KNOWLEDGE_BASE_DIR', '')
+KNOWLEDGE_INDEX_DIR = os.getenv('TECHBUDDY_KNOWLEDGE_INDEX_DIR', 'techbuddy_index')
+KB_TOP_K = int(os.getenv('TECHBUDDY_KB_TOP_K', '3'))
+KB_MAX_TOKENS = int(os.getenv('TECHBUDDY_KB_MAX_TOKENS', '400'))
+
+# Durable event log (SQLite path, empty disables it), flush interval in seconds and events between snapshots
+EVENT_STORE_PATH = os.getenv('TECHBUDDY_EVENT_STORE', 'techbuddy_events.db')
+EVENT_FLUSH_INTERVAL = float(os.getenv('TECHBUDDY_EVENT_FLUSH_INTERVAL', '0.5'))
+EVENT_SNAPSHOT_EVERY = int(os.getenv('TECHBUDDY_EVENT_SNAPSHOT_EVERY', '10000'))
+
+# Multi-worker deployments: SQLite database shared by all worker processes (replaces the event log when set)
+SHARED_STATE_PATH = os.getenv('TECHBUDDY_SHARED_STATE', '')
+SHARED_FLUSH_INTERVAL = float(os.getenv('TECHBUDDY_SHARED_FLUSH_INTERVAL', '0.2'))
+
+# Fixed API key; without it a random key is generated (and shared through TECHBUDDY_SHARED_STATE if set). /status hands
+# it to the web UI, so it is rate limited per client address: PUBLIC_KEY_RATE requests per second (0 is unlimited)
+# in bursts of up to PUBLIC_KEY_BURST
+API_KEY = os.getenv('TECHBUDDY_API_KEY', '')
+PUBLIC_KEY_RATE = float(os.getenv('TECHBUDDY_PUBLIC_KEY_RATE', '2'))
+PUBLIC_KEY_BURST = int(os.getenv('TECHBUDDY_PUBLIC_KEY_BURST', '20'))
+# Reverse proxies in front of the server (1 behind ngrok) whose X-Forwarded-For gives the client address
+TRUSTED_PROXIES = int(os.getenv('TECHBUDDY_TRUSTED_PROXIES', '0'))
+
+# Further API keys as comma-separated "name:key[:rate[:burst]]" entries (key may be "sha256=<hex digest>"), each with
+# its own token bucket; entries without a quota get KEY_RATE/KEY_BURST. Buckets are per worker process
+API_KEYS = os.getenv('TECHBUDDY_API_KEYS', '')
+KEY_RATE = float(os.getenv('TECHBUDDY_KEY_RATE', '10'))
+KEY_BURST = int(os.getenv('TECHBUDDY_KEY_BURST', '100'))
+
+# Recent-window KPI queries accepted by /kpi-metrics?window=
+KPI_WINDOWS = {"1m": 60, "5m": 300, "1h": 3600, "24h": 86400}
+
+# Seconds between KPI pushes to /kpi-stream subscribers (one snapshot per tick, shared by all of them)
+KPI_PUSH_INTERVAL = float(os.getenv('TECHBUDDY_KPI_PUSH_INTERVAL', '1'))
+# /kpi-stream subscribers the threaded Flask server keeps open at once (each holds a thread); uncapped under ASGI
+KPI_STREAM_THREADS = int(os.getenv('TECHBUDDY_KPI_STREAM_THREADS', '16'))
+
+# Columnar survey/engagement event files behind /kpi-analytics (one subdirectory per process); empty keeps them in memory
+ANALYTICS_DIR = os.getenv('TECHBUDDY_ANALYTICS_DIR', 'techbuddy_analytics')
+
+# /chat/batch: items per request, items of one batch in flight (default and maximum), threads shared by all batches
+BATCH_MAX_ITEMS = int(os.getenv('TECHBUDDY_BATCH_MAX_ITEMS', '1000'))
+BATCH_CONCURRENCY = int(os.getenv('TECHBUDDY_BATCH_CONCURRENCY', '8'))
+BATCH_WORKERS = int(os.getenv('TECHBUDDY_BATCH_WORKERS', '32'))
+
+# Threads driving /chat/stream replies under the ASGI server; each open stream holds one while it waits for tokens
+STREAM_WORKERS = int(os.getenv('TECHBUDDY_STREAM_WORKERS', '64'))
+
+# Token budgets per session (lifetime) and for all sessions per TOKEN_BUDGET_WINDOW seconds (at most a day); 0 is
+# unlimited. Past TOKEN_BUDGET_SOFT of a budget replies are capped at BUDGET_MAX_TOKENS, past it only cached answers
+SESSION_TOKEN_BUDGET = int(os.getenv('TECHBUDDY_SESSION_TOKEN_BUDGET', '0'))
+GLOBAL_TOKEN_BUDGET = int(os.getenv('TECHBUDDY_GLOBAL_TOKEN_BUDGET', '0'))
+TOKEN_BUDGET_WINDOW = min(86400, int(os.getenv('TECHBUDDY_TOKEN_BUDGET_WINDOW', '3600')))
+TOKEN_BUDGET_SOFT = float(os.getenv('TECHBUDDY_TOKEN_BUDGET_SOFT', '0.8'))
+BUDGET_MAX_TOKENS = int(os.getenv('TECHBUDDY_BUDGET_MAX_TOKENS', '60'))
+
+# Sampling profiler: requests slower than PROFILE_SLOW_MS get their sampled stacks written to PROFILE_DIR (0 disables)
+PROFILE_SLOW_MS = float(os.getenv('TECHBUDDY_PROFILE_SLOW_MS', '0'))
+PROFILE_INTERVAL_MS = float(os.getenv('TECHBUDDY_PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.getenv('TECHBUDDY_PROFILE_DIR', 'techbuddy_profiles')
+
+# Built frontend (minified page, purged CSS, hashed JS and their gzip/brotli variants); rebuilt only when the template changes
+ASSET_DIR = os.getenv('TECHBUDDY_ASSET_DIR', 'techbuddy_assets')
+
+# Admission control: concurrent upstream calls, queued requests, per-request deadline (seconds)
+UPSTREAM_CONCURRENCY = int(os.getenv('TECHBUDDY_UPSTREAM_CONCURRENCY', '32'))
+UPSTREAM_QUEUE_SIZE = int(os.getenv('TECHBUDDY_UPSTREAM_QUEUE_SIZE', '128'))
+REQUEST_DEADLINE = float(os.getenv('TECHBUDDY_REQUEST_DEADLINE', '30'))
+
+# Upstream resilience: retries for transient errors, circuit breaker (consecutive failures, seconds open), hedging
+UPSTREAM_RETRIES = int(os.getenv('TECHBUDDY_UPSTREAM_RETRIES', '2'))
+CIRCUIT_FAILURES = int(os.getenv('TECHBUDDY_CIRCUIT_FAILURES', '5'))
+CIRCUIT_RESET = float(os.getenv('TECHBUDDY_CIRCUIT_RESET', '30'))
+HEDGE_REQUESTS = os.getenv('TECHBUDDY_HEDGE', '').lower() in ('1', 'true', 'yes')
+
+# Shared keep-alive connection pool to the LLM backend (async path only)
+UPSTREAM_POOL_SIZE = int(os.getenv('TECHBUDDY_UPSTREAM_POOL_SIZE', '100'))
+
+# python -m techbuddy serves through uvicorn with the async /chat path instead of Flask's threaded server
+SERVE_ASGI = os.getenv('TECHBUDDY_ASGI', '').lower() in ('1', 'true', 'yes')
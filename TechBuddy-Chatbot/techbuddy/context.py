@@ -0,0 +1,100 @@
+"""Token-budgeted prompt assembly with background summaries of older turns"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def estimate_tokens(text):
+    """Rough token count used for prompt budgeting (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class ContextBuilder:
+    """Fills the prompt budget with the newest turns (at most max_messages) and summarizes the rest in the background"""
+
+    MESSAGE_OVERHEAD = 4
+    KNOWLEDGE_HEADER = "Relevant product and support information:\n"
+
+    def __init__(self, summarize, max_prompt_tokens=1500, workers=2, on_summary=None, max_messages=None):
+        self.summarize = summarize
+        self.on_summary = on_summary
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_messages = max_messages
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="techbuddy-summary")
+        self.summaries = 0
+        self.summary_failures = 0
+        self.summarized_messages = 0
+        self.lock = threading.Lock()
+
+    def message_tokens(self, message):
+        return estimate_tokens(message["content"]) + self.MESSAGE_OVERHEAD
+
+    def build(self, system_message, session, user_input, knowledge=None):
+        """Build the upstream message list within the token budget (caller holds session.lock)"""
+        head = [{"role": "system", "content": system_message}]
+        if knowledge:
+            head.append({"role": "system", "content": self.KNOWLEDGE_HEADER + knowledge})
+        if session.summary:
+            head.append({"role": "system", "content": f"Summary of the earlier conversation: {session.summary}"})
+        question = {"role": "user", "content": user_input}
+        budget = self.max_prompt_tokens - sum(self.message_tokens(m) for m in head) - self.message_tokens(question)
+
+        # Walk back over complete user/assistant pairs while they fit
+        history = session.conversation_history
+        start = len(history)
+        while start >= 2:
+            cost = self.stored_tokens(history, start - 2) + self.stored_tokens(history, start - 1)
+            if cost > budget:
+                break
+            budget -= cost
+            start -= 2
+        # Short turns all fit the budget; past max_messages they are summarized rather than dropped by the store
+        if self.max_messages is not None and len(history) - start > self.max_messages:
+            start = len(history) - self.max_messages
+            start += start % 2
+
+        # Anything older no longer fits: keep it compressed and fold it into the running summary off the request path
+        if start > 0:
+            history.compress(start)
+            if not session.summary_pending:
+                session.summary_pending = True
+                self.executor.submit(self._compact, session, session.summary, history, history[:start])
+
+        return head + history.messages(start) + [question]
+
+    def stored_tokens(self, history, index):
+        """message_tokens of a stored message, from its length so compressed messages stay compressed"""
+        return history.length(index) // 4 + 1 + self.MESSAGE_OVERHEAD
+
+    def _compact(self, session, previous_summary, history, old_messages):
+        """Summarize old_messages and drop them from the session history (runs on the worker pool)"""
+        try:
+            summary = self.summarize(previous_summary, old_messages)
+        except Exception as e:
+            print(f"❌ Error summarizing conversation: {str(e)}")
+            with self.lock:
+                self.summary_failures += 1
+            with session.lock:
+                session.summary_pending = False
+            return
+
+        with session.lock:
+            session.summary = summary
+            session.summary_pending = False
+            # Messages may already have been trimmed from the front, or the history reloaded by another worker
+            if session.conversation_history is history:
+                history.drop_front(max(0, min(len(history), old_messages.offset + len(old_messages) - history.offset)))
+            if self.on_summary is not None:
+                self.on_summary(session)
+
+        with self.lock:
+            self.summaries += 1
+            self.summarized_messages += len(old_messages)
+
+    def stats(self):
+        return {
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "summarized_messages": self.summarized_messages
+        }
@@ -0,0 +1,179 @@
+"""Write-behind SQLite event log of KPI events and chat turns, replayed on restart"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class EventStore:
+    """Append-only SQLite (WAL) event log written in batches by a background thread, with periodic snapshots"""
+
+    def __init__(self, path, flush_interval=0.5, batch_size=1000, snapshot_every=10000, session_retention=1800):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.snapshot_every = snapshot_every
+        self.session_retention = session_retention
+        self.snapshot_state = None
+        self.pending = []
+        self.written = 0
+        self.written_sequence = 0
+        self.batches = 0
+        self.snapshots = 0
+        self.write_errors = 0
+        self.since_snapshot = 0
+        self.last_flush_ms = 0.0
+        self.closing = False
+        self.writer = None
+        self.condition = threading.Condition()
+
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY, ts REAL NOT NULL, "
+                         "kind TEXT NOT NULL, session_id TEXT, data TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS events_session_ts ON events (ts) WHERE session_id IS NOT NULL")
+            conn.execute("CREATE INDEX IF NOT EXISTS events_session ON events (session_id, ts) "
+                         "WHERE session_id IS NOT NULL")
+            conn.execute("CREATE TABLE IF NOT EXISTS snapshots (sequence INTEGER PRIMARY KEY, ts REAL NOT NULL, "
+                         "state BLOB NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('created_at', ?)", (str(time.time()),))
+            self.created_at = float(conn.execute("SELECT value FROM meta WHERE key = 'created_at'").fetchone()[0])
+            last_event = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+            last_snapshot = conn.execute("SELECT COALESCE(MAX(sequence), 0) FROM snapshots").fetchone()[0]
+        conn.close()
+        self.sequence = max(last_event, last_snapshot)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def load(self):
+        """Return (sequence, state) of the latest snapshot and the events logged after it"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT sequence, state FROM snapshots ORDER BY sequence DESC LIMIT 1").fetchone()
+            sequence, state = (row[0], json.loads(zlib.decompress(row[1]))) if row else (0, None)
+            events = [(ts, kind, session_id, json.loads(data)) for ts, kind, session_id, data in conn.execute(
+                "SELECT ts, kind, session_id, data FROM events WHERE id > ? AND session_id IS NULL ORDER BY id",
+                (sequence,))]
+            return sequence, state, events
+        finally:
+            conn.close()
+
+    def session_events(self, since):
+        """(ts, kind, session_id, data, last_active) for every event of the sessions active at or after `since`,
+        oldest first; earlier turns are included, so a live session comes back whole
+        """
+        conn = self._connect()
+        try:
+            return [(ts, kind, session_id, json.loads(data), last_active)
+                    for ts, kind, session_id, data, last_active in conn.execute(
+                        "SELECT events.ts, kind, events.session_id, data, live.last_active FROM events JOIN "
+                        "(SELECT session_id, MAX(ts) AS last_active FROM events WHERE session_id IS NOT NULL "
+                        "GROUP BY session_id HAVING MAX(ts) >= ?) AS live ON events.session_id = live.session_id "
+                        "ORDER BY events.id", (since,))]
+        finally:
+            conn.close()
+
+    def start(self, snapshot_state):
+        """Start the writer; snapshot_state() must return (sequence, state) captured atomically"""
+        self.snapshot_state = snapshot_state
+        self.writer = threading.Thread(target=self._run, name="techbuddy-event-writer", daemon=True)
+        self.writer.start()
+
+    def append(self, kind, session_id, data, ts=None):
+        """Queue an event for the writer; never touches the disk on the caller's thread"""
+        with self.condition:
+            self.sequence += 1
+            self.pending.append((self.sequence, time.time() if ts is None else ts, kind, session_id,
+                                 json.dumps(data, separators=(",", ":"))))
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify_all()
+            return self.sequence
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written"""
+        with self.condition:
+            target = self.sequence
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: self.written_sequence >= target or self.writer is None, timeout)
+
+    def close(self):
+        """Write the remaining events and a final snapshot, then stop the writer"""
+        if self.writer is None:
+            return
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.writer.join()
+        self.writer = None
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            with self.condition:
+                if len(self.pending) < self.batch_size and not self.closing:
+                    self.condition.wait(self.flush_interval)
+                closing = self.closing
+            snapshot = None
+            if closing or self.since_snapshot >= self.snapshot_every:
+                snapshot = self.snapshot_state()
+            with self.condition:
+                batch, self.pending = self.pending, []
+            try:
+                self._write(conn, batch, snapshot)
+            except sqlite3.Error as e:
+                print(f"❌ Error writing events: {str(e)}")
+                self.write_errors += 1
+                with self.condition:
+                    # Keep the events for the next attempt
+                    self.pending[:0] = batch
+                if not closing:
+                    time.sleep(self.flush_interval)
+                    continue
+            if closing:
+                break
+        conn.close()
+        with self.condition:
+            self.condition.notify_all()
+
+    def _write(self, conn, batch, snapshot):
+        started = time.perf_counter()
+        with conn:
+            if batch:
+                conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?)", batch)
+            if snapshot is not None:
+                sequence, state = snapshot
+                conn.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+                             (sequence, time.time(), zlib.compress(json.dumps(state).encode())))
+                # Aggregates up to the snapshot are folded in; session events only matter while sessions can live
+                conn.execute("DELETE FROM snapshots WHERE sequence < ?", (sequence,))
+                # A session's turns are kept for as long as the session itself is still active
+                conn.execute("DELETE FROM events WHERE id <= ? AND (session_id IS NULL OR session_id NOT IN "
+                             "(SELECT session_id FROM events WHERE session_id IS NOT NULL AND ts >= ?))",
+                             (sequence, time.time() - self.session_retention))
+        with self.condition:
+            if batch:
+                self.written += len(batch)
+                self.batches += 1
+                self.since_snapshot += len(batch)
+                self.written_sequence = batch[-1][0]
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+            if snapshot is not None:
+                self.snapshots += 1
+                self.since_snapshot = 0
+            self.condition.notify_all()
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "pending": len(self.pending),
+            "batches": self.batches,
+            "snapshots": self.snapshots,
+            "write_errors": self.write_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3)
+        }
@@ -0,0 +1,64 @@
+"""Answers greetings, thanks and FAQs locally before any LLM call"""
+
+import re
+import threading
+
+
+class IntentRouter:
+    """Answers greetings, thanks and simple FAQs from canned templates before any LLM call"""
+
+    MAX_LENGTH = 80
+
+    PATTERNS = {
+        "greeting": r"(?:hi|hello|hey|hiya|howdy|good (?:morning|afternoon|evening))(?: there)?",
+        "thanks": r"(?:thanks|thank you|thx|ty|cheers|much appreciated)(?: (?:so|very) much)?(?: for (?:the|your) help)?",
+        "goodbye": r"(?:bye|goodbye|see you|see ya|that's all|that is all)(?: for now)?",
+        "hours": r"(?:what are your (?:opening )?hours|when are you (?:open|available)|are you open(?: now| today)?)",
+        "identity": r"(?:who are you|what are you|what can you do|what do you do)",
+    }
+
+    def __init__(self, personality):
+        name = personality["name"]
+        expertise = personality["expertise"]
+        self.templates = {
+            "greeting": f"Hi there! I'm {name}, your {expertise} assistant. What can I help you with today?",
+            "thanks": f"You're welcome! Let me know if there's anything else {name} can help with.",
+            "goodbye": f"Goodbye! Come back to {name} anytime you need {expertise}.",
+            "hours": f"{name} is available 24/7, so you can ask for {expertise} at any time.",
+            "identity": f"I'm {name}, a {personality['tone']} assistant specialized in {expertise}. "
+                        f"Ask me about troubleshooting, setup or product recommendations.",
+        }
+
+        # One anchored alternation so a message is classified in a single match
+        alternation = "|".join(f"(?P<{intent}>{pattern})" for intent, pattern in self.PATTERNS.items())
+        addressee = re.escape(name.lower())
+        self.pattern = re.compile(rf"^\s*(?:{alternation})(?:[\s,]+{addressee})?[\s!.?,]*$", re.IGNORECASE)
+
+        self.messages = 0
+        self.hits = dict.fromkeys(list(self.templates) + ["survey"], 0)
+        self.lock = threading.Lock()
+
+    def route(self, user_input):
+        """Return (intent, canned reply) for short small-talk messages, else None"""
+        match = self.pattern.match(user_input) if len(user_input) <= self.MAX_LENGTH else None
+        with self.lock:
+            self.messages += 1
+            if match is None:
+                return None
+            self.hits[match.lastgroup] += 1
+        return match.lastgroup, self.templates[match.lastgroup]
+
+    def record_survey(self):
+        """Count a survey answer handled without the LLM"""
+        with self.lock:
+            self.messages += 1
+            self.hits["survey"] += 1
+
+    def stats(self):
+        handled = sum(self.hits.values())
+        return {
+            "messages": self.messages,
+            "handled_locally": handled,
+            "hits": dict(self.hits),
+            "hit_rate": round(handled / self.messages * 100, 2) if self.messages else 0
+        }
@@ -0,0 +1,368 @@
+"""Local BM25 knowledge-base index over product docs and product sheets"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from .context import estimate_tokens
+
+try:
+    import fcntl  # POSIX only: lets one worker ingest while the others wait
+except ImportError:
+    fcntl = None
+
+
+class KBSegment:
+    """Immutable on-disk BM25 segment; postings and text are memory-mapped on load"""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(os.path.join(path, "keys.json")) as f:
+            self.keys = json.load(f)
+        with open(os.path.join(path, "vocab.json")) as f:
+            self.vocab = json.load(f)
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(path, "lengths.npy"), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        self.text = np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r") if self.text_offsets[-1] else b""
+        self.deleted = np.zeros(len(self.keys), dtype=bool)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def postings(self, term):
+        """Return (doc_ids, term_frequencies) for term, or None if it does not occur"""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return None
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def document(self, doc_id):
+        start, end = self.text_offsets[doc_id], self.text_offsets[doc_id + 1]
+        return bytes(self.text[start:end]).decode("utf-8")
+
+    @staticmethod
+    def write(path, documents, tokenize):
+        """Build a segment from [(key, text), ...] and move it into place at path once it is complete"""
+        postings = {}
+        lengths = []
+        for doc_id, (_, text) in enumerate(documents):
+            terms = tokenize(text)
+            lengths.append(len(terms))
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((doc_id, count))
+
+        # Compressed sparse row layout: one contiguous slice of postings per term
+        vocab = {term: term_id for term_id, term in enumerate(sorted(postings))}
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_ids, tfs = [], []
+        for term, term_id in vocab.items():
+            entries = postings[term]
+            offsets[term_id + 1] = offsets[term_id] + len(entries)
+            doc_ids.extend(doc_id for doc_id, _ in entries)
+            tfs.extend(min(count, 65535) for _, count in entries)
+
+        encoded = [text.encode("utf-8") for _, text in documents]
+        text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=text_offsets[1:])
+
+        temporary = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        with open(os.path.join(temporary, "keys.json"), "w") as f:
+            json.dump([key for key, _ in documents], f)
+        with open(os.path.join(temporary, "vocab.json"), "w") as f:
+            json.dump(vocab, f)
+        np.save(os.path.join(temporary, "offsets.npy"), offsets)
+        np.save(os.path.join(temporary, "doc_ids.npy"), np.array(doc_ids, dtype=np.int32))
+        np.save(os.path.join(temporary, "tfs.npy"), np.array(tfs, dtype=np.uint16))
+        np.save(os.path.join(temporary, "lengths.npy"), np.array(lengths, dtype=np.int32))
+        np.save(os.path.join(temporary, "text_offsets.npy"), text_offsets)
+        with open(os.path.join(temporary, "text.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        # Left over by a process that died before saving its manifest, so no manifest refers to it
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temporary, path)
+
+
+class KnowledgeBase:
+    """Local BM25 index over product sheets and support docs, stored as append-only segments"""
+
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+    STOPWORDS = frozenset(
+        "a an and are as at be by can do does for from how i in is it me my of on or the to what which with you your"
+        .split()
+    )
+    CHUNK_WORDS = 120
+
+    def __init__(self, index_dir, k1=1.5, b=0.75):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.segments = []
+        self.locations = {}
+        self.sources = {}
+        self.tombstones = set()
+        self.next_segment = 0
+        self.searches = 0
+        self.search_time = 0.0
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """(Re)load the index from the latest manifest"""
+        manifest_path = os.path.join(self.index_dir, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        with self.lock:
+            self.segments, self.locations = [], {}
+            self.sources = manifest.get("sources", {})
+            self.tombstones = set(manifest.get("tombstones", []))
+            self.next_segment = manifest.get("next_segment", 0)
+            for name in manifest.get("segments", []):
+                self._attach(KBSegment(os.path.join(self.index_dir, name)))
+
+    def _attach(self, segment):
+        """Register a segment, superseding older copies of the same keys (caller holds self.lock)"""
+        index = len(self.segments)
+        for doc_id, key in enumerate(segment.keys):
+            previous = self.locations.get(key)
+            if previous is not None:
+                self.segments[previous[0]].deleted[previous[1]] = True
+            if key in self.tombstones:
+                segment.deleted[doc_id] = True
+            else:
+                self.locations[key] = (index, doc_id)
+        self.segments = self.segments + [segment]
+
+    def _save_manifest(self):
+        manifest = {
+            "segments": [segment.name for segment in self.segments],
+            "sources": self.sources,
+            "tombstones": sorted(self.tombstones),
+            "next_segment": self.next_segment
+        }
+        temporary = os.path.join(self.index_dir, f"manifest.json.{os.getpid()}.tmp")
+        with open(temporary, "w") as f:
+            json.dump(manifest, f)
+        os.replace(temporary, os.path.join(self.index_dir, "manifest.json"))
+
+    def __len__(self):
+        return len(self.locations)
+
+    def tokenize(self, text):
+        return [term for term in self.TOKEN_PATTERN.findall(text.lower()) if term not in self.STOPWORDS]
+
+    def add_documents(self, documents):
+        """Index [(key, text), ...] as a new segment; re-added keys replace their old versions"""
+        if not documents:
+            return
+        with self.lock:
+            self._add_segment(documents)
+            self._save_manifest()
+
+    def _add_segment(self, documents):
+        """Write and attach a segment; the manifest is left to the caller (which holds self.lock)"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        name = f"segment-{self.next_segment:06d}"
+        self.next_segment += 1
+        KBSegment.write(os.path.join(self.index_dir, name), documents, self.tokenize)
+        self.tombstones.difference_update(key for key, _ in documents)
+        self._attach(KBSegment(os.path.join(self.index_dir, name)))
+
+    def delete_documents(self, keys):
+        with self.lock:
+            self._tombstone(keys)
+            self._save_manifest()
+
+    def _tombstone(self, keys):
+        """Hide keys from search (caller holds self.lock)"""
+        for key in keys:
+            location = self.locations.pop(key, None)
+            if location is not None:
+                self.segments[location[0]].deleted[location[1]] = True
+                self.tombstones.add(key)
+
+    def ingest_directory(self, path):
+        """Index new or changed .txt/.md/.json files under path and drop the passages of deleted ones
+
+        Unchanged files are skipped. Workers booting together take turns on a lock file and each one starts from
+        the index the previous one left, so only the first does any work.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, "ingest.lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            self._load()
+            return self._ingest(path)
+
+    def _ingest(self, path):
+        documents = []
+        stale = []
+        seen = set()
+        digests = {}
+        for root, _, files in os.walk(path):
+            for filename in sorted(files):
+                if not filename.endswith((".txt", ".md", ".json")):
+                    continue
+                file_path = os.path.join(root, filename)
+                source = os.path.relpath(file_path, path)
+                seen.add(source)
+                try:
+                    with open(file_path, "rb") as f:
+                        raw = f.read()
+                    digest = hashlib.sha1(raw).hexdigest()
+                    if self.sources.get(source) == digest:
+                        continue
+                    chunks = self._parse(filename, raw.decode("utf-8", errors="replace"))
+                except (OSError, ValueError) as e:
+                    # Keep serving the file's previous passages, if any; it is retried on the next start
+                    print(f"❌ Skipping knowledge-base file {source}: {str(e)}")
+                    continue
+
+                stale.extend(key for key in self.locations if key.startswith(source + "#"))
+                documents.extend((f"{source}#{i}", chunk) for i, chunk in enumerate(chunks))
+                digests[source] = digest
+
+        # Files removed since the last run, e.g. discontinued products or outdated price sheets
+        removed = [source for source in self.sources if source not in seen]
+        for source in removed:
+            stale.extend(key for key in self.locations if key.startswith(source + "#"))
+
+        if not (stale or removed or documents):
+            return 0
+        with self.lock:
+            self._tombstone(stale)
+            if documents:
+                self._add_segment(documents)
+            # Recorded only once the passages are in a segment, so a failed run is redone on the next start
+            for source in removed:
+                del self.sources[source]
+            self.sources.update(digests)
+            self._save_manifest()
+        return len(documents)
+
+    def _parse(self, filename, content):
+        """Split a file into passages: one per product for JSON, ~CHUNK_WORDS words for text"""
+        if filename.endswith(".json"):
+            data = json.loads(content)
+            products = data.get("products", [data]) if isinstance(data, dict) else data
+            if not isinstance(products, list):
+                raise ValueError("expected a product object or a list of products")
+            passages = []
+            for product in products:
+                if isinstance(product, dict):
+                    name = product.get("name", "")
+                    details = ". ".join(f"{k.replace('_', ' ').title()}: {v}" for k, v in product.items() if k != "name")
+                    passages.append(f"{name} - {details}" if name else details)
+                else:
+                    passages.append(str(product))
+            return passages
+
+        passages, current = [], []
+        for paragraph in re.split(r"\n\s*\n", content):
+            words = paragraph.split()
+            if current and len(current) + len(words) > self.CHUNK_WORDS:
+                passages.append(" ".join(current))
+                current = []
+            current.extend(words)
+            while len(current) > self.CHUNK_WORDS:
+                passages.append(" ".join(current[:self.CHUNK_WORDS]))
+                current = current[self.CHUNK_WORDS:]
+        if current:
+            passages.append(" ".join(current))
+        return passages
+
+    def search(self, query, k=3):
+        """Return up to k (score, key, text) passages ranked by BM25"""
+        started = time.perf_counter()
+        terms = set(self.tokenize(query))
+        segments = self.segments
+        live = sum(len(segment) - int(segment.deleted.sum()) for segment in segments)
+        if not terms or not live:
+            return []
+
+        total_length = sum(float(segment.lengths[~segment.deleted].sum()) for segment in segments)
+        avgdl = total_length / live or 1.0
+        postings = {term: [segment.postings(term) for segment in segments] for term in terms}
+
+        results = []
+        for index, segment in enumerate(segments):
+            scores = np.zeros(len(segment), dtype=np.float32)
+            for term in terms:
+                df = sum(len(p[0]) for p in postings[term] if p is not None)
+                hit = postings[term][index]
+                if hit is None:
+                    continue
+                doc_ids, tfs = hit
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                tf = tfs.astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * segment.lengths[doc_ids] / avgdl)
+                scores[doc_ids] += idf * tf * (self.k1 + 1) / (tf + norm)
+            scores[segment.deleted] = 0
+            top = np.argpartition(-scores, min(k, len(scores) - 1))[:k] if len(scores) > k else np.arange(len(scores))
+            results.extend((float(scores[doc_id]), index, int(doc_id)) for doc_id in top if scores[doc_id] > 0)
+
+        results.sort(reverse=True)
+        passages = [(score, segments[index].keys[doc_id], segments[index].document(doc_id))
+                    for score, index, doc_id in results[:k]]
+        with self.lock:
+            self.searches += 1
+            self.search_time += time.perf_counter() - started
+        return passages
+
+    def context_for(self, query, k=3, max_tokens=400):
+        """Top passages for query formatted as prompt context within max_tokens"""
+        lines, used = [], 0
+        for _, _, text in self.search(query, k):
+            snippet = f"- {text}"
+            cost = estimate_tokens(snippet)
+            if used + cost > max_tokens:
+                # Truncate the last passage to what is left of the budget
+                snippet = snippet[:max(0, (max_tokens - used) * 4)]
+                cost = estimate_tokens(snippet)
+            if len(snippet) > 2:
+                lines.append(snippet)
+                used += cost
+            if used >= max_tokens:
+                break
+        return "\n".join(lines)
+
+    def compact(self):
+        """Merge all segments into one, dropping deleted and superseded passages"""
+        with self.lock:
+            documents = [(key, self.segments[index].document(doc_id))
+                         for key, (index, doc_id) in self.locations.items()]
+            old_segments = self.segments
+            self.segments, self.locations, self.tombstones = [], {}, set()
+        if documents:
+            self.add_documents(documents)
+        else:
+            with self.lock:
+                self._save_manifest()
+        for segment in old_segments:
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def stats(self):
+        return {
+            "documents": len(self.locations),
+            "segments": len(self.segments),
+            "searches": self.searches,
+            "average_search_ms": round(self.search_time / self.searches * 1000, 3) if self.searches else 0
+        }
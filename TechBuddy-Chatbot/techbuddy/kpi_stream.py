@@ -0,0 +1,166 @@
+"""Server-push KPI updates: one snapshot per tick fanned out to every /kpi-stream subscriber"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+
+from .admission import Overloaded
+
+
+class KPIBroadcaster:
+    """Computes the KPI snapshot once per tick and fans it out to every /kpi-stream subscriber
+
+    Fields in `volatile` change on every tick (the clock and rates derived from it); they ride along with real
+    changes but never cause a push on their own. Each WSGI subscriber holds a thread, so at most `max_threads`
+    are served at once; ASGI subscribers are not capped.
+    """
+    VOLATILE = ("timestamp", "session_duration_minutes", "response_rate")
+
+    def __init__(self, snapshot, interval=1.0, keepalive=15.0, max_threads=16, volatile=VOLATILE):
+        self.snapshot = snapshot
+        self.interval = interval
+        self.keepalive = keepalive
+        self.max_threads = max_threads
+        self.volatile = frozenset(volatile)
+        self.version = 0
+        self.full_message = None
+        self.delta_message = None
+        self.previous = None
+        self.subscribers = 0
+        self.thread_subscribers = 0
+        self.async_waiters = []
+        self.ticker = None
+        self.ticks = 0
+        self.condition = threading.Condition()
+
+    @staticmethod
+    def _encode(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.subscribers:
+                    self.ticker = None
+                    return
+            started = time.monotonic()
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"❌ Error computing KPI snapshot: {str(e)}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _tick(self):
+        metrics = self.snapshot()
+        previous = self.previous or {}
+        changes = {key: value for key, value in metrics.items()
+                   if key not in self.volatile and (key not in previous or previous[key] != value)}
+        if not changes:
+            return
+        changes.update((key, value) for key, value in metrics.items() if key in self.volatile)
+        full_message = self._encode("snapshot", metrics)
+        delta_message = self._encode("delta", changes)
+        with self.condition:
+            self.previous = metrics
+            self.full_message = full_message
+            self.delta_message = delta_message
+            self.version += 1
+            self.ticks += 1
+            self.condition.notify_all()
+            waiters, self.async_waiters = self.async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(self._wake, future)
+
+    @staticmethod
+    def _wake(future):
+        if not future.done():
+            future.set_result(None)
+
+    def _join(self):
+        """Register a subscriber and make sure the ticker runs (caller holds self.condition)"""
+        self.subscribers += 1
+        if self.ticker is None:
+            self.ticker = threading.Thread(target=self._run, name="techbuddy-kpi-push", daemon=True)
+            self.ticker.start()
+
+    def _next(self, seen):
+        """Message for a subscriber at version `seen`: a delta if it is one tick behind, else a full snapshot"""
+        if self.version == seen:
+            return None
+        return self.delta_message if seen and self.version == seen + 1 else self.full_message
+
+    def subscribe(self):
+        """SSE messages for one WSGI subscriber; raises Overloaded when max_threads subscribers are already served"""
+        with self.condition:
+            if self.thread_subscribers >= self.max_threads:
+                raise Overloaded("Too many KPI stream subscribers", retry_after=max(1, math.ceil(self.keepalive)))
+            self.thread_subscribers += 1
+            self._join()
+        return Subscription(self)
+
+    def _messages(self):
+        """A comment line keeps idle connections open"""
+        seen = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.version != seen, self.keepalive)
+                message = self._next(seen)
+                seen = self.version
+            yield message or ": keepalive\n\n"
+
+    def _leave(self):
+        with self.condition:
+            self.subscribers -= 1
+            self.thread_subscribers -= 1
+
+    async def asubscribe(self):
+        """Async variant of subscribe for the ASGI app; waits on a loop future instead of a thread"""
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            self._join()
+        try:
+            seen = 0
+            while True:
+                with self.condition:
+                    message = self._next(seen)
+                    seen = self.version
+                    if message is None:
+                        future = loop.create_future()
+                        self.async_waiters.append((loop, future))
+                if message is not None:
+                    yield message
+                    continue
+                try:
+                    await asyncio.wait_for(future, self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+
+
+class Subscription:
+    """One WSGI subscriber's messages; holds its thread slot until closed, even if the stream never started
+
+    A generator's finally block does not run when it is closed before its first iteration, which is what happens
+    when the client goes away before the server starts the response.
+    """
+
+    def __init__(self, broadcaster):
+        self.broadcaster = broadcaster
+        self.messages = broadcaster._messages()
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.messages)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.messages.close()
+            self.broadcaster._leave()
@@ -0,0 +1,233 @@
+"""Streaming KPI aggregates: running stats, latency histograms and time-windowed series"""
+
+import math
+import threading
+import time
+
+import numpy as np
+
+
+class RunningStat:
+    """Thread-safe count/sum/min/max accumulator"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.lock = threading.Lock()
+
+    def add(self, value):
+        with self.lock:
+            self._add(value)
+
+    def _add(self, value):
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def state(self):
+        """JSON-serializable copy of the accumulator, for snapshots"""
+        with self.lock:
+            return self._state()
+
+    def load_state(self, state):
+        with self.lock:
+            self._load_state(state)
+
+    def _state(self):
+        return {"count": self.count, "total": self.total, "min": self.minimum, "max": self.maximum}
+
+    def _load_state(self, state):
+        self.count = state["count"]
+        self.total = state["total"]
+        self.minimum = state["min"]
+        self.maximum = state["max"]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "average": round(self.mean, 3),
+                "min": round(self.minimum, 3) if self.minimum is not None else 0,
+                "max": round(self.maximum, 3) if self.maximum is not None else 0
+            }
+
+
+class LatencyHistogram(RunningStat):
+    """Running stats plus log-scale buckets for percentiles within a fixed relative error"""
+
+    def __init__(self, min_value=0.001, max_value=300.0, precision=0.02):
+        super().__init__()
+        self.min_value = min_value
+        self.log_base = math.log1p(precision)
+        self.counts = [0] * (int(math.ceil(math.log(max_value / min_value) / self.log_base)) + 2)
+
+    def bucket_index(self, value):
+        if value <= self.min_value:
+            return 0
+        return min(int(math.log(value / self.min_value) / self.log_base) + 1, len(self.counts) - 1)
+
+    def _add(self, value):
+        super()._add(value)
+        self.counts[self.bucket_index(value)] += 1
+
+    def _state(self):
+        state = super()._state()
+        state["counts"] = [[index, count] for index, count in enumerate(self.counts) if count]
+        return state
+
+    def _load_state(self, state):
+        super()._load_state(state)
+        self.counts = [0] * len(self.counts)
+        for index, count in state["counts"]:
+            self.counts[index] = count
+
+    def merge(self, other):
+        """Fold another histogram with the same bucket layout into this one"""
+        with self.lock, other.lock:
+            self.count += other.count
+            self.total += other.total
+            for value in (other.minimum, other.maximum):
+                if value is not None:
+                    self.minimum = value if self.minimum is None else min(self.minimum, value)
+                    self.maximum = value if self.maximum is None else max(self.maximum, value)
+            for index, count in enumerate(other.counts):
+                self.counts[index] += count
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """Estimate the given quantiles in one pass over the buckets"""
+        with self.lock:
+            if not self.count:
+                return [0 for _ in quantiles]
+            targets = sorted((q * self.count, i) for i, q in enumerate(quantiles))
+            results = [0] * len(quantiles)
+            seen = 0
+            pending = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                while pending < len(targets) and seen >= targets[pending][0] and count:
+                    # Geometric midpoint of the bucket, clamped to the observed range
+                    value = self.min_value * math.exp((index - 0.5) * self.log_base) if index else self.min_value
+                    results[targets[pending][1]] = min(max(value, self.minimum), self.maximum)
+                    pending += 1
+                if pending == len(targets):
+                    break
+            return results
+
+    def snapshot(self):
+        p50, p95, p99 = self.percentiles()
+        stats = super().snapshot()
+        stats.update({"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3)})
+        return stats
+
+
+def window_summary(count, total, minimum, maximum):
+    """Format one recent-window aggregate"""
+    return {
+        "count": count,
+        "sum": total,
+        "average": round(total / count, 3) if count else 0,
+        "min": round(minimum, 3) if count else 0,
+        "max": round(maximum, 3) if count else 0
+    }
+
+
+class BucketRing:
+    """Fixed number of time buckets holding count/sum/min/max, reused as time moves on"""
+
+    def __init__(self, width, slots):
+        self.width = width
+        self.slots = slots
+        self.stamps = np.full(slots, -1, dtype=np.int64)
+        self.count = np.zeros(slots, dtype=np.int64)
+        self.total = np.zeros(slots, dtype=np.float64)
+        self.minimum = np.zeros(slots, dtype=np.float64)
+        self.maximum = np.zeros(slots, dtype=np.float64)
+
+    def add(self, value, now):
+        bucket = int(now // self.width)
+        slot = bucket % self.slots
+        if self.stamps[slot] > bucket:
+            # Late sample for a bucket that has already been recycled
+            return
+        if self.stamps[slot] != bucket:
+            # Slot still holds an expired bucket
+            self.stamps[slot] = bucket
+            self.count[slot] = 0
+            self.total[slot] = 0.0
+            self.minimum[slot] = value
+            self.maximum[slot] = value
+        self.count[slot] += 1
+        self.total[slot] += value
+        self.minimum[slot] = min(self.minimum[slot], value)
+        self.maximum[slot] = max(self.maximum[slot], value)
+
+    def state(self):
+        """Occupied slots only, for snapshots"""
+        slots = np.flatnonzero(self.stamps >= 0)
+        return {
+            "slots": slots.tolist(),
+            "stamps": self.stamps[slots].tolist(),
+            "count": self.count[slots].tolist(),
+            "total": self.total[slots].tolist(),
+            "min": self.minimum[slots].tolist(),
+            "max": self.maximum[slots].tolist()
+        }
+
+    def load_state(self, state):
+        slots = np.array(state["slots"], dtype=np.int64)
+        self.stamps[:] = -1
+        self.stamps[slots] = state["stamps"]
+        self.count[slots] = state["count"]
+        self.total[slots] = state["total"]
+        self.minimum[slots] = state["min"]
+        self.maximum[slots] = state["max"]
+
+    def query(self, seconds, now):
+        """Aggregate every bucket that falls inside the last `seconds`"""
+        current = int(now // self.width)
+        live = (self.stamps > current - max(1, int(seconds // self.width))) & (self.stamps <= current)
+        if not live.any():
+            return window_summary(0, 0.0, None, None)
+        return window_summary(int(self.count[live].sum()), float(self.total[live].sum()),
+                              float(self.minimum[live].min()), float(self.maximum[live].max()))
+
+
+class WindowedSeries:
+    """KPI samples bucketed per second for the last hour and per minute for the last day"""
+
+    RINGS = ((1, 3600), (60, 1440))
+
+    def __init__(self):
+        self.rings = tuple(BucketRing(width, slots) for width, slots in self.RINGS)
+        self.lock = threading.Lock()
+
+    def add(self, value, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            for ring in self.rings:
+                ring.add(value, now)
+
+    def state(self):
+        with self.lock:
+            return [ring.state() for ring in self.rings]
+
+    def load_state(self, state):
+        with self.lock:
+            for ring, ring_state in zip(self.rings, state):
+                ring.load_state(ring_state)
+
+    def query(self, seconds, now=None):
+        """Aggregate the last `seconds` using the finest ring that covers them"""
+        now = time.time() if now is None else now
+        ring = next((r for r in self.rings if r.width * r.slots >= seconds), self.rings[-1])
+        with self.lock:
+            return ring.query(seconds, now)
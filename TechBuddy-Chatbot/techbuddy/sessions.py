@@ -0,0 +1,266 @@
+"""Chat sessions and the in-process / shared session stores"""
+
+import secrets
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+
+class ConversationHistory:
+    """Messages of one conversation as parallel arrays instead of one {"role", "content"} dict per message
+
+    A message costs a one-byte role code (into ROLES), a list slot for its text and its length, so the per-turn
+    overhead no longer grows with the dicts. Messages that fall out of the active context window are kept
+    zlib-compressed until a summary drops them. Indexing and iteration yield upstream message dicts that share
+    the stored strings, and slicing returns a detached history without decompressing anything.
+    """
+    __slots__ = ("roles", "contents", "lengths", "offset")
+
+    ROLES = ("user", "assistant", "system")
+    ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+    # Shorter texts barely shrink and the bytes object costs more than it saves
+    COMPRESS_MIN_CHARS = 160
+
+    def __init__(self, messages=()):
+        self.roles = bytearray()
+        # str, or zlib-compressed UTF-8 bytes for messages outside the context window
+        self.contents = []
+        self.lengths = array("I")
+        # Messages dropped from the front so far, so positions stay comparable across drops
+        self.offset = 0
+        for message in messages:
+            self.append(message["role"], message["content"])
+
+    def __len__(self):
+        return len(self.contents)
+
+    def __iter__(self):
+        for index in range(len(self.contents)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.contents))
+            if step != 1:
+                raise ValueError("ConversationHistory slices do not support a step")
+            part = ConversationHistory()
+            part.roles = self.roles[start:stop]
+            part.contents = self.contents[start:stop]
+            part.lengths = self.lengths[start:stop]
+            part.offset = self.offset + start
+            return part
+        return {"role": self.ROLES[self.roles[index]], "content": self.content(index)}
+
+    def append(self, role, content):
+        self.roles.append(self.ROLE_CODES[role])
+        self.contents.append(content)
+        self.lengths.append(len(content))
+
+    def content(self, index):
+        content = self.contents[index]
+        return zlib.decompress(content).decode("utf-8") if isinstance(content, bytes) else content
+
+    def length(self, index):
+        """Length in characters, known without decompressing"""
+        return self.lengths[index]
+
+    def drop_front(self, count):
+        del self.roles[:count]
+        del self.contents[:count]
+        del self.lengths[:count]
+        self.offset += count
+
+    def compress(self, stop):
+        """Compress the messages before stop, i.e. those outside the active context window"""
+        contents = self.contents
+        for index in range(stop):
+            content = contents[index]
+            if isinstance(content, str) and len(content) >= self.COMPRESS_MIN_CHARS:
+                packed = zlib.compress(content.encode("utf-8"))
+                if len(packed) < len(content):
+                    contents[index] = packed
+
+    def messages(self, start=0):
+        """Upstream message dicts from start on; compressed messages back in the window are expanded in place"""
+        contents = self.contents
+        for index in range(start, len(contents)):
+            if isinstance(contents[index], bytes):
+                contents[index] = self.content(index)
+        return [{"role": self.ROLES[self.roles[index]], "content": contents[index]}
+                for index in range(start, len(contents))]
+
+
+class ChatSession:
+    """Conversation history and survey state for a single user"""
+    __slots__ = ("session_id", "conversation_history", "current_survey", "summary", "summary_pending",
+                 "last_active", "version", "saved", "prompt_tokens", "completion_tokens", "lock")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.conversation_history = ConversationHistory()
+        self.current_survey = None
+        self.summary = ""
+        self.summary_pending = False
+        self.last_active = time.time()
+        self.version = 0
+        # What the stored copy at `version` holds, see SharedSessionManager._saved_state
+        self.saved = (0, "", None, 0, 0)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+
+
+class SessionManager:
+    """Bounded store of chat sessions with LRU and idle-TTL eviction"""
+
+    def __init__(self, max_sessions=10000, idle_ttl=1800, max_history=20):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_history = max_history
+        self.sessions = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get_session(self, session_id=None) -> ChatSession:
+        """Return the session for session_id, creating a new one if it is unknown or expired"""
+        now = time.time()
+        with self.lock:
+            session = self.sessions.get(session_id) if session_id else None
+            if session is not None and now - session.last_active > self.idle_ttl:
+                del self.sessions[session_id]
+                self.evictions += 1
+                session = None
+
+            if session is None:
+                session = ChatSession(session_id or secrets.token_hex(16))
+                self.sessions[session.session_id] = session
+                self._evict(now)
+            else:
+                self.sessions.move_to_end(session.session_id)
+
+            session.last_active = now
+            return session
+
+    def restore_session(self, session_id, last_active):
+        """Return the session for session_id during recovery, keeping its original last-activity time"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = ChatSession(session_id)
+                self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            session.last_active = last_active
+            self._evict(time.time())
+            return session
+
+    def _evict(self, now):
+        """Drop least recently used sessions until under the cap and none are idle"""
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if len(self.sessions) <= self.max_sessions and now - oldest.last_active <= self.idle_ttl:
+                break
+            self.sessions.popitem(last=False)
+            self.evictions += 1
+
+    def append_turn(self, session, user_input, bot_response):
+        """Record a user/assistant pair, keeping at most max_history messages"""
+        session.conversation_history.append("user", user_input)
+        session.conversation_history.append("assistant", bot_response)
+        self._trim(session.conversation_history)
+
+    def _trim(self, history):
+        overflow = len(history) - self.max_history
+        if overflow > 0:
+            # Drop whole user/assistant pairs
+            history.drop_front(overflow + overflow % 2)
+
+    def save(self, session):
+        """Persist changes to a session (caller holds session.lock); in-process sessions need nothing"""
+
+
+class SharedSessionManager(SessionManager):
+    """Sessions stored in SharedState so any worker process can serve any session
+
+    A save only succeeds against the version it was loaded from. When another worker saved in between, its copy
+    is loaded and this worker's changes are replayed on top: new messages are appended, token counts added, and a
+    new summary or survey state kept.
+    """
+
+    MAX_SAVE_ATTEMPTS = 5
+
+    def __init__(self, shared_state, max_sessions=10000, idle_ttl=1800, max_history=20):
+        super().__init__(max_sessions, idle_ttl, max_history)
+        self.shared_state = shared_state
+
+    def __len__(self):
+        return self.shared_state.session_count(time.time() - self.idle_ttl)
+
+    def get_session(self, session_id=None) -> ChatSession:
+        """Return the local session object, refreshed if another worker has changed it since"""
+        session = super().get_session(session_id)
+        if session_id:
+            version, data = self.shared_state.load_session(session_id, time.time() - self.idle_ttl)
+            if version != session.version:
+                with session.lock:
+                    self._load(session, version, data)
+        return session
+
+    def _load(self, session, version, data):
+        """Replace the local copy with the stored one (caller holds session.lock)"""
+        session.version = version
+        session.conversation_history = ConversationHistory(data["history"] if data else ())
+        session.summary = data["summary"] if data else ""
+        session.current_survey = data["current_survey"] if data else None
+        session.prompt_tokens, session.completion_tokens = data.get("tokens", (0, 0)) if data else (0, 0)
+        session.saved = self._saved_state(session)
+
+    @staticmethod
+    def _saved_state(session):
+        """(end of history, summary, survey, prompt tokens, completion tokens), to tell later changes apart"""
+        history = session.conversation_history
+        return (history.offset + len(history), session.summary, session.current_survey,
+                session.prompt_tokens, session.completion_tokens)
+
+    def save(self, session):
+        """Write the session, merging with saves other workers made since it was loaded (caller holds session.lock)
+
+        After MAX_SAVE_ATTEMPTS lost races the last writer wins.
+        """
+        for attempt in range(self.MAX_SAVE_ATTEMPTS + 1):
+            expected = session.version if attempt < self.MAX_SAVE_ATTEMPTS else None
+            version = self.shared_state.save_session(session.session_id, session.last_active, {
+                "history": list(session.conversation_history),
+                "summary": session.summary,
+                "current_survey": session.current_survey,
+                "tokens": [session.prompt_tokens, session.completion_tokens]
+            }, expected)
+            if version is not None:
+                session.version = version
+                session.saved = self._saved_state(session)
+                return
+            self._merge(session)
+
+    def _merge(self, session):
+        """Load the stored copy and replay this worker's unsaved changes onto it"""
+        end, summary, survey, prompt_tokens, completion_tokens = session.saved
+        history = session.conversation_history
+        added = list(history[max(0, end - history.offset):])
+        local = (session.summary, session.current_survey, session.prompt_tokens - prompt_tokens,
+                 session.completion_tokens - completion_tokens)
+
+        version, data = self.shared_state.load_session(session.session_id, time.time() - self.idle_ttl)
+        self._load(session, version, data)
+        for message in added:
+            session.conversation_history.append(message["role"], message["content"])
+        self._trim(session.conversation_history)
+        if local[0] != summary:
+            session.summary = local[0]
+        if local[1] != survey:
+            session.current_survey = local[1]
+        session.prompt_tokens += local[2]
+        session.completion_tokens += local[3]
@@ -0,0 +1,297 @@
+"""SQLite state shared by worker processes: sessions, counters, stats and windowed series"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from .metrics import WindowedSeries, window_summary
+
+
+class SharedState:
+    """Sessions and KPI aggregates in one SQLite (WAL) database read and written by every worker process"""
+
+    CLEANUP_INTERVAL = 60
+
+    def __init__(self, path, flush_interval=0.2, session_ttl=1800):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.session_ttl = session_ttl
+        self.local = threading.local()
+        self.pending = []
+        self.queued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.last_flush_ms = 0.0
+        self.last_cleanup = 0.0
+        self.closing = False
+        self.condition = threading.Condition()
+
+        conn = self._connection()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_active REAL NOT NULL, "
+                         "version INTEGER NOT NULL, data TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER NOT NULL, "
+                         "total REAL NOT NULL, min REAL, max REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS histograms (name TEXT NOT NULL, bucket INTEGER NOT NULL, "
+                         "count INTEGER NOT NULL, PRIMARY KEY (name, bucket))")
+            conn.execute("CREATE TABLE IF NOT EXISTS windows (name TEXT NOT NULL, width INTEGER NOT NULL, "
+                         "bucket INTEGER NOT NULL, count INTEGER NOT NULL, total REAL NOT NULL, min REAL, max REAL, "
+                         "PRIMARY KEY (name, width, bucket))")
+        self.created_at = float(self.meta("created_at", time.time()))
+
+        self.writer = threading.Thread(target=self._run, name="techbuddy-shared-state", daemon=True)
+        self.writer.start()
+
+    def _connection(self):
+        """One connection per thread; busy workers wait on each other's write locks instead of failing"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def meta(self, key, default):
+        """Return the stored value for key, storing default first if no worker has set it yet"""
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO meta VALUES (?, ?)", (key, str(default)))
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def load_session(self, session_id, min_active):
+        """Return (version, data) for a live session, or (0, None)"""
+        row = self._connection().execute(
+            "SELECT version, data FROM sessions WHERE session_id = ? AND last_active >= ?", (session_id, min_active)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else (0, None)
+
+    def save_session(self, session_id, last_active, data, expected_version=None):
+        """Write a session and return its new version
+
+        Given expected_version (0 for a session not stored yet, or expired), the write only happens if that is
+        still the stored version; otherwise another worker saved first and None is returned.
+        """
+        data = json.dumps(data, separators=(",", ":"))
+        conn = self._connection()
+        with conn:
+            if expected_version is None:
+                row = conn.execute(
+                    "INSERT INTO sessions VALUES (?, ?, 1, ?) ON CONFLICT (session_id) DO UPDATE SET "
+                    "last_active = excluded.last_active, version = version + 1, data = excluded.data RETURNING version",
+                    (session_id, last_active, data)).fetchone()
+            elif expected_version == 0:
+                row = conn.execute(
+                    "INSERT INTO sessions VALUES (?, ?, 1, ?) ON CONFLICT (session_id) DO UPDATE SET "
+                    "last_active = excluded.last_active, version = version + 1, data = excluded.data "
+                    "WHERE last_active < ? RETURNING version",
+                    (session_id, last_active, data, time.time() - self.session_ttl)).fetchone()
+            else:
+                row = conn.execute(
+                    "UPDATE sessions SET last_active = ?, version = version + 1, data = ? "
+                    "WHERE session_id = ? AND version = ? RETURNING version",
+                    (last_active, data, session_id, expected_version)).fetchone()
+        return row[0] if row else None
+
+    def session_count(self, min_active):
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_active >= ?", (min_active,)
+        ).fetchone()[0]
+
+    def increment(self, name, amount=1):
+        self._queue(("counter", name, amount))
+
+    def observe(self, name, value, bucket=None):
+        """Add a sample to a stat and, given a histogram bucket, to its histogram"""
+        self._queue(("stat", name, value, bucket))
+
+    def observe_window(self, name, width, bucket, value):
+        self._queue(("window", name, width, bucket, value))
+
+    def _queue(self, op):
+        with self.condition:
+            self.pending.append(op)
+            self.queued += 1
+
+    def counters(self):
+        return dict(self._connection().execute("SELECT name, value FROM counters"))
+
+    def stat_names(self, prefix):
+        """Names of every stat any worker has recorded under prefix"""
+        return [row[0] for row in self._connection().execute(
+            "SELECT name FROM stats WHERE substr(name, 1, ?) = ? ORDER BY name", (len(prefix), prefix))]
+
+    def load_stat(self, name, stat):
+        """Fill a RunningStat or LatencyHistogram with the cluster-wide aggregate for name"""
+        conn = self._connection()
+        row = conn.execute("SELECT count, total, min, max FROM stats WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return stat
+        counts = conn.execute("SELECT bucket, count FROM histograms WHERE name = ?", (name,)).fetchall()
+        stat.load_state({"count": row[0], "total": row[1], "min": row[2], "max": row[3], "counts": counts})
+        return stat
+
+    def window_query(self, name, width, first_bucket, last_bucket):
+        """Return (count, total, min, max) over buckets first_bucket < bucket <= last_bucket"""
+        return self._connection().execute(
+            "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(total), 0), MIN(min), MAX(max) FROM windows "
+            "WHERE name = ? AND width = ? AND bucket > ? AND bucket <= ?", (name, width, first_bucket, last_bucket)
+        ).fetchone()
+
+    def flush(self, timeout=None):
+        """Block until everything this process queued so far is visible to other workers"""
+        with self.condition:
+            target = self.queued
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: self.flushed >= target or self.writer is None, timeout)
+
+    def close(self):
+        if self.writer is None:
+            return
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.writer.join()
+        self.writer = None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.closing:
+                    self.condition.wait(self.flush_interval)
+                batch, self.pending = self.pending, []
+                closing = self.closing
+            try:
+                self._write(batch)
+            except sqlite3.Error as e:
+                print(f"❌ Error writing shared state: {str(e)}")
+                self.write_errors += 1
+                with self.condition:
+                    self.pending[:0] = batch
+                if not closing:
+                    continue
+            if closing:
+                break
+        with self.condition:
+            self.condition.notify_all()
+
+    @staticmethod
+    def _fold(aggregates, key, value):
+        entry = aggregates.get(key)
+        if entry is None:
+            aggregates[key] = [1, value, value, value]
+        else:
+            entry[0] += 1
+            entry[1] += value
+            entry[2] = min(entry[2], value)
+            entry[3] = max(entry[3], value)
+
+    def _write(self, batch):
+        """Fold a batch into per-key deltas and apply them in one transaction"""
+        started = time.perf_counter()
+        counters, stats, histograms, windows = {}, {}, {}, {}
+        for op in batch:
+            if op[0] == "counter":
+                counters[op[1]] = counters.get(op[1], 0) + op[2]
+            elif op[0] == "stat":
+                self._fold(stats, op[1], op[2])
+                if op[3] is not None:
+                    histograms[op[1], op[3]] = histograms.get((op[1], op[3]), 0) + 1
+            else:
+                self._fold(windows, op[1:4], op[4])
+
+        now = time.time()
+        cleanup = now - self.last_cleanup >= self.CLEANUP_INTERVAL
+        if not batch and not cleanup:
+            return
+
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO counters VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                counters.items())
+            conn.executemany(
+                "INSERT INTO stats VALUES (?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET "
+                "count = count + excluded.count, total = total + excluded.total, "
+                "min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+                [(name, *entry) for name, entry in stats.items()])
+            conn.executemany(
+                "INSERT INTO histograms VALUES (?, ?, ?) ON CONFLICT (name, bucket) DO UPDATE SET "
+                "count = count + excluded.count",
+                [(name, bucket, count) for (name, bucket), count in histograms.items()])
+            conn.executemany(
+                "INSERT INTO windows VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (name, width, bucket) DO UPDATE SET "
+                "count = count + excluded.count, total = total + excluded.total, "
+                "min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+                [(*key, *entry) for key, entry in windows.items()])
+            if cleanup:
+                conn.execute("DELETE FROM sessions WHERE last_active < ?", (now - self.session_ttl,))
+                for width, slots in WindowedSeries.RINGS:
+                    conn.execute("DELETE FROM windows WHERE width = ? AND bucket <= ?", (width, now // width - slots))
+                self.last_cleanup = now
+
+        with self.condition:
+            self.flushed += len(batch)
+            if batch:
+                self.batches += 1
+                self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self.condition.notify_all()
+
+    def stats(self):
+        return {
+            "pending": len(self.pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3)
+        }
+
+
+class SharedStat:
+    """Stand-in for RunningStat/LatencyHistogram whose samples are aggregated in SharedState"""
+
+    def __init__(self, shared_state, name, template):
+        self.shared_state = shared_state
+        self.name = name
+        self.template = template
+
+    def add(self, value):
+        bucket_index = getattr(self.template, "bucket_index", None)
+        self.shared_state.observe(self.name, value, bucket_index(value) if bucket_index else None)
+
+    def load(self):
+        """Cluster-wide aggregate as a local copy of the template type"""
+        return self.shared_state.load_stat(self.name, type(self.template)())
+
+    @property
+    def mean(self):
+        return self.load().mean
+
+    def snapshot(self):
+        return self.load().snapshot()
+
+
+class SharedWindowedSeries:
+    """Stand-in for WindowedSeries whose buckets live in SharedState"""
+
+    def __init__(self, shared_state, name):
+        self.shared_state = shared_state
+        self.name = name
+
+    def add(self, value, now=None):
+        now = time.time() if now is None else now
+        for width, _ in WindowedSeries.RINGS:
+            self.shared_state.observe_window(self.name, width, int(now // width), value)
+
+    def query(self, seconds, now=None):
+        now = time.time() if now is None else now
+        width, slots = next((ring for ring in WindowedSeries.RINGS if ring[0] * ring[1] >= seconds),
+                            WindowedSeries.RINGS[-1])
+        current = int(now // width)
+        count, total, minimum, maximum = self.shared_state.window_query(
+            self.name, width, current - max(1, int(seconds // width)), current)
+        return window_summary(count, total, minimum, maximum)
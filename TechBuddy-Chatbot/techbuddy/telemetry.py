@@ -0,0 +1,249 @@
+"""Hot-path phase timings, their Prometheus text exposition and a sampling profiler for slow requests"""
+
+import os
+import re
+import sys
+import threading
+import time
+from functools import wraps
+
+from .metrics import LatencyHistogram
+from .shared_state import SharedStat
+
+
+class PhaseHistogram(LatencyHistogram):
+    """LatencyHistogram starting at 10µs, fine enough for in-process phases such as cache lookups"""
+
+    def __init__(self):
+        super().__init__(min_value=0.00001)
+
+    def cumulative_counts(self, bounds):
+        """Samples at or below each of the ascending bounds (within the bucket precision), for `le` buckets"""
+        with self.lock:
+            totals = []
+            seen = 0
+            index = 0
+            for bound in bounds:
+                last = self.bucket_index(bound)
+                while index <= last:
+                    seen += self.counts[index]
+                    index += 1
+                totals.append(seen)
+            return totals
+
+
+class PhaseTimer:
+    """Times a block into a Telemetry histogram, labelled outcome="ok" or "error" by how the block exited"""
+    __slots__ = ("telemetry", "metric", "labels", "started")
+
+    def __init__(self, telemetry, metric, labels):
+        self.telemetry = telemetry
+        self.metric = metric
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.observe(self.metric, time.perf_counter() - self.started,
+                               outcome="error" if exc_type is not None else "ok", **self.labels)
+
+
+def timed(phase):
+    """Method decorator recording its duration as techbuddy_phase_seconds{phase=...} on self.telemetry"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.telemetry.time(Telemetry.PHASE_METRIC, phase=phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Telemetry:
+    """Latency histograms per request phase, kept per label set and cluster-wide when state is shared"""
+
+    PHASE_METRIC = "techbuddy_phase_seconds"
+    CHAT_METRIC = "techbuddy_chat_seconds"
+    HTTP_METRIC = "techbuddy_http_request_seconds"
+    HELP = {
+        PHASE_METRIC: "Time spent in each phase of a request",
+        CHAT_METRIC: "Chat turns from session lookup to reply, by reply type",
+        HTTP_METRIC: "HTTP requests by route and status, JSON serialization included",
+    }
+    # Upper bounds (seconds) of the exported buckets
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+               60.0)
+    SHARED_PREFIX = "telemetry:"
+
+    def __init__(self, shared_state=None):
+        self.shared_state = shared_state
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def label_text(labels):
+        """Prometheus label set without the braces, e.g. phase="upstream",outcome="ok" """
+        return ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"')
+                                         .replace("\n", "\\n")) for name, value in labels)
+
+    def histogram(self, metric, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = PhaseHistogram()
+                    if self.shared_state is not None:
+                        name = f"{self.SHARED_PREFIX}{metric}{{{self.label_text(key[1])}}}"
+                        histogram = SharedStat(self.shared_state, name, histogram)
+                    self.histograms[key] = histogram
+        return histogram
+
+    def observe(self, metric, seconds, **labels):
+        self.histogram(metric, **labels).add(seconds)
+
+    def time(self, metric, **labels):
+        return PhaseTimer(self, metric, labels)
+
+    def collect(self):
+        """(metric, label text, PhaseHistogram) for every series; every worker's series when state is shared"""
+        if self.shared_state is None:
+            with self.lock:
+                series = list(self.histograms.items())
+            return [(metric, self.label_text(labels), histogram) for (metric, labels), histogram in series]
+
+        self.shared_state.flush(timeout=1)
+        collected = []
+        for name in self.shared_state.stat_names(self.SHARED_PREFIX):
+            metric, _, labels = name[len(self.SHARED_PREFIX):].partition("{")
+            collected.append((metric, labels[:-1], self.shared_state.load_stat(name, PhaseHistogram())))
+        return collected
+
+    def render(self):
+        """Histogram lines in the Prometheus text exposition format"""
+        lines = []
+        previous = None
+        for metric, labels, histogram in sorted(self.collect(), key=lambda series: series[:2]):
+            if metric != previous:
+                lines.append(f"# HELP {metric} {self.HELP.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} histogram")
+                previous = metric
+            prefix = labels + "," if labels else ""
+            for bound, count in zip(self.BUCKETS, histogram.cumulative_counts(self.BUCKETS)):
+                lines.append(f'{metric}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram.total}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        return lines
+
+
+def render_samples(samples):
+    """Prometheus text lines for (name, type, help, value) counters and gauges; value may be {label text: value}"""
+    lines = []
+    for name, kind, description, value in samples:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        if isinstance(value, dict):
+            lines.extend(f"{name}{{{labels}}} {series}" for labels, series in value.items())
+        else:
+            lines.append(f"{name} {value}")
+    return lines
+
+
+class SlowRequestProfiler:
+    """Samples the stacks of in-flight requests and writes them as folded stacks when a request turns out slow
+
+    Each output file holds one `frame;frame;...;frame count` line per distinct stack, the input format of
+    flamegraph.pl and speedscope. Only threads that called begin() are sampled, so one request per thread
+    (Flask's threaded server, gunicorn sync/gthread workers) is what gets profiled.
+    """
+
+    def __init__(self, threshold, interval=0.005, out_dir="techbuddy_profiles", max_files=200):
+        self.threshold = threshold
+        self.interval = interval
+        self.out_dir = out_dir
+        self.max_files = max_files
+        self.active = {}
+        self.sampler = None
+        self.samples = 0
+        self.profiled = 0
+        self.written = 0
+        self.condition = threading.Condition()
+
+    def begin(self):
+        """Start sampling the calling thread"""
+        with self.condition:
+            self.active[threading.get_ident()] = (time.perf_counter(), {})
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self._run, name="techbuddy-profiler", daemon=True)
+                self.sampler.start()
+            self.condition.notify()
+
+    def end(self, label):
+        """Stop sampling the calling thread; returns the folded-stack file written if the request was slow"""
+        with self.condition:
+            entry = self.active.pop(threading.get_ident(), None)
+        if entry is None:
+            return None
+        started, stacks = entry
+        elapsed = time.perf_counter() - started
+        self.profiled += 1
+        if elapsed < self.threshold or not stacks:
+            return None
+        return self._write(label, elapsed, stacks)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                # Idle until a request is in flight
+                self.condition.wait_for(lambda: self.active)
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.condition:
+                for thread_id, (_, stacks) in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = self._fold(frame)
+                        stacks[stack] = stacks.get(stack, 0) + 1
+                        self.samples += 1
+
+    @staticmethod
+    def _fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _write(self, label, elapsed, stacks):
+        os.makedirs(self.out_dir, exist_ok=True)
+        slug = re.sub(r'[^\w.-]+', '_', label).strip('_') or "request"
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{elapsed * 1000:.0f}ms"
+                                          f"-{threading.get_ident()}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        self.written += 1
+
+        # Keep only the newest max_files profiles
+        profiles = sorted(name for name in os.listdir(self.out_dir) if name.endswith(".folded"))
+        for name in profiles[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.out_dir, name))
+            except OSError:
+                pass
+        return path
+
+    def stats(self):
+        return {
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "in_flight": len(self.active),
+            "samples": self.samples,
+            "profiled_requests": self.profiled,
+            "profiles_written": self.written
+        }
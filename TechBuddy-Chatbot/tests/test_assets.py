@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+
+from techbuddy.assets import AssetBuilder, StaticAssets, build_assets
+
+PAGE = """<html><body>
+<p class="hidden">Hi</p>
+<script>
+    // Say hello
+    const url = "https://example.com/"; // the site
+    const text = `first line
+    // part of the text
+        ${url}`;
+    const pattern = /\\/\\//g;
+</script>
+</body></html>
+"""
+
+
+class MinifyJSTest(unittest.TestCase):
+    def test_comments_and_indentation_go_but_literals_stay(self):
+        self.assertEqual(AssetBuilder.minify_js(PAGE.split("<script>")[1].split("</script>")[0]),
+                         'const url = "https://example.com/";\n'
+                         'const text = `first line\n    // part of the text\n        ${url}`;\n'
+                         'const pattern = /\\/\\//g;\n')
+
+    def test_division_is_not_a_regex(self):
+        self.assertEqual(AssetBuilder.minify_js("const half = total / 2; // '\n"), "const half = total / 2;\n")
+
+
+class BuildTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.out_dir = os.path.join(self.dir.name, "assets")
+        self.template = os.path.join(self.dir.name, "index.html")
+        self.write_template(PAGE)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write_template(self, html):
+        with open(self.template, "w") as f:
+            f.write(html)
+
+    def page(self):
+        app = Flask(__name__)
+        with app.test_request_context("/"):
+            return StaticAssets(self.out_dir, self.template).response("/").get_data(as_text=True)
+
+    def test_rebuild_removes_stale_scripts(self):
+        first = build_assets(self.out_dir, self.template)
+        self.write_template(PAGE.replace("Say hello", "Say hi").replace("first line", "second line"))
+        second = build_assets(self.out_dir, self.template)
+        self.assertNotEqual(set(first["files"]), set(second["files"]))
+        scripts = sorted(name for name in os.listdir(self.out_dir) if name.startswith("app."))
+        self.assertEqual(scripts, sorted(v["file"] for path, entry in second["files"].items() if path != "/"
+                                         for v in entry["variants"].values()))
+
+    def test_template_is_served_without_a_build(self):
+        self.assertEqual(self.page(), PAGE)
+
+    def test_build_is_served_once_it_matches_the_template(self):
+        build_assets(self.out_dir, self.template)
+        self.assertIn('<script src="/assets/app.', self.page())
+        self.write_template(PAGE.replace("Hi", "Hello"))
+        self.assertIn("Hello", self.page())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import unittest
+
+from techbuddy.api_keys import APIKeyRegistry
+from techbuddy.app import create_app
+from techbuddy.asgi import AsyncChatApp
+from techbuddy.backends import FakeBackend
+from techbuddy.chatbot import PersonalizedChatbot
+
+CHAT = {"message": "Which laptop is good for travel?"}
+BATCH = {"items": [CHAT]}
+
+
+def make_bot():
+    return PersonalizedChatbot("key", backend=FakeBackend(0, 0))
+
+
+class FlaskBearerTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = make_bot()
+        self.app = create_app(self.bot)
+        self.client = self.app.test_client()
+        self.bearer = {"Authorization": f"Bearer {self.app.config['API_KEY']}"}
+
+    def tearDown(self):
+        self.bot.close()
+
+    def test_bearer_token_is_accepted_on_every_route(self):
+        for method, path, body in [("post", "/chat", CHAT), ("post", "/chat/stream", CHAT),
+                                   ("post", "/chat/batch", BATCH), ("get", "/kpi-metrics", None),
+                                   ("get", "/kpi-stream", None)]:
+            with self.subTest(path=path):
+                response = getattr(self.client, method)(path, json=body, headers=self.bearer)
+                self.assertEqual(response.status_code, 200)
+                response.close()
+
+    def test_unknown_bearer_token_is_rejected(self):
+        response = self.client.post("/chat", json=CHAT, headers={"Authorization": "Bearer nope"})
+        self.assertEqual(response.status_code, 401)
+
+
+class ASGIBearerTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = make_bot()
+        self.app = AsyncChatApp(self.bot, create_app(self.bot))
+        self.key = self.app.wsgi.wsgi_application.config['API_KEY']
+        # The stream only notices the disconnect between messages
+        self.app.broadcaster.keepalive = 0.01
+
+    def tearDown(self):
+        self.bot.close()
+
+    def request(self, method, path, body, authorization):
+        """Status of one request sent straight to the ASGI app; the client disconnects after the body"""
+        messages = [{"type": "http.request", "body": json.dumps(body).encode() if body else b""}]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": method, "path": path, "query_string": b"", "client": ("127.0.0.1", 1),
+                 "headers": [(b"content-type", b"application/json"), (b"authorization", authorization.encode())]}
+        asyncio.run(self.app(scope, receive, send))
+        return next(message["status"] for message in sent if message["type"] == "http.response.start")
+
+    def test_bearer_token_is_accepted_on_every_native_route(self):
+        for method, path, body in [("POST", "/chat", CHAT), ("POST", "/chat/stream", CHAT),
+                                   ("POST", "/chat/batch", BATCH), ("GET", "/kpi-stream", None)]:
+            with self.subTest(path=path):
+                self.assertEqual(self.request(method, path, body, f"Bearer {self.key}"), 200)
+
+    def test_unknown_bearer_token_is_rejected(self):
+        self.assertEqual(self.request("POST", "/chat", CHAT, "Bearer nope"), 401)
+
+
+class ParseKeysTest(unittest.TestCase):
+    def test_rate_and_burst_default_or_come_from_the_entry(self):
+        entries = APIKeyRegistry.parse("ci:secret, grafana:other:0.5:3", 2.0, 10)
+        self.assertEqual([(name, rate, burst) for name, _, rate, burst in entries],
+                         [("ci", 2.0, 10), ("grafana", 0.5, 3)])
+
+    def test_invalid_rate_or_burst_is_rejected(self):
+        for spec in ("ci:secret:-1", "ci:secret:nan", "ci:secret:inf", "ci:secret:1:0", "ci:secret:fast"):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                APIKeyRegistry.parse(spec, 0.0, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import asyncio
+import time
+import unittest
+
+from techbuddy.admission import AdmissionController
+from techbuddy.backends import FakeBackend, ResilientBackend
+
+MESSAGES = [{"role": "user", "content": "Which laptop is good for travel?"}]
+
+
+class HedgeAdmissionTest(unittest.TestCase):
+    def make_backend(self, max_concurrent):
+        self.admission = AdmissionController(max_concurrent)
+        backend = ResilientBackend(FakeBackend(0.05, 0), hedge=True, hedge_min_delay=0.01, admission=self.admission)
+        for _ in range(ResilientBackend.HEDGE_MIN_SAMPLES):
+            backend._record_latency(0.01)
+        # The caller's own slot, as PersonalizedChatbot holds it around the call
+        self.assertTrue(self.admission.try_acquire())
+        return backend
+
+    def wait_for_release(self):
+        deadline = time.time() + 1
+        while self.admission.in_flight > 1 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.admission.in_flight, 1)
+
+    def test_no_hedge_without_a_free_slot(self):
+        backend = self.make_backend(1)
+        self.assertTrue(backend.complete(MESSAGES))
+        self.assertEqual((backend.hedges, backend.hedges_skipped), (0, 1))
+        self.assertTrue(asyncio.run(backend.acomplete(MESSAGES)))
+        self.assertEqual((backend.hedges, backend.hedges_skipped), (0, 2))
+
+    def test_hedge_holds_a_slot_until_it_finishes(self):
+        backend = self.make_backend(2)
+        self.assertTrue(backend.complete(MESSAGES))
+        self.assertEqual((backend.hedges, backend.hedges_skipped), (1, 0))
+        self.wait_for_release()
+        self.assertTrue(asyncio.run(backend.acomplete(MESSAGES)))
+        self.assertEqual((backend.hedges, backend.hedges_skipped), (2, 0))
+        self.wait_for_release()
+
+
+if __name__ == "__main__":
+    unittest.main()
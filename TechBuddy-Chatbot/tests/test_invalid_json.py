@@ -0,0 +1,51 @@
+import asyncio
+import json
+import unittest
+
+from techbuddy.app import create_app
+from techbuddy.asgi import AsyncChatApp
+from techbuddy.backends import FakeBackend
+from techbuddy.chatbot import PersonalizedChatbot
+
+ROUTES = ["/chat", "/chat/stream", "/chat/batch"]
+
+
+class InvalidJSONTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = PersonalizedChatbot("key", backend=FakeBackend(0, 0))
+        self.app = create_app(self.bot)
+        self.headers = {"X-API-Key": self.app.config['API_KEY'], "Content-Type": "application/json"}
+
+    def tearDown(self):
+        self.bot.close()
+
+    def test_flask_routes_reject_malformed_body(self):
+        client = self.app.test_client()
+        for path in ROUTES:
+            with self.subTest(path=path):
+                response = client.post(path, data="{not json", headers=self.headers)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.get_json())
+
+    def test_asgi_routes_reject_malformed_body(self):
+        app = AsyncChatApp(self.bot, self.app)
+        for path in ROUTES:
+            with self.subTest(path=path):
+                sent = []
+
+                async def receive():
+                    return {"type": "http.request", "body": b"{not json"}
+
+                async def send(message):
+                    sent.append(message)
+
+                headers = [(name.lower().encode(), value.encode()) for name, value in self.headers.items()]
+                scope = {"type": "http", "method": "POST", "path": path, "query_string": b"",
+                         "client": ("127.0.0.1", 1), "headers": headers}
+                asyncio.run(app(scope, receive, send))
+                self.assertEqual(sent[0]["status"], 400)
+                self.assertIn('error', json.loads(sent[1]["body"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
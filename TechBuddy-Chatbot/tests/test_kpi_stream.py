@@ -0,0 +1,27 @@
+import unittest
+
+from techbuddy.admission import Overloaded
+from techbuddy.kpi_stream import KPIBroadcaster
+
+
+class SubscriberSlotTest(unittest.TestCase):
+    def setUp(self):
+        self.broadcaster = KPIBroadcaster(lambda: {"total_messages": 1}, interval=0.01, keepalive=0.05, max_threads=1)
+
+    def test_closing_an_unstarted_stream_frees_its_slot(self):
+        self.broadcaster.subscribe().close()
+        self.assertEqual((self.broadcaster.subscribers, self.broadcaster.thread_subscribers), (0, 0))
+        self.broadcaster.subscribe().close()
+
+    def test_slot_is_held_until_close(self):
+        messages = self.broadcaster.subscribe()
+        self.assertTrue(next(messages).startswith("event: snapshot"))
+        with self.assertRaises(Overloaded):
+            self.broadcaster.subscribe()
+        messages.close()
+        messages.close()
+        self.assertEqual((self.broadcaster.subscribers, self.broadcaster.thread_subscribers), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
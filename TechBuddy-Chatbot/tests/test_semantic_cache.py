@@ -0,0 +1,73 @@
+import unittest
+
+from techbuddy.backends import FakeBackend
+from techbuddy.caching import ResponseCache, SemanticCache
+from techbuddy.chatbot import PersonalizedChatbot
+
+
+class SemanticCacheTest(unittest.TestCase):
+    CONTEXT = ResponseCache.context_digest([{"role": "system", "content": "You are TechBuddy"}])
+    PARAPHRASES = [
+        ("laptop for coding under 1k", "good programming laptop below $1000"),
+        ("reset my router", "how can i reset my router"),
+        ("phone with a good camera under $500", "smartphone under 500 dollars with a great camera"),
+        ("What's the battery life of the Pixel 8?", "pixel 8 battery life"),
+    ]
+    NEAR_MISSES = [
+        ("reset my router", "reset my modem"),
+        ("reset my router", "reset my iphone"),
+        ("reset my router", "restart my router"),
+        ("laptop for coding under 1k", "laptop for gaming under 1k"),
+        ("laptop under $1000", "laptop under $1500"),
+        ("why does my laptop charge slowly", "why doesn't my laptop charge"),
+    ]
+
+    def setUp(self):
+        self.cache = SemanticCache(max_entries=16)
+
+    def test_paraphrases_hit(self):
+        for cached, asked in self.PARAPHRASES:
+            with self.subTest(cached=cached, asked=asked):
+                self.cache.put(cached, self.CONTEXT, f"answer to {cached}")
+                self.assertEqual(self.cache.get(asked, self.CONTEXT), f"answer to {cached}")
+
+    def test_near_misses_miss(self):
+        for cached, asked in self.NEAR_MISSES:
+            with self.subTest(cached=cached, asked=asked):
+                self.cache = SemanticCache(max_entries=16)
+                self.cache.put(cached, self.CONTEXT, f"answer to {cached}")
+                self.assertIsNone(self.cache.get(asked, self.CONTEXT))
+
+    def test_other_context_misses(self):
+        self.cache.put("reset my router", self.CONTEXT, "unplug it")
+        self.assertIsNone(self.cache.get("reset my router", ResponseCache.context_digest([])))
+
+
+class StubKnowledgeBase:
+    """Returns a different passage for every query, as paraphrases often retrieve"""
+
+    def context_for(self, query, k=3, max_tokens=400):
+        return f"- passage retrieved for {query!r}"
+
+    def stats(self):
+        return {}
+
+
+class SemanticCacheChatTest(unittest.TestCase):
+    def test_paraphrase_with_other_passages_hits(self):
+        bot = PersonalizedChatbot("key", backend=FakeBackend(0, 0), knowledge_base=StubKnowledgeBase(),
+                                  semantic_cache=SemanticCache(), event_store=None)
+        try:
+            first = bot.generate_response("laptop for coding under 1k", "session-1")
+            second = bot.generate_response("good programming laptop below $1000", "session-2")
+            third = bot.generate_response("laptop for gaming under 1k", "session-3")
+        finally:
+            bot.close()
+        self.assertFalse(first.get("cached"))
+        self.assertTrue(second.get("cached"))
+        self.assertEqual(second["response"], first["response"])
+        self.assertFalse(third.get("cached"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from techbuddy.sessions import SharedSessionManager
+from techbuddy.shared_state import SharedState
+
+
+class ConcurrentSaveTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.shared_state = SharedState(os.path.join(self.dir.name, "state.db"))
+        # Two workers, each with its own local copies of the sessions
+        self.workers = [SharedSessionManager(self.shared_state), SharedSessionManager(self.shared_state)]
+
+    def tearDown(self):
+        self.shared_state.close()
+        self.dir.cleanup()
+
+    def answer(self, worker, session, question, tokens):
+        with session.lock:
+            worker.append_turn(session, question, f"Answer to {question}")
+            session.prompt_tokens += tokens
+            worker.save(session)
+
+    def test_turns_saved_by_two_workers_are_both_kept(self):
+        first, second = self.workers
+        session = first.get_session("s1")
+        self.answer(first, session, "hello", 10)
+
+        a, b = first.get_session("s1"), second.get_session("s1")
+        self.answer(first, a, "laptops?", 5)
+        self.answer(second, b, "phones?", 7)
+        b.current_survey = "satisfaction"
+        with b.lock:
+            second.save(b)
+
+        stored = first.get_session("s1")
+        self.assertEqual([m["content"] for m in stored.conversation_history if m["role"] == "user"],
+                         ["hello", "laptops?", "phones?"])
+        self.assertEqual(stored.prompt_tokens, 22)
+        self.assertEqual(stored.current_survey, "satisfaction")
+        self.assertEqual(stored.version, 4)
+
+    def test_expired_session_is_replaced(self):
+        first, second = self.workers
+        self.answer(first, first.get_session("s2"), "hello", 1)
+        second.idle_ttl = 0
+        self.shared_state.session_ttl = 0
+        session = second.get_session("s2")
+        self.assertEqual(len(session.conversation_history), 0)
+        self.answer(second, session, "again", 1)
+        self.assertEqual(self.shared_state.load_session("s2", 0)[1]["tokens"], [1, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()